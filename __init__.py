@@ -4,6 +4,7 @@ from . import object_applymodifier
 from . import import_pmx
 from . import export_pmx
 from . import validator
+from .pmx import container
 from bpy.props import StringProperty
 from bpy.props import BoolProperty
 from bpy.props import EnumProperty
@@ -234,6 +235,13 @@ class Blender2PmxemAddonPreferences(bpy.types.AddonPreferences):
         precision=5
     )
 
+    cache_size: IntProperty(  # type: ignore
+        name="Cache Size (MB)",
+        description="Disk space for the decoded models of imported files, 0 disables the cache",
+        default=1024,
+        min=0
+    )
+
     def draw(self, context):
         layout = self.layout
 
@@ -248,6 +256,7 @@ class Blender2PmxemAddonPreferences(bpy.types.AddonPreferences):
         col.label(text="Number of Twist link bones:")
         col.label(text="Auto Bone influence:")
         col.label(text="Rename Chain threshold:")
+        col.label(text="Imported model cache:")
 
         col.prop(self, "saveVersions")
         row = col.row(align=True)
@@ -256,6 +265,28 @@ class Blender2PmxemAddonPreferences(bpy.types.AddonPreferences):
         col.prop(self, "twistBones")
         col.prop(self, "autoInfluence")
         col.prop(self, "threshold")
+        col.prop(self, "cache_size")
+
+
+# Extensions of the export compression option
+COMPRESSION_EXTENSIONS = {'NONE': "", 'XZ': ".xz", 'GZ': ".gz", 'BZ2': ".bz2"}
+
+
+def compressed_filepath(filepath, compression):
+    # "model", "model.pmx" or "model.pmx.gz" -> "model.pmx" + extension of compression
+    root = container.SplitCompression(filepath)[0]
+    if os.path.basename(root) == "":
+        return filepath
+
+    return os.path.splitext(root)[0] + ".pmx" + COMPRESSION_EXTENSIONS[compression]
+
+
+def pmx_files(directory):
+    # .pmx files and their compressed containers
+    files = glob(os.path.join(directory, '*.pmx'))
+    for ext in container.COMPRESSIONS:
+        files += glob(os.path.join(directory, '*.pmx' + ext))
+    return files
 
 
 class B2PMXEM_OT_ImportBlender2Pmx(bpy.types.Operator, ImportHelper):
@@ -266,7 +297,7 @@ class B2PMXEM_OT_ImportBlender2Pmx(bpy.types.Operator, ImportHelper):
 
     filename_ext = ".pmx"
     filter_glob: StringProperty(  # type: ignore
-        default="*.pm[dx]",
+        default=container.FILTER_GLOB,
         options={'HIDDEN'}
     )
 
@@ -282,12 +313,14 @@ class B2PMXEM_OT_ImportBlender2Pmx(bpy.types.Operator, ImportHelper):
         prefs = context.preferences.addons[GV.FolderName].preferences
         use_japanese_name = prefs.use_japanese_name
 
-        with open(keywords['filepath'], "rb") as f:
-            from .pmx import pmx
-            pmx_data = pmx.Model()
-            pmx_data.Load(f)
+        # Only names are validated, vertices and faces are never decoded
+        from .pmx import lazy
+        with lazy.LazyModel() as pmx_data:
+            with container.OpenModelFile(keywords['filepath'], "rb") as f:
+                pmx_data.Load(f)
+
+            validate_result = validator.validate_pmx(pmx_data, use_japanese_name)
 
-        validate_result = validator.validate_pmx(pmx_data, use_japanese_name)
         if validate_result:
             msg = '\n'.join(validate_result)
             bpy.ops.b2pmxem.multiline_message('INVOKE_DEFAULT',
@@ -338,6 +371,17 @@ class B2PMXEM_OT_ExportBlender2Pmx(bpy.types.Operator, ExportHelper):
         description="Use custom normals",
         default=False,
     )
+    compression: EnumProperty(  # type: ignore
+        items=(
+            ('NONE', "None", "Save a .pmx file."),
+            ('XZ', "xz", "Save a .pmx.xz file."),
+            ('GZ', "gzip", "Save a .pmx.gz file."),
+            ('BZ2', "bzip2", "Save a .pmx.bz2 file."),
+        ),
+        name="Compression",
+        description="Select the compression of the saved file",
+        default='NONE'
+    )
 
     @classmethod
     def poll(cls, context):
@@ -375,7 +419,8 @@ class B2PMXEM_OT_ExportBlender2Pmx(bpy.types.Operator, ExportHelper):
                     index -= 1
                 index += 1
 
-        keywords = self.as_keywords(ignore=("check_existing", "filter_glob", ))
+        self.filepath = compressed_filepath(self.filepath, self.compression)
+        keywords = self.as_keywords(ignore=("check_existing", "filter_glob", "compression", ))
 
         ret = export_pmx.write_pmx_data(context, **keywords)
         if ret == {'FINISHED'}:
@@ -393,6 +438,19 @@ class B2PMXEM_OT_ExportBlender2Pmx(bpy.types.Operator, ExportHelper):
         box.prop(self, "use_mesh_modifiers")
         box.prop(self, "use_custom_normals")
 
+        row = box.split(factor=0.3)
+        row.label(text="Compression:")
+        row.prop(self, "compression", text="")
+
+    def check(self, context):
+        # ExportHelper only knows filename_ext, keep ".pmx" and the compression extension
+        filepath = compressed_filepath(self.filepath, self.compression)
+        if filepath == self.filepath:
+            return False
+
+        self.filepath = filepath
+        return True
+
 
 #
 #   The error message operator. When invoked, pops up a dialog
@@ -522,7 +580,7 @@ class B2PMXEM_OT_MakeXML(bpy.types.Operator):
 
     def invoke(self, context, event):
         directory = bpy.path.abspath("//")
-        files = [os.path.relpath(x, directory) for x in glob(os.path.join(directory, '*.pmx'))]
+        files = [os.path.relpath(x, directory) for x in pmx_files(directory)]
 
         if len(files) == 0:
             return {'CANCELLED'}
@@ -531,7 +589,7 @@ class B2PMXEM_OT_MakeXML(bpy.types.Operator):
 
     def draw(self, context):
         directory = bpy.path.abspath("//")
-        files = [os.path.relpath(x, directory) for x in glob(os.path.join(directory, '*.pmx'))]
+        files = [os.path.relpath(x, directory) for x in pmx_files(directory)]
 
         layout = self.layout
         row = layout.split(factor=0.01)
@@ -582,95 +640,105 @@ class B2PMXEM_OT_SaveAsXML(bpy.types.Operator):
         if not os.path.isfile(filepath):
             return {'CANCELLED'}
 
-        with open(filepath, "rb") as f:
-            from .pmx import pmx
-            pmx_data = pmx.Model()
-            pmx_data.Load(f)
-
-        validate_result = validator.validate_pmx(pmx_data, use_japanese_name)
-        if validate_result:
-            msg = '\n'.join(validate_result)
-            bpy.ops.b2pmxem.multiline_message('INVOKE_DEFAULT',
-                                              type='ERROR',
-                                              lines=msg)
-            return {'CANCELLED'}
+        # make_xml never reads vertices and faces, leave them undecoded
+        from .pmx import lazy
+        model_cache = import_pmx.get_model_cache(prefs)
+        pmx_data = model_cache.Get(filepath, mesh=False) if model_cache is not None else None
+
+        if pmx_data is None:
+            with container.OpenModelFile(filepath, "rb") as f:
+                pmx_data = lazy.LazyModel()
+                pmx_data.Load(f)
+
+        try:
+            validate_result = validator.validate_pmx(pmx_data, use_japanese_name)
+            if validate_result:
+                msg = '\n'.join(validate_result)
+                bpy.ops.b2pmxem.multiline_message('INVOKE_DEFAULT',
+                                                  type='ERROR',
+                                                  lines=msg)
+                return {'CANCELLED'}
+
+            if props.make_xml_option == 'TRANSFER':
+                import_arm, import_obj = import_pmx.read_pmx_data(context, filepath, bone_transfer=True)
+                arm.data = import_arm.data
+
+                # Set active object
+                def set_active(obj):
+                    bpy.ops.object.select_all(action='DESELECT')
+                    obj.select_set(True)
+                    context.view_layer.objects.active = obj
+
+                set_active(import_obj)
+
+                # Select object
+                def select_object(obj):
+                    # Show object
+                    obj.hide_viewport = False
+                    obj.hide_select = False
+
+                    obj.select_set(True)
+
+                for obj in context.collection.objects:
+                    if obj.find_armature() == arm:
+                        select_object(obj)
+
+                        # Data Transfer
+                        bpy.ops.object.data_transfer(data_type='VGROUP_WEIGHTS',
+                                                     vert_mapping='NEAREST',
+                                                     ray_radius=0,
+                                                     layers_select_src='ALL',
+                                                     layers_select_dst='NAME',
+                                                     mix_mode='REPLACE',
+                                                     mix_factor=1)
+
+                # Unlink
+                context.collection.objects.unlink(import_obj)
+                context.collection.objects.unlink(import_arm)
+
+                set_active(arm)
+
+            else:
+                # Make XML
+                blender_bone_list = import_pmx.make_xml(pmx_data, filepath, use_japanese_name, xml_save_versions)
+
+                # --------------------
+                # Fix Armature
+                # --------------------
+                arm_obj = context.active_object
+
+                if props.make_xml_option == 'POSITION':
+                    # Set Bone Position
+                    import_pmx.Set_Bone_Position(pmx_data, arm_obj.data, blender_bone_list, fix=True)
+
+                    # BoneItem Direction
+                    bpy.ops.object.mode_set(mode="EDIT", toggle=False)
+                    bpy.ops.armature.select_all(action='SELECT')
+                    bpy.ops.b2pmxem.calculate_roll()
+                    bpy.ops.armature.select_all(action='DESELECT')
+                    bpy.ops.object.mode_set(mode='OBJECT')
+
+                # Set Bone Status
+                bpy.ops.object.mode_set(mode="POSE", toggle=False)
+                for (bone_index, data_bone) in enumerate(pmx_data.Bones):
+                    bone_name = blender_bone_list[bone_index]
+
+                    pb = arm_obj.pose.bones.get(bone_name)
+                    if pb is None:
+                        continue
+
+                    # Set IK
+                    if data_bone.UseIK != 0:
+                        pb["IKLoops"] = data_bone.IK.Loops
+                        pb["IKLimit"] = data_bone.IK.Limit
 
-        if props.make_xml_option == 'TRANSFER':
-            import_arm, import_obj = import_pmx.read_pmx_data(context, filepath, bone_transfer=True)
-            arm.data = import_arm.data
-
-            # Set active object
-            def set_active(obj):
-                bpy.ops.object.select_all(action='DESELECT')
-                obj.select_set(True)
-                context.view_layer.objects.active = obj
-
-            set_active(import_obj)
-
-            # Select object
-            def select_object(obj):
-                # Show object
-                obj.hide_viewport = False
-                obj.hide_select = False
-
-                obj.select_set(True)
-
-            for obj in context.collection.objects:
-                if obj.find_armature() == arm:
-                    select_object(obj)
-
-                    # Data Transfer
-                    bpy.ops.object.data_transfer(data_type='VGROUP_WEIGHTS',
-                                                 vert_mapping='NEAREST',
-                                                 ray_radius=0,
-                                                 layers_select_src='ALL',
-                                                 layers_select_dst='NAME',
-                                                 mix_mode='REPLACE',
-                                                 mix_factor=1)
-
-            # Unlink
-            context.collection.objects.unlink(import_obj)
-            context.collection.objects.unlink(import_arm)
-
-            set_active(arm)
-
-        else:
-            # Make XML
-            blender_bone_list = import_pmx.make_xml(pmx_data, filepath, use_japanese_name, xml_save_versions)
-
-            # --------------------
-            # Fix Armature
-            # --------------------
-            arm_obj = context.active_object
-
-            if props.make_xml_option == 'POSITION':
-                # Set Bone Position
-                import_pmx.Set_Bone_Position(pmx_data, arm_obj.data, blender_bone_list, fix=True)
-
-                # BoneItem Direction
-                bpy.ops.object.mode_set(mode="EDIT", toggle=False)
-                bpy.ops.armature.select_all(action='SELECT')
-                bpy.ops.b2pmxem.calculate_roll()
-                bpy.ops.armature.select_all(action='DESELECT')
                 bpy.ops.object.mode_set(mode='OBJECT')
 
-            # Set Bone Status
-            bpy.ops.object.mode_set(mode="POSE", toggle=False)
-            for (bone_index, data_bone) in enumerate(pmx_data.Bones):
-                bone_name = blender_bone_list[bone_index]
-
-                pb = arm_obj.pose.bones.get(bone_name)
-                if pb is None:
-                    continue
-
-                # Set IK
-                if data_bone.UseIK != 0:
-                    pb["IKLoops"] = data_bone.IK.Loops
-                    pb["IKLimit"] = data_bone.IK.Limit
-
-            bpy.ops.object.mode_set(mode='OBJECT')
-
-        return {'FINISHED'}
+            return {'FINISHED'}
+        finally:
+            # Release the mapping of the file, cached models are not mapped
+            if isinstance(pmx_data, lazy.LazyModel):
+                pmx_data.Close()
 
 
 class B2PMXEM_PT_EditPanel(bpy.types.Panel):
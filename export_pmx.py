@@ -1,6 +1,7 @@
 import bpy
 import mathutils as Math
 import os
+from array import array
 from math import radians
 from dataclasses import astuple
 
@@ -19,6 +20,8 @@ from bpy.types import Material
 from bpy.types import BlendDataObjects
 
 from .pmx import pmx
+from .pmx import container
+from .pmx.stream import StreamWriter
 from . import object_applymodifier
 from . import global_variable
 from . import validator
@@ -275,7 +278,17 @@ def as_vector(dc) -> Math.Vector:
     return Math.Vector(astuple(dc))
 
 
-MorphOffsetConverter = Callable[[XMLMorphOffsets], Generator[pmx.PMMorphOffset, None, None]]
+PMMorphOffsets = Union[pmx.PMGroupMorphOffset, pmx.PMBoneMorphOffset, pmx.PMMaterialMorphOffset]
+MorphOffsetConverter = Callable[[XMLMorphOffsets], Generator[PMMorphOffsets, None, None]]
+
+
+def iter_vertex_PMMorphOffset(indices: array, moves: array) -> Generator[pmx.PMVertexMorphOffset, None, None]:
+    # One offset at a time from the packed shape key offsets, for StreamWriter.WriteMorph
+    for i, index in enumerate(indices):
+        offset = pmx.PMVertexMorphOffset()
+        offset.Index = index
+        offset.Move = Math.Vector(moves[i * 3:i * 3 + 3])
+        yield offset
 
 
 def create_PMMorph(xml_morph: XMLMorph, type: int, converter: MorphOffsetConverter) -> pmx.PMMorph:
@@ -301,8 +314,8 @@ def create_PMMorph_dict(xml_morph_list: Dict[str, XMLMorph],
     return {k: v for k, v in filter_map()}
 
 
-def create_group_PMMorphOffset(xml_morph_offset: XMLGroupMorphOffset, morph_index: int) -> pmx.PMMorphOffset:
-    offset = pmx.PMMorphOffset()
+def create_group_PMMorphOffset(xml_morph_offset: XMLGroupMorphOffset, morph_index: int) -> pmx.PMGroupMorphOffset:
+    offset = pmx.PMGroupMorphOffset()
     offset.Index = morph_index
     offset.Power = xml_morph_offset.power
     return offset
@@ -310,7 +323,7 @@ def create_group_PMMorphOffset(xml_morph_offset: XMLGroupMorphOffset, morph_inde
 
 def create_group_PMMorph(xml_morph: XMLMorph, index_dict: Dict[str, int]) -> pmx.PMMorph:
 
-    def converter(offsets) -> Generator[pmx.PMMorphOffset, None, None]:
+    def converter(offsets) -> Generator[pmx.PMGroupMorphOffset, None, None]:
         for offset in offsets:
             for name, index in index_dict.items():
                 if offset.morph_name == name:
@@ -327,8 +340,8 @@ def pmx_euler2quat(eular: XMLRotate) -> Math.Vector:
     return Math.Vector((rotate_quat.x, rotate_quat.y, rotate_quat.z, rotate_quat.w))
 
 
-def create_bone_PMMorphOffset(xml_morph_offset: XMLBoneMorphOffset, bone_index: int) -> pmx.PMMorphOffset:
-    offset = pmx.PMMorphOffset()
+def create_bone_PMMorphOffset(xml_morph_offset: XMLBoneMorphOffset, bone_index: int) -> pmx.PMBoneMorphOffset:
+    offset = pmx.PMBoneMorphOffset()
     offset.Index = bone_index
     offset.Move = as_vector(xml_morph_offset.move)
     offset.Rotate = pmx_euler2quat(xml_morph_offset.rotate)
@@ -338,7 +351,7 @@ def create_bone_PMMorphOffset(xml_morph_offset: XMLBoneMorphOffset, bone_index:
 def create_bone_morph_dict(xml_morph_list: Dict[str, XMLMorph],
                            bone_name_list: List[str]) -> Dict[str, pmx.PMMorph]:
 
-    def converter(offsets) -> Generator[pmx.PMMorphOffset, None, None]:
+    def converter(offsets) -> Generator[pmx.PMBoneMorphOffset, None, None]:
         for offset in offsets:
             for i, name in enumerate(bone_name_list):
                 if offset.bone_name == name:
@@ -348,8 +361,9 @@ def create_bone_morph_dict(xml_morph_list: Dict[str, XMLMorph],
     return create_PMMorph_dict(xml_morph_list, 2, converter)
 
 
-def create_material_PMMorphOffset(xml_morph_offset: XMLMaterialMorphOffset, mat_index: int) -> pmx.PMMorphOffset:
-    offset = pmx.PMMorphOffset()
+def create_material_PMMorphOffset(xml_morph_offset: XMLMaterialMorphOffset,
+                                  mat_index: int) -> pmx.PMMaterialMorphOffset:
+    offset = pmx.PMMaterialMorphOffset()
     offset.Index = mat_index
     offset.MatEffectType = xml_morph_offset.effect_type
     offset.MatDiffuse = as_vector(xml_morph_offset.diffuse)
@@ -367,7 +381,7 @@ def create_material_PMMorphOffset(xml_morph_offset: XMLMaterialMorphOffset, mat_
 def create_material_morph_dict(xml_morph_list: Dict[str, XMLMorph],
                                mat_name_list: List[str]) -> Dict[str, pmx.PMMorph]:
 
-    def converter(offsets) -> Generator[pmx.PMMorphOffset, None, None]:
+    def converter(offsets) -> Generator[pmx.PMMaterialMorphOffset, None, None]:
         for offset in offsets:
             if offset.material_name is not None:
                 for i, name in enumerate(mat_name_list):
@@ -453,7 +467,7 @@ def write_pmx_data(context, filepath="",
 
     GV.SetStartTime()
 
-    with open(filepath, "wb") as f:
+    with container.OpenModelFile(filepath, "wb") as f:
 
         pmx_data = None
         pmx_data = pmx.Model()
@@ -461,8 +475,10 @@ def write_pmx_data(context, filepath="",
         #
         # XML
         #
-        file_name = bpy.path.basename(filepath)
-        xml_reader = supplement_xml_reader.SupplementXmlReader(file_name, filepath, use_japanese_name)
+        # The supplement XML of model.pmx.xz is model.xml
+        pmx_filepath = container.SplitCompression(filepath)[0]
+        file_name = bpy.path.basename(pmx_filepath)
+        xml_reader = supplement_xml_reader.SupplementXmlReader(file_name, pmx_filepath, use_japanese_name)
 
         if xml_reader.xml_root is not None:
             validate_result = validator.validate_xml(xml_reader.xml_root)
@@ -794,9 +810,26 @@ def write_pmx_data(context, filepath="",
         for tex, tex_index in tex_dic.items():
             pmx_data.Textures[tex_index].Path = tex
 
+        # Vertices are written to the file mesh by mesh,
+        # their count and the vertex index size are patched when the section ends
+        pmx_data.Status.VertexIndexSize = None
+        pmx_data.Status.TextureIndexSize = pmx.paramSize(pmx_data.Textures, 0)
+        pmx_data.Status.MaterialIndexSize = pmx.paramSize(pmx_data.Materials, 0)
+        pmx_data.Status.BoneIndexSize = pmx.paramSize(pmx_data.Bones, 0)
+        pmx_data.Status.MorphIndexSize = None
+        pmx_data.Status.RigidIndexSize = None
+
+        writer = StreamWriter(f, pmx_data.Status)
+        writer.WriteHeader(pmx_data.Name, pmx_data.Name_E, pmx_data.Comment, pmx_data.Comment_E)
+        writer.BeginSection("Vertices")
+
         # Face
         morph_list = {}
 
+        # Vertex morph offsets by shape key name, packed until the Morphs section
+        # (vertex indices, x y z moves)
+        vertex_morph_offsets = {}  # type: Dict[str, Tuple[array, array]]
+
         # read default_xml data
         xml_morph_list = xml_reader.morph()
 
@@ -859,6 +892,7 @@ def write_pmx_data(context, filepath="",
                         normals.setdefault(loop.vertex_index, loop.normal)
 
             # Get Vertex Position & Weight
+            mesh_vertices = []  # from base_vert_index
             for index, vert in enumerate(mesh.vertices):
                 pmx_vert = pmx.PMVertex()
                 pmx_vert.Position = GT(vert.co, mesh_mat)
@@ -922,7 +956,7 @@ def write_pmx_data(context, filepath="",
 
                 # pmx_vert.EdgeSize
                 # pmx_vert.AppendUV
-                pmx_data.Vertices.append(pmx_vert)
+                mesh_vertices.append(pmx_vert)
 
             # Get Face & UV
             uv_data = None
@@ -960,29 +994,31 @@ def write_pmx_data(context, filepath="",
                             pass
 
                         # Vertex update
-                        elif pmx_data.Vertices[temp_index].UV == Math.Vector((-1.0, -1.0)):
-                            pmx_data.Vertices[temp_index].UV = Math.Vector((target_uv[0], 1.0 - target_uv[1]))
+                        elif mesh_vertices[temp_index - base_vert_index].UV == Math.Vector((-1.0, -1.0)):
+                            target_vert = mesh_vertices[temp_index - base_vert_index]
+                            target_vert.UV = Math.Vector((target_uv[0], 1.0 - target_uv[1]))
                             vert_uv_dic[vert_key] = temp_index
 
                         # Vertex added
                         else:
                             new_vert = pmx.PMVertex()
+                            base_vert = mesh_vertices[temp_index - base_vert_index]
 
-                            new_vert.Position = pmx_data.Vertices[temp_index].Position
-                            new_vert.Normal = pmx_data.Vertices[temp_index].Normal
-                            new_vert.Type = pmx_data.Vertices[temp_index].Type
-                            new_vert.Bones = pmx_data.Vertices[temp_index].Bones
-                            new_vert.Weights = pmx_data.Vertices[temp_index].Weights
+                            new_vert.Position = base_vert.Position
+                            new_vert.Normal = base_vert.Normal
+                            new_vert.Type = base_vert.Type
+                            new_vert.Bones = base_vert.Bones
+                            new_vert.Weights = base_vert.Weights
 
-                            new_index = len(pmx_data.Vertices)
-                            pmx_data.Vertices.append(new_vert)
+                            new_index = base_vert_index + len(mesh_vertices)
+                            mesh_vertices.append(new_vert)
                             add_vertex_count += 1
 
                             copy_vert.setdefault(temp_index, [])
                             copy_vert[temp_index].append(new_index)
 
                             # Vertex update
-                            pmx_data.Vertices[new_index].UV = Math.Vector((target_uv[0], 1.0 - target_uv[1]))
+                            new_vert.UV = Math.Vector((target_uv[0], 1.0 - target_uv[1]))
                             vert_uv_dic[vert_key] = new_index
 
                         v.append(vert_uv_dic[vert_key])
@@ -1025,26 +1061,30 @@ def write_pmx_data(context, filepath="",
                             pmd_morph.Name_E = xml_morph.name_e if xml_morph.name_e is not None else block.name
                             pmd_morph.Panel = xml_morph.group
 
+                    indices, moves = vertex_morph_offsets.setdefault(block.name, (array("i"), array("f")))
+
                     # calculate relative morph position
                     morph_index = 0
                     for base_v, morph_v in zip(base_key.data, block.data):
                         if base_v.co != morph_v.co:
-                            v = pmx.PMMorphOffset()
-                            v.Index = morph_index + base_vert_index
-                            v.Move = GT(morph_v.co, mesh_mat) - GT(base_v.co, mesh_mat)
-                            pmd_morph.Offsets.append(v)
-
-                            if v.Index in copy_vert.keys():
-                                for i in copy_vert[v.Index]:
-                                    v2 = pmx.PMMorphOffset()
-                                    v2.Index = i
-                                    v2.Move = v.Move
-                                    pmd_morph.Offsets.append(v2)
+                            index = morph_index + base_vert_index
+                            move = GT(morph_v.co, mesh_mat) - GT(base_v.co, mesh_mat)
+                            indices.append(index)
+                            moves.extend(move)
+
+                            if index in copy_vert.keys():
+                                for i in copy_vert[index]:
+                                    indices.append(i)
+                                    moves.extend(move)
 
                         morph_index += 1
 
                     morph_list[block.name] = pmd_morph
 
+            # The vertices of this mesh are complete
+            for pmx_vert in mesh_vertices:
+                writer.Write(pmx_vert)
+
             base_vert_index += (len(mesh.vertices) + add_vertex_count)
 
             # remove modifier applied mesh
@@ -1052,6 +1092,7 @@ def write_pmx_data(context, filepath="",
                 apply_mod.Remove()
 
         apply_mod.finish()
+        writer.EndSection()
 
         # print NG_object_list
         if len(NG_object_list):
@@ -1067,12 +1108,13 @@ def write_pmx_data(context, filepath="",
 
         # Set Face
         # print("Get Face")
+        writer.BeginSection("Faces")
         for i, mat_name in enumerate(mat_name_List):
             pmx_mat = pmx_data.Materials[i]
             pmx_mat.FaceLength = len(faceTemp[mat_name])
 
-            for face in faceTemp[mat_name]:
-                pmx_data.Faces.append(face)
+            writer.Write(faceTemp[mat_name])
+        writer.EndSection()
 
         # Set Morph
 
@@ -1198,9 +1240,26 @@ def write_pmx_data(context, filepath="",
                 pmx_joint = create_PMJoint(joint, rigid_index)
                 pmx_data.Joints.append(pmx_joint)
 
-        pmx_data.Save(f)
+        writer.WriteSection("Textures", pmx_data.Textures)
+        writer.WriteSection("Materials", pmx_data.Materials)
+        writer.WriteSection("Bones", pmx_data.Bones)
+
+        # Vertex morphs are written offset by offset from the packed arrays
+        writer.BeginSection("Morphs", len(pmx_data.Morphs))
+        morph_offsets = {morph_tag_index[name]: offsets for name, offsets in vertex_morph_offsets.items()}
+        for index, morph in enumerate(pmx_data.Morphs):
+            if morph.Type == 1 and index in morph_offsets:
+                writer.WriteMorph(morph, iter_vertex_PMMorphOffset(*morph_offsets[index]))
+            else:
+                writer.Write(morph)
+        writer.EndSection()
+
+        writer.WriteSection("DisplayFrames", pmx_data.DisplayFrames)
+        writer.WriteSection("Rigids", pmx_data.Rigids)
+        writer.WriteSection("Joints", pmx_data.Joints)
+        writer.Close()
 
-        GV.SetVertCount(len(pmx_data.Vertices))
+        GV.SetVertCount(writer.Counts["Vertices"])
         GV.PrintTime(filepath, type='export')
 
     # finish notification
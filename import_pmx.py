@@ -6,6 +6,7 @@ import bpy
 import mathutils
 import os
 import math
+import numpy as np
 import xml.etree.ElementTree as etree
 import re
 
@@ -13,6 +14,8 @@ from . import add_function, global_variable
 from bpy_extras.node_shader_utils import PrincipledBSDFWrapper
 
 from .pmx import pmx
+from .pmx import container
+from .pmx import formats
 from .pmx.pmx import PMMorph
 from .pmx.pmx import PMMaterial
 from .pmx.pmx import PMTexture
@@ -60,6 +63,44 @@ def GT(vec, mat):  # GlobalTransformation
     return w
 
 
+def GT_Array(positions, mat):  # GlobalTransformation of N x 3 positions
+    v = np.ones((len(positions), 4), np.float64)
+    v[:, :3] = positions
+
+    w = v @ np.array(mat).T
+    return (w[:, :3] / w[:, 3:]).astype(np.float32)
+
+
+def add_vertex_weights(vert_group, vert_group_index, vertices):
+    types = vertices.Type
+
+    # BDEF1
+    bdef1 = np.flatnonzero(types == 0)
+    bones = vertices.Bones[bdef1, 0]
+    for bone in np.unique(bones).tolist():
+        vert_group[vert_group_index[bone]].add(bdef1[bones == bone].tolist(), 1.0, 'REPLACE')
+
+    # BDEF2 SDEF: [w, 1-w], BDEF4 QDEF: 4 weights
+    # Todo? SDEF QDEF
+    for column in range(4):
+        if column < 2:
+            indices = np.flatnonzero(types > 0)
+        else:
+            indices = np.flatnonzero((types == 2) | (types == 4))
+
+        bones = vertices.Bones[indices, column]
+        weights = vertices.Weights[indices, column]
+
+        # One add() per (bone, weight) run
+        order = np.lexsort((weights, bones))
+        indices, bones, weights = indices[order], bones[order], weights[order]
+        starts = np.flatnonzero(np.r_[True, (bones[1:] != bones[:-1]) | (weights[1:] != weights[:-1])])
+        ends = np.r_[starts[1:], len(indices)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            vert_group[vert_group_index[int(bones[start])]].add(indices[start:end].tolist(),
+                                                                float(weights[start]), 'ADD')
+
+
 def GT_normal(vec, mat):  # GlobalTransformation
     v = vec.copy()
     v.resize_4d()
@@ -238,6 +279,15 @@ def Set_Bone_Position(pmx_data, arm_dat, blender_bone_list, fix=False):
     return bone_id
 
 
+def get_model_cache(prefs):
+    # Decoded models of imported files, None if disabled in the preferences
+    if prefs.cache_size <= 0:
+        return None
+
+    from .pmx import cache
+    return cache.ModelCache(limit=prefs.cache_size * 1024 * 1024)
+
+
 def read_pmx_data(context, filepath="",
                   adjust_bone_position=False,
                   bone_transfer=False,
@@ -256,20 +306,26 @@ def read_pmx_data(context, filepath="",
     if bpy.ops.object.select_all.poll():
         bpy.ops.object.select_all(action='DESELECT')
 
-    with open(filepath, "rb") as f:
+    model_cache = get_model_cache(prefs)
+
+    with container.OpenModelFile(filepath, "rb") as f:
 
         from .pmx import pmx
-        pmx_data = pmx.Model()
-        pmx_data.Load(f)
-
-        if pmx_data.Status.Magic == 0:
-            # Echo("Loading Pmd ")
-            from . import pmd
-            from . import pmd2pmx
-            f.seek(0)
-            d_pmd = pmd.Model()
-            d_pmd.Load(f)
-            pmx_data = pmd2pmx.Convert(d_pmd)
+        pmx_data = model_cache.Get(filepath) if model_cache is not None else None
+
+        if pmx_data is None:
+            # PMD files are converted to a pmx.Model
+            pmx_data = formats.LoadAnyModel(f, bulk=True)
+
+            if model_cache is not None:
+                model_cache.Put(filepath, pmx_data)
+
+        # Mesh data is set from the column arrays
+        vertices = pmx_data.Vertices
+        if not isinstance(vertices, pmx.VertexBuffer):
+            vertices = pmx.VertexBuffer()
+            vertices.Extend(pmx_data.Vertices)
+        faces = np.asarray(pmx_data.Faces, np.int32)
 
         scene = context.scene
         base_path = os.path.dirname(filepath)
@@ -540,57 +596,23 @@ def read_pmx_data(context, filepath="",
         mesh.update()
 
         # Add Vertex
-        mesh.vertices.add(len(pmx_data.Vertices))
-
-        for vert_index, vert_data in enumerate(pmx_data.Vertices):
-            mesh.vertices[vert_index].co = GT(vert_data.Position, GlobalMatrix)
-            # mesh.vertices[vert_index].uv = pmx_data.Vertices[vert_index].UV
-
-            # BDEF1
-            if vert_data.Type == 0:
-                vert_group[vert_group_index[vert_data.Bones[0]]].add([vert_index], 1.0, 'REPLACE')
-
-            # BDEF2
-            elif vert_data.Type == 1:
-                vert_group[vert_group_index[vert_data.Bones[0]]].add([vert_index], vert_data.Weights[0], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[1]]].add([vert_index], 1.0 - vert_data.Weights[0], 'ADD')
-
-            # BDEF4
-            elif vert_data.Type == 2:
-                vert_group[vert_group_index[vert_data.Bones[0]]].add([vert_index], vert_data.Weights[0], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[1]]].add([vert_index], vert_data.Weights[1], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[2]]].add([vert_index], vert_data.Weights[2], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[3]]].add([vert_index], vert_data.Weights[3], 'ADD')
-
-            # SDEF
-            elif vert_data.Type == 3:
-                vert_group[vert_group_index[vert_data.Bones[0]]].add([vert_index], vert_data.Weights[0], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[1]]].add([vert_index], 1.0 - vert_data.Weights[0], 'ADD')
-                # Todo? SDEF
-
-            # QDEF
-            elif vert_data.Type == 4:
-                vert_group[vert_group_index[vert_data.Bones[0]]].add([vert_index], vert_data.Weights[0], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[1]]].add([vert_index], vert_data.Weights[1], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[2]]].add([vert_index], vert_data.Weights[2], 'ADD')
-                vert_group[vert_group_index[vert_data.Bones[3]]].add([vert_index], vert_data.Weights[3], 'ADD')
-                # Todo? QDEF
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set("co", GT_Array(vertices.Position, GlobalMatrix).ravel())
+        add_vertex_weights(vert_group, vert_group_index, vertices)
 
         mesh.update()
 
         # Add Face
-        poly_count = len(pmx_data.Faces) // 3
+        poly_count = len(faces) // 3
         mesh.polygons.add(poly_count)
         mesh.polygons.foreach_set("loop_start", range(0, poly_count * 3, 3))
         mesh.polygons.foreach_set("loop_total", (3,) * poly_count)
         mesh.polygons.foreach_set("use_smooth", (True,) * poly_count)
-        mesh.loops.add(len(pmx_data.Faces))
-        # mesh.loops.foreach_set("vertex_index" ,pmx_data.Faces)
+        mesh.loops.add(poly_count * 3)
 
-        for faceIndex in range(poly_count):
-            mesh.loops[faceIndex * 3].vertex_index = pmx_data.Faces[faceIndex * 3]
-            mesh.loops[faceIndex * 3 + 1].vertex_index = pmx_data.Faces[faceIndex * 3 + 2]
-            mesh.loops[faceIndex * 3 + 2].vertex_index = pmx_data.Faces[faceIndex * 3 + 1]
+        # Flip the winding order
+        loop_vertices = faces[:poly_count * 3].reshape(-1, 3)[:, (0, 2, 1)].ravel()
+        mesh.loops.foreach_set("vertex_index", loop_vertices)
 
         mesh.update()
 
@@ -669,33 +691,18 @@ def read_pmx_data(context, filepath="",
 
         mesh.uv_layers.active_index = 0
 
-        uv_data = mesh.uv_layers.active.data[:]
-
-        # uvtex = mesh.uv_textures.new("UV_Data")
-        # uv_data = uvtex.data
-
+        # Set Material
+        poly_materials = np.zeros(poly_count, np.int32)
         index = 0
         for dat in mat_status:
-            for i in range(dat[1] // 3):
-                # Set Material
-                mesh.polygons[index].material_index = dat[0]
-
-                # Set UV
-                poly_vert_index = mesh.polygons[index].loop_start
-                uv_data[poly_vert_index + 0].uv = pmx_data.Vertices[mesh.polygons[index].vertices[0]].UV
-                uv_data[poly_vert_index + 1].uv = pmx_data.Vertices[mesh.polygons[index].vertices[1]].UV
-                uv_data[poly_vert_index + 2].uv = pmx_data.Vertices[mesh.polygons[index].vertices[2]].UV
-
-                # Inv UV V
-                uv_data[poly_vert_index + 0].uv[1] = 1 - uv_data[poly_vert_index + 0].uv[1]
-                uv_data[poly_vert_index + 1].uv[1] = 1 - uv_data[poly_vert_index + 1].uv[1]
-                uv_data[poly_vert_index + 2].uv[1] = 1 - uv_data[poly_vert_index + 2].uv[1]
-
-                # TwoSide 2.6 not use?
-                # todo set parameter
-                # uv_data[index].use_twoside = True
+            poly_materials[index:index + dat[1] // 3] = dat[0]
+            index = index + dat[1] // 3
+        mesh.polygons.foreach_set("material_index", poly_materials)
 
-                index = index + 1
+        # Set UV, Inv UV V
+        loop_uv = vertices.UV[loop_vertices]
+        loop_uv[:, 1] = 1.0 - loop_uv[:, 1]
+        mesh.uv_layers.active.data.foreach_set("uv", loop_uv.ravel())
 
         mesh.update()
 
@@ -712,8 +719,12 @@ def read_pmx_data(context, filepath="",
                     blender_morph_name = Get_JP_or_EN_Name(data.Name, data.Name_E, use_japanese_name)
                     temp_key = obj_mesh.shape_key_add(name=blender_morph_name, from_mix=False)
 
-                    for v in data.Offsets:
-                        temp_key.data[v.Index].co += GT(v.Move, GlobalMatrix)
+                    offsets = data.OffsetArrays()
+                    key_co = np.empty(len(temp_key.data) * 3, np.float32)
+                    temp_key.data.foreach_get("co", key_co)
+                    key_co = key_co.reshape(-1, 3)
+                    np.add.at(key_co, offsets["Index"], GT_Array(offsets["Move"], GlobalMatrix))
+                    temp_key.data.foreach_set("co", key_co.ravel())
 
                     mesh.update()
 
@@ -731,7 +742,7 @@ def read_pmx_data(context, filepath="",
 def make_xml(pmx_data: pmx.Model, filepath, use_japanese_name, xml_save_versions):
 
     # filename
-    root, ext = os.path.splitext(filepath)
+    root, ext = os.path.splitext(container.SplitCompression(filepath)[0])
     xml_path = root + ".xml"
 
     num = 1
@@ -0,0 +1,284 @@
+#
+# bulk.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+import numpy as np
+from struct import calcsize
+
+from .codec import BufferReader
+
+# WeightType |[0:BDEF1 1:BDEF2 2:BDEF4 3:SDEF 4:QDEF]
+BONE_COUNTS = (1, 2, 4, 2, 4)
+WEIGHT_COUNTS = (0, 1, 4, 1, 4)
+SDEF = 3
+
+INDEX_DTYPES = {"B": "<u1", "H": "<u2", "b": "<i1", "h": "<i2", "i": "<i4"}
+
+
+def IndexDtype(format):
+    return np.dtype(INDEX_DTYPES[format])
+
+
+def VertexDtype(mode, weight_type):
+    # One PMX vertex record of the given weight type as a packed numpy dtype
+    fields = [("Position", "<f4", (3,)), ("Normal", "<f4", (3,)), ("UV", "<f4", (2,))]
+    if mode.AppendUVCount > 0:
+        fields.append(("AppendUV", "<f4", (mode.AppendUVCount, 4)))
+    fields.append(("Type", "<i1"))
+
+    fields.append(("Bones", IndexDtype(mode.BoneIndexSize), (BONE_COUNTS[weight_type],)))
+    if WEIGHT_COUNTS[weight_type] > 0:
+        fields.append(("Weights", "<f4", (WEIGHT_COUNTS[weight_type],)))
+    if weight_type == SDEF:
+        fields.append(("Sdef", "<f4", (3, 3)))
+
+    fields.append(("EdgeSize", "<f4"))
+    return np.dtype(fields)
+
+
+def VertexTypeOffset(mode):
+    return 32 + 16 * mode.AppendUVCount
+
+
+def VertexSizes(mode):
+    # Record size indexed by the raw (unsigned) weight type byte.
+    # Unknown types carry no weight data, DecodeVertices rejects them.
+    base = VertexTypeOffset(mode) + 1 + 4
+    bone_size = calcsize(mode.BoneIndexSize)
+    sizes = [base] * 256
+    for weight_type, bone_count in enumerate(BONE_COUNTS):
+        sizes[weight_type] = base + bone_size * bone_count + 4 * WEIGHT_COUNTS[weight_type]
+    sizes[SDEF] += 36
+    return sizes
+
+
+def ScanVertices(data, offset, count, mode, read=None):
+    # First pass: find the start of every vertex record from its weight type byte.
+    # If read is given, data must be a bytearray and is extended as needed.
+    # Returns (offsets, end)
+    sizes = VertexSizes(mode)
+    type_offset = VertexTypeOffset(mode)
+
+    if count == 0:
+        return np.zeros(0, np.int64), offset
+
+    # Uniform weight type: a single strided check is enough
+    first = data[offset + type_offset]
+    stride = sizes[first]
+    end = offset + count * stride
+    if end <= len(data):
+        types = np.frombuffer(data, np.uint8, count * stride, offset)[type_offset::stride]
+        uniform = bool((types == first).all())
+        del types  # release the buffer export, data may still grow below
+        if uniform:
+            return offset + np.arange(count, dtype=np.int64) * stride, end
+
+    offsets = []
+    append = offsets.append
+    pos = offset
+    while len(offsets) < count:
+        try:
+            for _ in range(count - len(offsets)):
+                next_pos = pos + sizes[data[pos + type_offset]]
+                append(pos)
+                pos = next_pos
+        except IndexError:
+            # The rest of the block is at least (remaining * BDEF1 record) long
+            chunk = b""
+            if read is not None:
+                chunk = read(pos + (count - len(offsets)) * sizes[0] - len(data))
+            if not chunk:
+                raise ValueError("vertex block is truncated at %d" % pos)
+            data += chunk
+
+    if pos > len(data) and read is not None:
+        data += read(pos - len(data))
+    if pos > len(data):
+        raise ValueError("vertex block is truncated at %d" % len(data))
+
+    return np.array(offsets, np.int64), pos
+
+
+def DecodeVertices(data, offsets, mode):
+    # Second pass: decode records grouped by weight type into column arrays
+    count = len(offsets)
+    arrays = {
+        "Position": np.zeros((count, 3), np.float32),
+        "Normal": np.zeros((count, 3), np.float32),
+        "UV": np.zeros((count, 2), np.float32),
+        "Type": np.zeros(count, np.int8),
+        "Bones": np.zeros((count, 4), np.int32),
+        "Weights": np.zeros((count, 4), np.float32),
+        "SdefC": np.zeros((count, 3), np.float32),
+        "SdefR0": np.zeros((count, 3), np.float32),
+        "SdefR1": np.zeros((count, 3), np.float32),
+        "EdgeSize": np.zeros(count, np.float32),
+        "AppendUV": [np.zeros((count, 4), np.float32) for _ in range(mode.AppendUVCount)],
+    }
+    if count == 0:
+        return arrays
+
+    raw = np.frombuffer(data, np.uint8)
+    types = raw[offsets + VertexTypeOffset(mode)].view(np.int8)
+    arrays["Type"][:] = types
+
+    weight_types = np.unique(types)
+    if weight_types[0] < 0 or weight_types[-1] >= len(BONE_COUNTS):
+        raise ValueError("unknown vertex weight type")
+
+    for weight_type in weight_types.tolist():
+        dtype = VertexDtype(mode, weight_type)
+        if len(weight_types) == 1 and offsets[-1] - offsets[0] == (count - 1) * dtype.itemsize:
+            select = slice(None)
+            records = np.frombuffer(data, dtype, count, int(offsets[0]))
+        else:
+            select = np.flatnonzero(types == weight_type)
+            gather = offsets[select, None] + np.arange(dtype.itemsize)
+            records = raw[gather].view(dtype)[:, 0]
+
+        arrays["Position"][select] = records["Position"]
+        arrays["Normal"][select] = records["Normal"]
+        arrays["UV"][select] = records["UV"]
+        arrays["EdgeSize"][select] = records["EdgeSize"]
+        for channel, append_uv in enumerate(arrays["AppendUV"]):
+            append_uv[select] = records["AppendUV"][:, channel]
+
+        bone_count = BONE_COUNTS[weight_type]
+        arrays["Bones"][select, :bone_count] = records["Bones"]
+
+        if WEIGHT_COUNTS[weight_type] == 0:  # BDEF1
+            arrays["Weights"][select, 0] = 1.0
+        elif WEIGHT_COUNTS[weight_type] == 1:  # BDEF2 SDEF
+            arrays["Weights"][select, 0] = records["Weights"][:, 0]
+            arrays["Weights"][select, 1] = 1.0 - records["Weights"][:, 0]
+        else:  # BDEF4 QDEF
+            arrays["Weights"][select] = records["Weights"]
+
+        if weight_type == SDEF:
+            arrays["SdefC"][select] = records["Sdef"][:, 0]
+            arrays["SdefR0"][select] = records["Sdef"][:, 1]
+            arrays["SdefR1"][select] = records["Sdef"][:, 2]
+
+    return arrays
+
+
+def ReadVertices(f, count, mode):
+    # Read a whole vertex block from f without reading past its end
+    if isinstance(f, BufferReader):
+        offsets, end = ScanVertices(f.Data, f.Offset, count, mode)
+        arrays = DecodeVertices(f.Data, offsets, mode)
+        f.Offset = end
+        return arrays
+
+    data = bytearray(f.read(count * VertexSizes(mode)[0]))
+    offsets, end = ScanVertices(data, 0, count, mode, f.read)
+    return DecodeVertices(data, offsets, mode)
+
+
+def EncodeVertices(vertices, mode):
+    # Pack the column arrays of a VertexBuffer into one vertex block.
+    # Records are built per weight type and scattered to their offsets.
+    types = np.asarray(vertices.Type, np.int8)
+    count = len(types)
+    if count == 0:
+        return b""
+    if types.min() < 0 or types.max() >= len(BONE_COUNTS):
+        raise ValueError("unknown vertex weight type")
+
+    sizes = np.array(VertexSizes(mode), np.int64)[types]
+    offsets = np.zeros(count, np.int64)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    append_uv = getattr(vertices, "AppendUV", [])
+
+    weight_types = np.unique(types).tolist()
+    data = None
+    for weight_type in weight_types:
+        dtype = VertexDtype(mode, weight_type)
+        if len(weight_types) == 1:
+            select = slice(None)
+            records = np.zeros(count, dtype)
+        else:
+            select = np.flatnonzero(types == weight_type)
+            records = np.zeros(len(select), dtype)
+
+        records["Position"] = vertices.Position[select]
+        records["Normal"] = vertices.Normal[select]
+        records["UV"] = vertices.UV[select]
+        for channel, channel_uv in enumerate(append_uv[:mode.AppendUVCount]):
+            records["AppendUV"][:, channel] = channel_uv[select]
+        records["Type"] = weight_type
+        records["EdgeSize"] = vertices.EdgeSize[select]
+
+        records["Bones"] = vertices.Bones[select, :BONE_COUNTS[weight_type]]
+        if WEIGHT_COUNTS[weight_type] > 0:
+            records["Weights"] = vertices.Weights[select, :WEIGHT_COUNTS[weight_type]]
+        if weight_type == SDEF:
+            records["Sdef"][:, 0] = vertices.SdefC[select]
+            records["Sdef"][:, 1] = vertices.SdefR0[select]
+            records["Sdef"][:, 2] = vertices.SdefR1[select]
+
+        if len(weight_types) == 1:
+            return records.tobytes()
+
+        if data is None:
+            data = np.zeros(int(offsets[-1] + sizes[-1]), np.uint8)
+        scatter = offsets[select, None] + np.arange(dtype.itemsize)
+        data[scatter] = records.view(np.uint8).reshape(-1, dtype.itemsize)
+
+    return data.tobytes()
+
+
+def WriteVertices(f, vertices, mode):
+    f.write(EncodeVertices(vertices, mode))
+
+
+def MorphOffsetDtype(mode, morph_type):
+    # One morph offset record as a packed numpy dtype, field names follow the PM*MorphOffset classes
+    if morph_type in (0, 9):  # 0:Group 9:Flip
+        return np.dtype([("Index", IndexDtype(mode.MorphIndexSize)), ("Power", "<f4")])
+    elif morph_type == 1:  # 1:Vertex
+        return np.dtype([("Index", IndexDtype(mode.VertexIndexSize)), ("Move", "<f4", (3,))])
+    elif morph_type == 2:  # 2:Bone
+        return np.dtype([("Index", IndexDtype(mode.BoneIndexSize)), ("Move", "<f4", (3,)),
+                         ("Rotate", "<f4", (4,))])
+    elif morph_type in (3, 4, 5, 6, 7):  # 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4
+        return np.dtype([("Index", IndexDtype(mode.VertexIndexSize)), ("UV", "<f4", (4,))])
+    elif morph_type == 8:  # 8:Material
+        return np.dtype([("Index", IndexDtype(mode.MaterialIndexSize)), ("MatEffectType", "<u1"),
+                         ("MatDiffuse", "<f4", (4,)), ("MatSpeculer", "<f4", (3,)), ("MatPower", "<f4"),
+                         ("MatAmbient", "<f4", (3,)), ("MatEdgeColor", "<f4", (4,)), ("MatEdgeSize", "<f4"),
+                         ("MatTexture", "<f4", (4,)), ("MatSphere", "<f4", (4,)), ("MatToon", "<f4", (4,))])
+    elif morph_type == 10:  # 10:Impulse
+        return np.dtype([("Index", IndexDtype(mode.RigidIndexSize)), ("IsLocal", "<u1"),
+                         ("Move", "<f4", (3,)), ("Torque", "<f4", (3,))])
+    raise ValueError("unknown morph type %d" % morph_type)
+
+
+def DecodeMorphOffsets(data, count, mode, morph_type):
+    # Offset block of one morph as column arrays.
+    # Index is int32, unsigned 255/65535 become -1 like ReadStruct.
+    records = np.frombuffer(data, MorphOffsetDtype(mode, morph_type), count)
+    arrays = {name: records[name].copy() for name in records.dtype.names}
+
+    index = records["Index"]
+    arrays["Index"] = index.astype(np.int32)
+    if index.dtype.kind == "u" and index.dtype.itemsize < 4:
+        arrays["Index"][index == np.iinfo(index.dtype).max] = -1
+    return arrays
+
+
+def ReadFaces(f, count, mode):
+    # Whole face block as one array of vertex indices, read in place
+    faces = np.empty(count, IndexDtype(mode.VertexIndexSize))
+    length = f.readinto(memoryview(faces).cast("B"))
+    if length != faces.nbytes:
+        raise ValueError("face block is truncated at %d" % length)
+    return faces
+
+
+def WriteFaces(f, faces, mode):
+    # -1 wraps to 255 / 65535 like WriteStruct
+    f.write(np.asarray(faces).astype(IndexDtype(mode.VertexIndexSize), copy=False).tobytes())
@@ -0,0 +1,239 @@
+#
+# cache.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+import hashlib
+import json
+import os
+import tempfile
+from copy import copy
+
+import numpy as np
+
+from .codec import BufferReader
+from .codec import BufferWriter
+from .pmx import Model
+from .pmx import VERTEX_COLUMNS
+from .pmx import VertexBuffer
+from .pmx import paramSize
+from .stream import INDEX_SIZES
+from .toc import LoadRecords
+from .toc import RECORDS
+
+# Bumped when the layout of an entry changes, older entries are ignored
+CACHE_VERSION = 1
+
+DEFAULT_LIMIT = 1 << 30  # bytes
+
+# ModelStatus attributes kept in the metadata
+STATUS_FIELDS = ("Magic", "Version", "Encode", "AppendUVCount", "VertexIndexSize", "TextureIndexSize",
+                 "MaterialIndexSize", "BoneIndexSize", "MorphIndexSize", "RigidIndexSize")
+
+# Source file -> [size, mtime, content hash], so unchanged files are not hashed again
+INDEX_FILE = "index.json"
+
+HASH_CHUNK = 1 << 20
+
+
+def DefaultDirectory():
+    return os.path.join(tempfile.gettempdir(), "blender2pmxem_cache")
+
+
+def FileHash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelCache(object):
+    # Decoded models on local disk.
+    # An entry is <hash>.npz with the vertex columns, the face indices and the other
+    # sections as encoded bytes, plus <hash>.json with the ModelStatus, names and counts.
+    # Entries are keyed by the content hash of the source file. The hash is reused
+    # while the file size and mtime are unchanged. The least recently used entries
+    # are removed when the entries take more than limit bytes.
+
+    def __init__(self, directory=None, limit=DEFAULT_LIMIT):
+        self.Directory = directory or DefaultDirectory()
+        self.Limit = limit
+
+    def EntryPath(self, key, ext):
+        return os.path.join(self.Directory, key + ext)
+
+    def ReadIndex(self):
+        try:
+            with open(os.path.join(self.Directory, INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def WriteIndex(self, index):
+        WriteAtomic(os.path.join(self.Directory, INDEX_FILE),
+                    json.dumps(index).encode("utf-8"))
+
+    def Key(self, path):
+        # Content hash of path, from the index while its size and mtime match
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        index = self.ReadIndex()
+
+        known = index.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        key = FileHash(path)
+        index[path] = [stat.st_size, stat.st_mtime_ns, key]
+        os.makedirs(self.Directory, exist_ok=True)
+        self.WriteIndex(index)
+        return key
+
+    def Get(self, path, mesh=True):
+        # The cached Model of path, or None.
+        # mesh | False leaves Vertices and Faces empty for callers that never read them
+        try:
+            key = self.Key(path)
+            with open(self.EntryPath(key, ".json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("CacheVersion") != CACHE_VERSION:
+                return None
+
+            with np.load(self.EntryPath(key, ".npz")) as arrays:
+                model = LoadEntry(meta, arrays, mesh)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # The metadata mtime is the last use for eviction
+        os.utime(self.EntryPath(key, ".json"))
+        return model
+
+    def Put(self, path, model):
+        # Store a decoded model of path, then evict the oldest entries over the limit.
+        # The cache only saves time, a failure to write it is ignored.
+        if self.Limit <= 0:
+            return
+
+        meta, arrays = SaveEntry(model)
+        meta["CacheVersion"] = CACHE_VERSION
+        try:
+            key = self.Key(path)
+
+            # np.savez adds ".npz" to names without it
+            npz_path = self.EntryPath(key, ".npz")
+            temp_path = npz_path + ".tmp.npz"
+            np.savez(temp_path, **arrays)
+            os.replace(temp_path, npz_path)
+            WriteAtomic(self.EntryPath(key, ".json"), json.dumps(meta).encode("utf-8"))
+
+            self.Evict()
+        except OSError:
+            pass
+
+    def Entries(self):
+        # [(last use, bytes, key)] of every entry, oldest first
+        entries = []
+        for name in os.listdir(self.Directory):
+            key, ext = os.path.splitext(name)
+            if ext != ".json" or name == INDEX_FILE:
+                continue
+            try:
+                meta_stat = os.stat(self.EntryPath(key, ".json"))
+                size = meta_stat.st_size + os.stat(self.EntryPath(key, ".npz")).st_size
+            except OSError:
+                continue
+            entries.append((meta_stat.st_mtime_ns, size, key))
+        entries.sort()
+        return entries
+
+    def Evict(self):
+        entries = self.Entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.Limit:
+                break
+            for ext in (".json", ".npz"):
+                try:
+                    os.remove(self.EntryPath(key, ext))
+                except OSError:
+                    pass
+            total -= size
+
+    def Clear(self):
+        for _, _, key in self.Entries():
+            for ext in (".json", ".npz"):
+                os.remove(self.EntryPath(key, ext))
+
+
+def WriteAtomic(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def SaveEntry(model):
+    # (metadata, arrays) of a cache entry
+    vertices = model.Vertices
+    if not isinstance(vertices, VertexBuffer):
+        vertices = VertexBuffer(0, len(vertices[0].AppendUV) if len(vertices) else 0)
+        vertices.Extend(model.Vertices)
+
+    # Records are encoded with index sizes for their counts, like Model.Save
+    mode = copy(model.Status)
+    for name, (attr, is_vert) in INDEX_SIZES.items():
+        setattr(mode, attr, paramSize(range(model.Count(name)), is_vert))
+
+    arrays = {"Faces": np.asarray(model.Faces)}
+    for name in VERTEX_COLUMNS:
+        arrays["Vertices." + name] = getattr(vertices, name)
+    for i, append_uv in enumerate(vertices.AppendUV):
+        arrays["Vertices.AppendUV%d" % i] = append_uv
+
+    counts = {"Vertices": len(vertices)}
+    for name in RECORDS:
+        if name == "Vertices":
+            continue
+        f = BufferWriter()
+        for record in getattr(model, name):
+            record.Save(f, mode)
+        arrays[name] = np.frombuffer(bytes(f.Data), np.uint8)
+        counts[name] = len(getattr(model, name))
+
+    meta = {
+        "Status": {field: getattr(mode, field) for field in STATUS_FIELDS},
+        "Name": model.Name,
+        "Name_E": model.Name_E,
+        "Comment": model.Comment,
+        "Comment_E": model.Comment_E,
+        "AppendUVCount": len(vertices.AppendUV),
+        "Counts": counts,
+    }
+    return meta, arrays
+
+
+def LoadEntry(meta, arrays, mesh=True):
+    model = Model()
+    for field, value in meta["Status"].items():
+        setattr(model.Status, field, value)
+    model.Name = meta["Name"]
+    model.Name_E = meta["Name_E"]
+    model.Comment = meta["Comment"]
+    model.Comment_E = meta["Comment_E"]
+
+    if mesh:
+        vertices = VertexBuffer()
+        for name in VERTEX_COLUMNS:
+            setattr(vertices, name, arrays["Vertices." + name])
+        vertices.AppendUV = [arrays["Vertices.AppendUV%d" % i] for i in range(meta["AppendUVCount"])]
+        model.Vertices = vertices
+        model.Faces = arrays["Faces"]
+
+    for name, count in meta["Counts"].items():
+        if name != "Vertices":
+            data = arrays[name].tobytes()
+            setattr(model, name, LoadRecords(BufferReader(data), name, count, model.Status))
+    return model
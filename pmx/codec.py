@@ -0,0 +1,221 @@
+#
+# codec.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+from functools import lru_cache
+from struct import Struct
+from typing import Dict
+
+
+@lru_cache(maxsize=None)
+def CompiledStruct(format):
+    return Struct(format)
+
+
+class BufferReader(object):
+    # File-like reader over one in-memory buffer shared by every record
+    Strict = False  # read fields with ReadStruct below instead of pmx.ReadStruct
+
+    def __init__(self, data, offset=0):
+        self.Data = data
+        self.Offset = offset
+
+    def read(self, size=-1):
+        end = len(self.Data) if size < 0 else min(self.Offset + size, len(self.Data))
+        data = bytes(self.Data[self.Offset:end])
+        self.Offset = end
+        return data
+
+    def readinto(self, b):
+        size = min(len(b), len(self.Data) - self.Offset)
+        b[:size] = self.Data[self.Offset:self.Offset + size]
+        self.Offset += size
+        return size
+
+    def tell(self):
+        return self.Offset
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.Offset
+        elif whence == 2:
+            offset += len(self.Data)
+        self.Offset = offset
+        return self.Offset
+
+
+class BufferWriter(object):
+    # File-like writer collecting records in one bytearray
+
+    def __init__(self):
+        self.Data = bytearray()
+
+    def write(self, data):
+        self.Data += data
+        return len(data)
+
+    def tell(self):
+        return len(self.Data)
+
+    def Flush(self, f):
+        # Hand the collected bytes to f in one write
+        if self.Data:
+            f.write(self.Data)
+            self.Data = bytearray()
+
+
+class Layout(object):
+    # A fixed run of record fields compiled into one little endian struct.
+    # Single "B"/"H" fields keep the ReadStruct/WriteStruct rule: 255/65535 <-> -1
+
+    def __init__(self, *formats):
+        self.Struct = Struct("<" + "".join(formats))
+        self.Size = self.Struct.size
+        self.Sentinels = []
+
+        index = 0
+        for format in formats:
+            if format == "B":
+                self.Sentinels.append((index, 255))
+            elif format == "H":
+                self.Sentinels.append((index, 65535))
+            part = Struct("<" + format)
+            index += len(part.unpack(bytes(part.size)))
+
+    def Unpack(self, data, offset=0):
+        values = self.Struct.unpack_from(data, offset)
+        if self.Sentinels:
+            values = list(values)
+            for index, mask in self.Sentinels:
+                if values[index] == mask:
+                    values[index] = -1
+        return values
+
+    def Read(self, f):
+        if isinstance(f, BufferReader):
+            values = self.Unpack(f.Data, f.Offset)
+            f.Offset += self.Size
+            return values
+        return self.Unpack(f.read(self.Size))
+
+    def Pack(self, values):
+        if self.Sentinels:
+            values = list(values)
+            for index, mask in self.Sentinels:
+                if values[index] == -1:
+                    values[index] = mask
+        return self.Struct.pack(*values)
+
+    def Write(self, f, values):
+        f.write(self.Pack(values))
+
+
+class Codec(object):
+    # Record layouts of one ModelStatus index size combination
+
+    def __init__(self, mode):
+        V = mode.VertexIndexSize
+        T = mode.TextureIndexSize
+        Ma = mode.MaterialIndexSize
+        Bo = mode.BoneIndexSize
+        Mo = mode.MorphIndexSize
+        R = mode.RigidIndexSize
+
+        # Index sizes the layouts were built for, a codec can stand in for its ModelStatus
+        self.AppendUVCount = mode.AppendUVCount
+        self.VertexIndexSize = V
+        self.TextureIndexSize = T
+        self.MaterialIndexSize = Ma
+        self.BoneIndexSize = Bo
+        self.MorphIndexSize = Mo
+        self.RigidIndexSize = R
+
+        self.Int = Layout("i")
+        self.Byte = Layout("B")
+
+        # Vertex
+        self.VertexHead = Layout("3f", "3f", "2f", *(["4f"] * mode.AppendUVCount), "b")
+        self.VertexWeights = {
+            0: Layout(Bo, "f"),  # 0:BDEF1
+            1: Layout(Bo, Bo, "f", "f"),  # 1:BDEF2
+            2: Layout(Bo, Bo, Bo, Bo, "4f", "f"),  # 2:BDEF4
+            3: Layout(Bo, Bo, "f", "3f", "3f", "3f", "f"),  # 3:SDEF
+            4: Layout(Bo, Bo, Bo, Bo, "4f", "f"),  # 4:QDEF
+        }
+        self.VertexEdge = Layout("f")
+
+        # Material
+        self.Material = Layout("4f", "3f", "f", "3f", "B", "4f", "f", T, T, "B", "B")
+        self.ToonByte = Layout("B")
+        self.ToonTexture = Layout(T)
+
+        # Bone
+        self.Bone = Layout("3f", Bo, "i", "H")
+        self.BoneTails = {}
+        self.BoneIndex = Bo
+        self.IK = Layout(Bo, "i", "f", "i")
+        self.IKLink = Layout(Bo, "B")
+        self.IKLimit = Layout("3f", "3f")
+
+        # Morph
+        self.Morph = Layout("B", "B", "i")
+        self.MorphOffsets = {
+            0: Layout(Mo, "f"),  # 0:Group
+            1: Layout(V, "3f"),  # 1:Vertex
+            2: Layout(Bo, "3f", "4f"),  # 2:Bone
+            3: Layout(V, "4f"),  # 3:UV
+            4: Layout(V, "4f"),  # 4:ExUV1
+            5: Layout(V, "4f"),  # 5:ExUV2
+            6: Layout(V, "4f"),  # 6:ExUV3
+            7: Layout(V, "4f"),  # 7:ExUV4
+            8: Layout(Ma, "B", "4f", "3f", "f", "3f", "4f", "f", "4f", "4f", "4f"),  # 8:Material
+            9: Layout(Mo, "f"),  # 9:Flip
+            10: Layout(R, "B", "3f", "3f"),  # 10:Impulse
+        }
+
+        # Display
+        self.DisplayFrame = Layout("B", "i")
+        self.DisplayBone = Layout(Bo)
+        self.DisplayMorph = Layout(Mo)
+
+        # Physics
+        self.Rigid = Layout(Bo, "B", "H", "B", "3f", "3f", "3f", "f", "f", "f", "f", "f", "B")
+        self.Joint = Layout("B", R, R, "3f", "3f", "3f", "3f", "3f", "3f", "3f", "3f")
+        self.SoftBody = Layout("B", Ma, "B", "H", "B", "i", "i", "f", "f", "i", "12f", "6f", "4i", "3f")
+        self.SoftBodyAnchor = Layout(R, V, "B")
+        self.SoftBodyPin = Layout(V)
+
+    def BoneTail(self, flag):
+        # Layout of the flag dependent part of a bone
+        key = flag & 0x3F01
+        layout = self.BoneTails.get(key)
+        if layout is None:
+            formats = ["3f" if flag & 0x0001 == 0 else self.BoneIndex]
+            if flag & 0x0300 != 0:
+                formats += [self.BoneIndex, "f"]
+            if flag & 0x0400 != 0:
+                formats += ["3f"]
+            if flag & 0x0800 != 0:
+                formats += ["3f", "3f"]
+            if flag & 0x2000 != 0:
+                formats += ["i"]
+            layout = self.BoneTails[key] = Layout(*formats)
+        return layout
+
+
+CODECS: Dict[tuple, Codec] = {}
+
+
+def GetCodec(mode):
+    key = (mode.AppendUVCount, mode.VertexIndexSize, mode.TextureIndexSize, mode.MaterialIndexSize,
+           mode.BoneIndexSize, mode.MorphIndexSize, mode.RigidIndexSize)
+    codec = CODECS.get(key)
+    if codec is None:
+        codec = CODECS[key] = Codec(mode)
+    return codec
@@ -0,0 +1,85 @@
+#
+# container.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+
+from .pmx import Model
+
+# Compressed containers by file extension, e.g. model.pmx.xz
+COMPRESSIONS = {
+    ".xz": lzma,
+    ".gz": gzip,
+    ".bz2": bz2,
+}
+
+# File objects of COMPRESSIONS, they report seekable() but can only seek forward while writing
+COMPRESSED_FILES = (lzma.LZMAFile, gzip.GzipFile, bz2.BZ2File)
+
+# Decompressed bytes handed to the decoders per read
+READ_CHUNK = 1 << 20
+
+# Glob for file browsers, plain and compressed
+FILTER_GLOB = ";".join(["*.pm[dx]"] + ["*.pm[dx]" + ext for ext in COMPRESSIONS])
+
+
+def SplitCompression(path):
+    # "model.pmx.xz" -> ("model.pmx", ".xz"), "model.pmx" -> ("model.pmx", "")
+    root, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSIONS:
+        return root, ext.lower()
+    return path, ""
+
+
+def OpenModelFile(path, mode="rb"):
+    # open() that compresses or decompresses by the extension of path.
+    # Compressed files are read through a large buffer, so record by record
+    # readers do not decompress in small steps.
+    _, ext = SplitCompression(path)
+    module = COMPRESSIONS.get(ext)
+    if module is None:
+        return open(path, mode)
+
+    f = module.open(path, mode)
+    if "r" in mode:
+        return io.BufferedReader(f, READ_CHUNK)
+    return f
+
+
+def IsSeekable(f):
+    # f.seekable() of a file that can also seek back to patch what was written
+    return f.seekable() and not isinstance(f, COMPRESSED_FILES)
+
+
+def LoadModel(path, bulk=False, strict=False):
+    # Model.Load of a plain or compressed file
+    model = Model()
+    with OpenModelFile(path, "rb") as f:
+        model.Load(f, bulk, strict=strict)
+    return model
+
+
+def SaveModel(model, path):
+    # Model.Save to a plain or compressed file.
+    # A new file next to path is moved over it when complete, so path may be the file
+    # a LazyModel is mapped from, and a failed save leaves the old file as it was.
+    root, ext = SplitCompression(path)
+    temp_path = root + ".tmp" + ext
+    try:
+        with OpenModelFile(temp_path, "wb") as f:
+            model.Save(f)
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,155 @@
+#
+# convert.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+# python -m pmx.convert SOURCE OUTPUT [--jobs N] [--compression xz] [--report report.json]
+#
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .container import COMPRESSIONS
+from .container import OpenModelFile
+from .container import SplitCompression
+from .formats import LoadAnyModelFile
+
+# Written to OUTPUT unless --report is given
+REPORT_FILE = "convert_report.json"
+
+
+def FindModels(source):
+    # PMX and PMD files under source, plain or compressed, sorted
+    if os.path.isfile(source):
+        return [source]
+
+    paths = []
+    for directory, _, names in os.walk(source):
+        for name in names:
+            root, _ = SplitCompression(name)
+            if os.path.splitext(root)[1].lower() in (".pmx", ".pmd"):
+                paths.append(os.path.join(directory, name))
+    paths.sort()
+    return paths
+
+
+def OutputPath(path, source, output, compression=""):
+    # output/<path relative to source>.pmx[.xz], for a single file output/<name>.pmx
+    if os.path.isfile(source):
+        relative = os.path.basename(path)
+    else:
+        relative = os.path.relpath(path, source)
+    root, _ = SplitCompression(relative)
+    root, _ = os.path.splitext(root)
+    return os.path.join(output, root + ".pmx" + compression)
+
+
+def ConvertFile(path, output_path):
+    # Worker task: load a PMX or PMD file and save it as PMX with the smallest index sizes.
+    # Returns (seconds, error message or None), a failed file does not stop the others.
+    start = time.perf_counter()
+    try:
+        model = LoadAnyModelFile(path, bulk=True)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        try:
+            with OpenModelFile(output_path, "wb") as f:
+                model.Save(f)
+        except BaseException:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+    except Exception as error:
+        return time.perf_counter() - start, "%s: %s" % (type(error).__name__, error)
+    return time.perf_counter() - start, None
+
+
+def RunTasks(tasks, jobs, report):
+    # Run (path, output_path) tasks in a new pool and report each result.
+    # Returns the tasks left unfinished by a worker that died, e.g. killed when out of memory,
+    # in submission order with the error. Such a crash breaks every task of the pool.
+    broken = {}
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {}
+        for task in tasks:
+            try:
+                futures[pool.submit(ConvertFile, *task)] = task
+            except BrokenProcessPool as crash:
+                broken[task] = "%s: %s" % (type(crash).__name__, crash)
+
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                seconds, error = future.result()
+            except BrokenProcessPool as crash:
+                broken[task] = "%s: %s" % (type(crash).__name__, crash)
+                continue
+            except Exception as exception:
+                seconds, error = 0.0, "%s: %s" % (type(exception).__name__, exception)
+            report(task, seconds, error)
+
+    return [(task, broken[task]) for task in tasks if task in broken]
+
+
+def ConvertTree(source, output, jobs=None, compression="", echo=print):
+    # Convert every model under source into output with one worker process per core.
+    # Returns the report entries: {"source", "output", "seconds", "error"}
+    paths = FindModels(source)
+    entries = []
+
+    def Report(task, seconds, error):
+        path, output_path = task
+        entries.append({"source": path, "output": output_path, "seconds": seconds, "error": error})
+        echo("[%d/%d] %.3fs %s%s" % (len(entries), len(paths), seconds, path,
+                                     "" if error is None else "  FAILED " + error))
+
+    tasks = [(path, OutputPath(path, source, output, compression)) for path in paths]
+    broken = RunTasks(tasks, jobs, Report)
+
+    # After a crash the unfinished files run again one by one in a single worker,
+    # where the first unfinished file is the one that crashed it
+    while broken:
+        broken = RunTasks([task for task, _ in broken], 1, Report)
+        if broken:
+            task, error = broken.pop(0)
+            if os.path.exists(task[1]):
+                os.remove(task[1])
+            Report(task, 0.0, error)
+
+    entries.sort(key=lambda entry: entry["source"])
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pmx.convert",
+                                     description="Convert and normalize PMD/PMX files to PMX")
+    parser.add_argument("source", help="a model file or a directory tree of them")
+    parser.add_argument("output", help="output directory, the tree of source is kept")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--compression", choices=sorted(ext[1:] for ext in COMPRESSIONS), help="compress the output")
+    parser.add_argument("--report", help="JSON report of every file (default: OUTPUT/%s)" % REPORT_FILE)
+    args = parser.parse_args(argv)
+
+    compression = "." + args.compression if args.compression else ""
+    start = time.perf_counter()
+    entries = ConvertTree(args.source, args.output, args.jobs, compression)
+    failed = [entry for entry in entries if entry["error"] is not None]
+
+    report = args.report or os.path.join(args.output, REPORT_FILE)
+    os.makedirs(os.path.dirname(os.path.abspath(report)), exist_ok=True)
+    with open(report, "w", encoding="utf-8") as f:
+        json.dump({"files": entries, "failed": len(failed)}, f, ensure_ascii=False, indent=1)
+
+    print("%d converted, %d failed in %.1fs, report: %s" %
+          (len(entries) - len(failed), len(failed), time.perf_counter() - start, report))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#
+# diff.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+# python -m pmx.diff old.pmx new.pmx [--tolerance 1e-5]
+#
+
+import argparse
+import hashlib
+import sys
+from copy import copy
+
+import numpy as np
+
+from .codec import BufferWriter
+from .container import OpenModelFile
+from .lazy import LazyModel
+from .pmx import VERTEX_COLUMNS
+from .toc import SECTIONS
+
+# Sections compared record by record, and the attribute that identifies a record
+RECORD_KEYS = {
+    "Textures": "Path",
+    "Materials": "Name",
+    "Bones": "Name",
+    "Morphs": "Name",
+    "DisplayFrames": "Name",
+    "Rigids": "Name",
+    "Joints": "Name",
+    "SoftBodies": "Name",
+}
+
+
+def Fingerprint(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def SectionFingerprints(model):
+    # Hash of the raw bytes of every section of a LazyModel that was not decoded yet
+    return {name: Fingerprint(raw.Data) for name, raw in model.RawSections.items()}
+
+
+def RecordFingerprints(records, mode):
+    # Hash of every record, encoded as UTF-8 with 4 byte indices so that
+    # files with other index sizes or encodings give the same hashes
+    mode = copy(mode)
+    mode.Encode = 1
+    for name in ("VertexIndexSize", "TextureIndexSize", "MaterialIndexSize",
+                 "BoneIndexSize", "MorphIndexSize", "RigidIndexSize"):
+        setattr(mode, name, "i")
+
+    fingerprints = []
+    for record in records:
+        f = BufferWriter()
+        record.Save(f, mode)
+        fingerprints.append(Fingerprint(f.Data))
+    return fingerprints
+
+
+def RecordKeys(records, attr):
+    # Identifying attribute of every record, repeated ones get "#2", "#3"...
+    seen = {}
+    keys = []
+    for record in records:
+        key = getattr(record, attr)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else "%s#%d" % (key, seen[key]))
+    return keys
+
+
+class PMDiff(object):
+
+    def __init__(self):
+        self.Header = []  # Name, Name_E, Comment, Comment_E that differ
+        self.Sections = []  # names of the sections whose bytes differ
+
+        # Section name -> record keys, see RECORD_KEYS
+        self.Added = {}
+        self.Removed = {}
+        self.Changed = {}
+
+        self.VertexCounts = (0, 0)
+        self.MovedVertices = np.zeros(0, np.int64)  # Position moved more than the tolerance
+        self.ChangedVertices = np.zeros(0, np.int64)  # any other column changed
+        self.FaceCounts = (0, 0)
+        self.ChangedFaces = np.zeros(0, np.int64)  # triangles with other vertex indices
+
+    def IsEmpty(self):
+        return not self.Header and not self.Sections
+
+    def Report(self):
+        # Human readable lines
+        lines = ["%s: changed" % attr for attr in self.Header]
+        if self.VertexCounts[0] != self.VertexCounts[1]:
+            lines.append("Vertices: %d -> %d" % self.VertexCounts)
+        if len(self.MovedVertices):
+            lines.append("Vertices: %d moved" % len(self.MovedVertices))
+        if len(self.ChangedVertices):
+            lines.append("Vertices: %d changed" % len(self.ChangedVertices))
+
+        if self.FaceCounts[0] != self.FaceCounts[1]:
+            lines.append("Faces: %d -> %d" % self.FaceCounts)
+        if len(self.ChangedFaces):
+            lines.append("Faces: %d changed" % len(self.ChangedFaces))
+
+        for name in SECTIONS:
+            for label, keys in (("+", self.Added), ("-", self.Removed), ("~", self.Changed)):
+                for key in keys.get(name, []):
+                    lines.append("%s: %s %s" % (name, label, key))
+
+        reported = {line.split(":")[0] for line in lines}
+        for name in self.Sections:
+            if name not in reported:
+                lines.append("%s: changed" % name)
+        return lines
+
+
+def DiffVertices(diff, a, b, tolerance):
+    # Column comparisons over the rows both buffers have
+    diff.VertexCounts = (len(a), len(b))
+    count = min(len(a), len(b))
+
+    distance = np.linalg.norm(a.Position[:count] - b.Position[:count], axis=1)
+    diff.MovedVertices = np.flatnonzero(distance > tolerance)
+
+    changed = np.zeros(count, bool)
+    for name in VERTEX_COLUMNS:
+        if name == "Position":
+            continue
+        column_a = getattr(a, name)[:count]
+        column_b = getattr(b, name)[:count]
+        if column_a.dtype.kind == "f":
+            delta = np.abs(column_a - column_b) > tolerance
+        else:
+            delta = column_a != column_b
+        changed |= delta.reshape(count, -1).any(axis=1)
+
+    for append_a, append_b in zip(a.AppendUV, b.AppendUV):
+        changed |= (np.abs(append_a[:count] - append_b[:count]) > tolerance).any(axis=1)
+    diff.ChangedVertices = np.flatnonzero(changed)
+
+
+def DiffFaces(diff, a, b):
+    diff.FaceCounts = (len(a), len(b))
+    count = min(len(a), len(b)) // 3 * 3
+    triangles_a = np.asarray(a[:count], np.int64).reshape(-1, 3)
+    triangles_b = np.asarray(b[:count], np.int64).reshape(-1, 3)
+    diff.ChangedFaces = np.flatnonzero((triangles_a != triangles_b).any(axis=1))
+
+
+def DiffRecords(diff, name, a, b, mode_a, mode_b):
+    attr = RECORD_KEYS[name]
+    fingerprints_a = dict(zip(RecordKeys(a, attr), RecordFingerprints(a, mode_a)))
+    fingerprints_b = dict(zip(RecordKeys(b, attr), RecordFingerprints(b, mode_b)))
+
+    added = [key for key in fingerprints_b if key not in fingerprints_a]
+    removed = [key for key in fingerprints_a if key not in fingerprints_b]
+    changed = [key for key in fingerprints_a
+               if key in fingerprints_b and fingerprints_a[key] != fingerprints_b[key]]
+
+    if added:
+        diff.Added[name] = added
+    if removed:
+        diff.Removed[name] = removed
+    if changed:
+        diff.Changed[name] = changed
+
+
+def DiffModels(model_a, model_b, tolerance=1e-5):
+    # Structural diff of two LazyModels loaded with bulk=True.
+    # Sections with the same bytes are skipped without being decoded.
+    diff = PMDiff()
+    for attr in ("Name", "Name_E", "Comment", "Comment_E"):
+        if getattr(model_a, attr) != getattr(model_b, attr):
+            diff.Header.append(attr)
+
+    fingerprints_a = SectionFingerprints(model_a)
+    fingerprints_b = SectionFingerprints(model_b)
+
+    for name in SECTIONS:
+        if name in fingerprints_a and fingerprints_a.get(name) == fingerprints_b.get(name):
+            continue
+        diff.Sections.append(name)
+
+    for name in diff.Sections:
+        a = getattr(model_a, name)
+        b = getattr(model_b, name)
+        if name == "Vertices":
+            DiffVertices(diff, a, b, tolerance)
+        elif name == "Faces":
+            DiffFaces(diff, a, b)
+        else:
+            DiffRecords(diff, name, a, b, model_a.Status, model_b.Status)
+
+    if "Vertices" not in diff.Sections:
+        diff.VertexCounts = (model_a.Count("Vertices"),) * 2
+    if "Faces" not in diff.Sections:
+        diff.FaceCounts = (model_a.Count("Faces"),) * 2
+    return diff
+
+
+def DiffFiles(path_a, path_b, tolerance=1e-5):
+    with LazyModel() as model_a, LazyModel() as model_b:
+        with OpenModelFile(path_a) as f:
+            model_a.Load(f, bulk=True)
+        with OpenModelFile(path_b) as f:
+            model_b.Load(f, bulk=True)
+        return DiffModels(model_a, model_b, tolerance)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pmx.diff", description="Structural diff of two PMX files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="vertex tolerance")
+    args = parser.parse_args(argv)
+
+    diff = DiffFiles(args.old, args.new, args.tolerance)
+    for line in diff.Report():
+        print(line)
+    return 0 if diff.IsEmpty() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
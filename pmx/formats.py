@@ -0,0 +1,73 @@
+#
+# formats.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+from . import pmd
+from . import pmd2pmx
+from .container import OpenModelFile
+from .pmx import Model
+
+# Bytes read to tell the formats apart
+MAGIC_SIZE = 4
+
+# (magic bytes, loader) in registration order.
+# A loader reads f from its start and returns a pmx.Model.
+FORMATS: List[Tuple[bytes, Callable]] = []
+
+
+def RegisterFormat(magic, loader):
+    FORMATS.append((magic, loader))
+
+
+def LoadPmx(f, bulk=False):
+    model = Model()
+    model.Load(f, bulk)
+    return model
+
+
+def LoadPmd(f, bulk=False):
+    d_pmd = pmd.Model()
+    d_pmd.Load(f, bulk)
+    return pmd2pmx.Convert(d_pmd)
+
+
+RegisterFormat(b"PMX ", LoadPmx)
+RegisterFormat(b"Pmd", LoadPmd)
+
+
+def PeekMagic(f):
+    # The first bytes of f, which is left where it was.
+    # Buffered readers seek back within their buffer, compressed files are not rewound.
+    start = f.tell()
+    magic = f.read(MAGIC_SIZE)
+    f.seek(start)
+    return magic
+
+
+def FindLoader(f):
+    magic = PeekMagic(f)
+    for prefix, loader in FORMATS:
+        if magic.startswith(prefix):
+            return loader
+    return None
+
+
+def LoadAnyModel(f, bulk=False):
+    # A pmx.Model of a PMX or PMD file, parsed once by the loader of its format
+    loader = FindLoader(f)
+    if loader is None:
+        raise ValueError("unknown model format")
+    return loader(f, bulk)
+
+
+def LoadAnyModelFile(path, bulk=False):
+    # LoadAnyModel of a plain or compressed file
+    with OpenModelFile(path, "rb") as f:
+        return LoadAnyModel(f, bulk)
@@ -0,0 +1,144 @@
+#
+# lazy.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+import io
+import mmap
+import os
+
+from .codec import BufferReader
+from .pmx import Model
+from .pmx import PMRawSection
+from .pmx import ReadString
+from .toc import LoadRecords
+from .toc import SECTIONS
+from .toc import ScanSections
+
+
+class LazyModel(Model):
+    # pmx.Model that maps the file and decodes each section on first access.
+    # Name, Name_E, Comment and Comment_E are decoded by Load.
+    # Sections that are never accessed stay in RawSections and Save copies them.
+
+    def __init__(self):
+        super().__init__()
+        for name in SECTIONS:
+            delattr(self, name)
+
+        self.Bulk = False
+        self.Contents = None
+        self.Map = None
+        self.MapFile = None  # (st_dev, st_ino) of the mapped file
+
+    def Load(self, f, bulk=False):
+        # bulk | Decode Vertices and Faces like Model.Load(f, bulk=True)
+        self.Close()
+        self.Bulk = bulk
+        for name in SECTIONS:
+            self.__dict__.pop(name, None)
+
+        # Compressed streams also have fileno(), only map plain files
+        if isinstance(getattr(f, "raw", f), io.FileIO):
+            try:
+                self.Map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                stat = os.fstat(f.fileno())
+                self.MapFile = (stat.st_dev, stat.st_ino)
+            except (OSError, ValueError):  # e.g. empty file
+                self.Map = None
+
+        if self.Map is not None:
+            data = memoryview(self.Map)[f.tell():]
+        else:
+            data = memoryview(f.read())
+
+        self.Contents = ScanSections(BufferReader(data))
+        self.Status = self.Contents.Status
+
+        if self.Status.Magic == 1:  # PMX
+            reader = BufferReader(data, self.Contents.NameOffset)
+            self.Name = ReadString(reader, self.Status)
+            self.Name_E = ReadString(reader, self.Status)
+            self.Comment = ReadString(reader, self.Status).replace("\r", "")
+            self.Comment_E = ReadString(reader, self.Status).replace("\r", "")
+
+            for section in self.Contents:
+                data_slice = data[section.Offset:section.End]
+                self.RawSections[section.Name] = PMRawSection(data_slice, section.Count, self.Status)
+        data.release()
+
+    def IsLoaded(self, name):
+        return name in self.__dict__
+
+    def LoadAll(self):
+        for name in SECTIONS:
+            getattr(self, name)
+
+    def IsMappedFile(self, f):
+        if self.Map is None:
+            return False
+        try:
+            stat = os.fstat(f.fileno())
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+        return (stat.st_dev, stat.st_ino) == self.MapFile
+
+    def Detach(self):
+        # Copy the sections that were not accessed out of the mapping and release it,
+        # so the mapped file may be written. Save still copies them.
+        for raw in self.RawSections.values():
+            data = bytes(raw.Data)
+            raw.Data.release()
+            raw.Data = memoryview(data)
+
+        if self.Map is not None:
+            self.Map.close()
+            self.Map = None
+            self.MapFile = None
+
+    def Save(self, f):
+        # Opening the mapped file for writing truncates it under the mapping,
+        # container.SaveModel writes a new file and moves it over instead
+        if self.IsMappedFile(f):
+            if os.fstat(f.fileno()).st_size < len(self.Map):
+                raise ValueError("the mapped file was truncated before saving, use container.SaveModel")
+            self.Detach()
+        super().Save(f)
+
+    def Close(self):
+        # Release the mapping. Sections that were not accessed yet can not be loaded
+        # or saved any more, call LoadAll first to keep them.
+        for raw in self.RawSections.values():
+            raw.Data.release()
+        self.RawSections = {}
+
+        if self.Map is not None:
+            self.Map.close()
+            self.Map = None
+            self.MapFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet
+        if name not in SECTIONS:
+            raise AttributeError(name)
+
+        # A decoded section may be changed, Save encodes it from now on
+        raw = self.__dict__.get("RawSections", {}).pop(name, None)
+        if raw is None:
+            value = []
+        else:
+            try:
+                value = LoadRecords(BufferReader(raw.Data), name, raw.Count, raw.Status, self.Bulk)
+            finally:
+                raw.Data.release()
+
+        setattr(self, name, value)
+        return value
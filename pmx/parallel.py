@@ -0,0 +1,149 @@
+#
+# parallel.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+import os
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .bulk import DecodeVertices
+from .bulk import ReadFaces
+from .bulk import ScanVertices
+from .codec import BufferReader
+from .pmx import ReadString
+from .pmx import VertexBuffer
+from .toc import LoadRecords
+from .toc import ScanSections
+
+# Vertices decoded by one worker task, smaller blocks are decoded in place
+VERTEX_CHUNK = 1 << 16
+
+
+def VertexColumns(count, mode):
+    # (name, dtype, shape, offset) of every VertexBuffer column in one shared block, and its size
+    columns = [
+        ("Position", "<f4", (count, 3)),
+        ("Normal", "<f4", (count, 3)),
+        ("UV", "<f4", (count, 2)),
+        ("Type", "<i1", (count,)),
+        ("Bones", "<i4", (count, 4)),
+        ("Weights", "<f4", (count, 4)),
+        ("SdefC", "<f4", (count, 3)),
+        ("SdefR0", "<f4", (count, 3)),
+        ("SdefR1", "<f4", (count, 3)),
+        ("EdgeSize", "<f4", (count,)),
+    ]
+    columns += [("AppendUV%d" % i, "<f4", (count, 4)) for i in range(mode.AppendUVCount)]
+
+    layout = []
+    size = 0
+    for name, dtype, shape in columns:
+        layout.append((name, dtype, shape, size))
+        size += -(-np.dtype(dtype).itemsize * int(np.prod(shape)) // 8) * 8
+    return layout, size
+
+
+def ColumnArrays(buffer, layout):
+    return {name: np.ndarray(shape, dtype, buffer, offset) for name, dtype, shape, offset in layout}
+
+
+def DecodeVertexChunk(source_name, target_name, layout, offsets, start, mode):
+    # Worker task: decode the records at offsets of the source block into rows start.. of the target block
+    source = shared_memory.SharedMemory(source_name)
+    target = shared_memory.SharedMemory(target_name)
+    try:
+        arrays = DecodeVertices(source.buf, offsets, mode)
+        for i, append_uv in enumerate(arrays.pop("AppendUV")):
+            arrays["AppendUV%d" % i] = append_uv
+
+        columns = ColumnArrays(target.buf, layout)
+        for name, column in columns.items():
+            column[start:start + len(offsets)] = arrays[name]
+        del columns
+    finally:
+        source.close()
+        target.close()
+
+
+def DecodeVerticesParallel(data, offset, count, mode, executor, overlap=None):
+    # Decode a vertex block in worker processes and return (VertexBuffer, end).
+    # The block and the decoded columns are passed in shared memory, only offsets are pickled.
+    # overlap is called while the workers run.
+    offsets, end = ScanVertices(data, offset, count, mode)
+    layout, size = VertexColumns(count, mode)
+    block = data[offset:end]
+
+    source = shared_memory.SharedMemory(create=True, size=max(len(block), 1))
+    target = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        source.buf[:len(block)] = block
+        offsets -= offset
+
+        chunk = max(VERTEX_CHUNK, -(-count // (os.cpu_count() or 1)))
+        tasks = [executor.submit(DecodeVertexChunk, source.name, target.name, layout,
+                                 offsets[start:start + chunk], start, mode)
+                 for start in range(0, count, chunk)]
+        if overlap is not None:
+            overlap()
+        for task in tasks:
+            task.result()
+
+        # Copy out so that the shared blocks can be released
+        columns = ColumnArrays(target.buf, layout)
+        arrays = {name: column.copy() for name, column in columns.items()}
+        del columns
+    finally:
+        source.close()
+        source.unlink()
+        target.close()
+        target.unlink()
+
+    vertices = VertexBuffer()
+    vertices.AppendUV = [arrays.pop("AppendUV%d" % i) for i in range(mode.AppendUVCount)]
+    for name, array in arrays.items():
+        setattr(vertices, name, array)
+    return vertices, end
+
+
+def LoadParallel(model, f, executor=True):
+    # Model.Load(f, parallel=executor).
+    # The vertex block is decoded in worker processes while the other sections
+    # are decoded here. executor is True for a pool of this load only,
+    # or a concurrent.futures.Executor that is kept by the caller.
+    data = f.read()
+    contents = ScanSections(BufferReader(data))
+    model.Status = contents.Status
+    mode = model.Status
+    if mode.Magic != 1 or mode.HasError:
+        return
+
+    reader = BufferReader(data, contents.NameOffset)
+    model.Name = ReadString(reader, mode)
+    model.Name_E = ReadString(reader, mode)
+    model.Comment = ReadString(reader, mode).replace("\r", "")
+    model.Comment_E = ReadString(reader, mode).replace("\r", "")
+
+    def LoadOthers():
+        faces = contents["Faces"]
+        model.Faces = ReadFaces(BufferReader(data, faces.Offset), faces.Count, mode)
+
+        for section in contents:
+            if section.Name not in ("Vertices", "Faces"):
+                records = LoadRecords(BufferReader(data, section.Offset), section.Name, section.Count, mode)
+                setattr(model, section.Name, records)
+
+    vertices = contents["Vertices"]
+    if vertices.Count <= VERTEX_CHUNK:
+        model.Vertices = LoadRecords(BufferReader(data, vertices.Offset), "Vertices", vertices.Count, mode, True)
+        LoadOthers()
+    elif isinstance(executor, Executor):
+        model.Vertices, _ = DecodeVerticesParallel(data, vertices.Offset, vertices.Count, mode, executor, LoadOthers)
+    else:
+        with ProcessPoolExecutor() as pool:
+            model.Vertices, _ = DecodeVerticesParallel(data, vertices.Offset, vertices.Count, mode, pool, LoadOthers)
@@ -5,9 +5,10 @@
 # pmd.py : 20111203 v 5.0
 #
 import mathutils
-from struct import calcsize
-from struct import unpack
-from struct import pack
+import numpy as np
+from itertools import chain
+
+from .codec import CompiledStruct
 
 DEBUG = False
 
@@ -19,9 +20,9 @@ def Echo(data):
 
 def ReadStruct(f, format):  # Read Struct
     try:
-        length = calcsize(format)
-        dat = f.read(length)
-        p = unpack(format, dat)
+        compiled = CompiledStruct(format)
+        dat = f.read(compiled.size)
+        p = compiled.unpack(dat)
         if len(p) < 2:
             q = p[0]
             if format == "B" and q == 255:
@@ -36,15 +37,16 @@ def ReadStruct(f, format):  # Read Struct
 
 
 def WriteStruct(f, format, data):  # Write Struct
+    compiled = CompiledStruct(format)
     if isinstance(data, tuple):
-        f.write(pack(format, *data))
+        f.write(compiled.pack(*data))
     else:
         if format == "B" and data == -1:
-            f.write(pack(format, 255))
+            f.write(compiled.pack(255))
         elif format == "H" and data == -1:
-            f.write(pack(format, 65535))
+            f.write(compiled.pack(65535))
         else:
-            f.write(pack(format, data))
+            f.write(compiled.pack(data))
 
 
 def ReadString(f, mode):  # Read String
@@ -116,7 +118,9 @@ class Model(object):
 
         self.UseEnglish = 1
 
-    def Load(self, f):
+    def Load(self, f, bulk=False):
+        # bulk | Keep the vertex block as a columnar PMDVertexBuffer
+        #      | and the poly block as a numpy index array
         # Header
         Echo("Load PMD File...")
         self.Header = PMDHeader()
@@ -127,23 +131,30 @@ class Model(object):
             return None
 
         # Vertex
-        count = ReadStruct(f, "L")
+        count = ReadStruct(f, "I")
         Echo("Vertex...%d from:%d" % (count, f.tell() - 4))
-        for i in range(count):
-            temp = PMDVertex()
-            temp.Load(f)
-            self.Vertices.append(temp)
+        if bulk:
+            self.Vertices = PMDVertexBuffer()
+            self.Vertices.Load(f, count)
+        else:
+            for i in range(count):
+                temp = PMDVertex()
+                temp.Load(f)
+                self.Vertices.append(temp)
 
         # Pory
-        count = ReadStruct(f, "L")
+        count = ReadStruct(f, "I")
         Echo("Pory...%d from:%d" % (count, f.tell() - 4))
-        for i in range(count):
-            temp = PMDPoly()
-            temp.Load(f)
-            self.Polys.append(temp)
+        if bulk:
+            self.Polys = ReadPolys(f, count)
+        else:
+            for i in range(count):
+                temp = PMDPoly()
+                temp.Load(f)
+                self.Polys.append(temp)
 
         # Material
-        count = ReadStruct(f, "L")
+        count = ReadStruct(f, "I")
         Echo("Material...%d from:%d" % (count, f.tell() - 4))
         for i in range(count):
             temp = PMDMaterial()
@@ -191,7 +202,7 @@ class Model(object):
             self.DispNames.append(temp)
 
         # BoneIndex
-        count = ReadStruct(f, "L")
+        count = ReadStruct(f, "I")
         Echo("BoneIndex...%d from:%d" % (count, f.tell() - 4))
         for i in range(count):
             temp = PMDBoneIndex()
@@ -230,7 +241,7 @@ class Model(object):
             self.ToonName.append(temp)
 
         # Rigid
-        count = ReadStruct(f, "L")
+        count = ReadStruct(f, "I")
         Echo("Rigid...%d from:%d" % (count, f.tell() - 4))
         for i in range(count):
             temp = PMDRigid()
@@ -238,7 +249,7 @@ class Model(object):
             self.Rigids.append(temp)
 
         # Joint
-        count = ReadStruct(f, "L")
+        count = ReadStruct(f, "I")
         Echo("Joint...%d from:%d" % (count, f.tell() - 4))
         for i in range(count):
             temp = PMDJoint()
@@ -248,6 +259,7 @@ class Model(object):
         Echo("done...")
 
     def Save(self, f):
+        # Fixed size records are packed into one block per section, see PackRecords
         # Header
         Echo("Save PMD File...")
         self.Header.Save(f)
@@ -255,30 +267,33 @@ class Model(object):
         # Vertex
         count = len(self.Vertices)
         Echo("Vertex... %d" % count)
-        WriteStruct(f, "L", count)
-        for i in range(count):
-            self.Vertices[i].Save(f)
+        WriteStruct(f, "I", count)
+        vertices = self.Vertices
+        if not isinstance(vertices, PMDVertexBuffer):
+            vertices = PackVertices(vertices)
+        vertices.Save(f)
 
         # Poly
         count = len(self.Polys)
         Echo("Poly... %d " % count)
-        WriteStruct(f, "L", count)
-        for i in range(count):
-            self.Polys[i].Save(f)
+        WriteStruct(f, "I", count)
+        if isinstance(self.Polys, np.ndarray):
+            WritePolys(f, self.Polys)
+        else:
+            WritePolys(f, np.array([data.Index for data in self.Polys], np.int64))
 
         # Material
         count = len(self.Materials)
         Echo("Material... %d " % count)
-        WriteStruct(f, "L", count)
-        for i in range(count):
-            self.Materials[i].Save(f)
+        WriteStruct(f, "I", count)
+        textures = [data.TextureField() for data in self.Materials]
+        f.write(PackRecords(self.Materials, PMD_MATERIAL_DTYPE, Texture=textures))
 
         # Bone
         count = len(self.Bones)
         Echo("Bone... %d " % count)
         WriteStruct(f, "H", count)
-        for i in range(count):
-            self.Bones[i].Save(f)
+        f.write(PackRecords(self.Bones, PMD_BONE_DTYPE))
 
         # IK
         count = len(self.IKs)
@@ -291,74 +306,179 @@ class Model(object):
         count = len(self.Skins)
         Echo("Skin... %d " % count)
         WriteStruct(f, "H", count)
-        for i in range(count):
-            self.Skins[i].Save(f)
+        WriteSkins(f, self.Skins)
 
         # SkinIndex
         count = len(self.SkinIndexs)
         Echo("SkinIndex... %d " % count)
         WriteStruct(f, "B", count)
-        for i in range(count):
-            self.SkinIndexs[i].Save(f)
+        f.write(PackRecords(self.SkinIndexs, PMD_SKIN_INDEX_DTYPE))
 
         # DispName
         count = len(self.DispNames)
         Echo("DispName... %d " % count)
         WriteStruct(f, "B", count)
-        for i in range(count):
-            self.DispNames[i].Save(f)
+        f.write(EncodeSjisFixed([data.Name for data in self.DispNames], 50))
 
         # BoneIndex
         count = len(self.BoneIndexs)
         Echo("BoneIndex... %d " % count)
-        WriteStruct(f, "L", count)
-        for i in range(count):
-            self.BoneIndexs[i].Save(f)
+        WriteStruct(f, "I", count)
+        f.write(PackRecords(self.BoneIndexs, PMD_BONE_INDEX_DTYPE))
 
         # English
         Echo("English... %d " % count)
 
         # engFlag
-        f.write(pack("B", 1))
+        WriteStruct(f, "B", 1)
 
         # E_Header
         self.Header.Save_E(f)
 
         # E_Bone
-        for data in self.Bones:
-            data.Save_E(f)
+        f.write(EncodeSjisFixed([data.Name_E for data in self.Bones], 20))
 
         # E_SkinIndex
-        for data in self.SkinIndexs:
-            data.Save_E(f)
+        f.write(EncodeSjisFixed([data.Name_E for data in self.SkinIndexs], 20))
 
         # E_DispNames
-        for data in self.DispNames:
-            data.Save_E(f)
+        f.write(EncodeSjisFixed([data.Name_E for data in self.DispNames], 50))
 
         # ToonName
         count = 10
         Echo("ToonName... %d " % count)
-        for i in range(count):
-            WriteStringSjis(f, self.ToonName[i], 100)
+        f.write(EncodeSjisFixed((self.ToonName + [""] * count)[:count], 100))
 
         # Rigid
         count = len(self.Rigids)
         Echo("Rigid... %d " % count)
-        WriteStruct(f, "L", count)
-        for i in range(count):
-            self.Rigids[i].Save(f)
+        WriteStruct(f, "I", count)
+        f.write(PackRecords(self.Rigids, PMD_RIGID_DTYPE))
 
         # Joint
         count = len(self.Joints)
         Echo("Rigid... %d " % count)
-        WriteStruct(f, "L", count)
-        for i in range(count):
-            self.Joints[i].Save(f)
+        WriteStruct(f, "I", count)
+        f.write(PackRecords(self.Joints, PMD_JOINT_DTYPE))
 
         Echo("done...")
 
 
+# Fixed size PMD records, the field names are the record attributes
+PMD_MATERIAL_DTYPE = np.dtype([
+    ("Deffuse", "<f4", (4,)),
+    ("Shiness", "<f4"),
+    ("Specler", "<f4", (3,)),
+    ("Ambient", "<f4", (3,)),
+    ("Toon", "u1"),
+    ("Edge", "u1"),
+    ("VertCount", "<u4"),
+    ("Texture", "S20"),  # "texture*sphere"
+])
+
+PMD_BONE_DTYPE = np.dtype([
+    ("Name", "S20"),
+    ("Parent", "<u2"),
+    ("To", "<u2"),
+    ("Kind", "u1"),
+    ("KindNo", "<u2"),
+    ("Pos", "<f4", (3,)),
+])
+
+PMD_SKIN_DTYPE = np.dtype([
+    ("Name", "S20"),
+    ("Count", "<u4"),
+    ("Type", "u1"),
+])
+
+PMD_SKIN_VERT_DTYPE = np.dtype([
+    ("Index", "<u4"),
+    ("Pos", "<f4", (3,)),
+])
+
+PMD_SKIN_INDEX_DTYPE = np.dtype([
+    ("Index", "<u2"),
+])
+
+PMD_BONE_INDEX_DTYPE = np.dtype([
+    ("Bone", "<u2"),
+    ("Group", "u1"),
+])
+
+PMD_RIGID_DTYPE = np.dtype([
+    ("Name", "S20"),
+    ("Bone", "<u2"),
+    ("Group", "u1"),
+    ("NoCollision", "<u2"),
+    ("BoundType", "u1"),
+    ("Size", "<f4", (3,)),
+    ("Pos", "<f4", (3,)),
+    ("Rot", "<f4", (3,)),
+    ("Mass", "<f4"),
+    ("PosLoss", "<f4"),
+    ("RotLoss", "<f4"),
+    ("OpPos", "<f4"),
+    ("Friction", "<f4"),
+    ("PhysicalType", "u1"),
+])
+
+PMD_JOINT_DTYPE = np.dtype([
+    ("Name", "S20"),
+    ("Parent", "<u4"),
+    ("Child", "<u4"),
+    ("Pos", "<f4", (3,)),
+    ("Rot", "<f4", (3,)),
+    ("PosLowerLimit", "<f4", (3,)),
+    ("PosUpperLimit", "<f4", (3,)),
+    ("RotLowerLimit", "<f4", (3,)),
+    ("RotUpperLimit", "<f4", (3,)),
+    ("PosSpring", "<f4", (3,)),
+    ("RotSpring", "<f4", (3,)),
+])
+
+
+def EncodeSjisFixed(strings, length):
+    # Fixed width Shift-JIS fields, padded like WriteStringSjis.
+    # The strings are encoded in one call, Shift-JIS never uses 0 inside a character.
+    if not strings:
+        return b""
+    padding = b"\x00" + b"\xFD" * length
+    encoded = EncodeSjis("\0".join(strings)).split(b"\x00")
+    return b"".join([(data + padding)[:length] for data in encoded])
+
+
+def PackRecords(records, dtype, **columns):
+    # One block of fixed size records as bytes.
+    # Fields are taken from the attribute of the same name unless given in columns.
+    # -1 wraps to 255 / 65535 like WriteStruct.
+    if not records:
+        return b""
+
+    block = np.zeros(len(records), dtype)
+    for name in dtype.names:
+        values = columns[name] if name in columns else [getattr(data, name) for data in records]
+        field = dtype.fields[name][0]
+        if field.base.kind == "S":
+            block[name] = np.frombuffer(EncodeSjisFixed(values, field.itemsize), field)
+        else:
+            block[name] = Column(values, field.base, field.shape)
+    return block.tobytes()
+
+
+def WriteSkins(f, skins):
+    # Skin headers and their vertices, every skin vertex packed at once
+    heads = np.frombuffer(PackRecords(skins, PMD_SKIN_DTYPE, Count=[len(data.Verts) for data in skins]),
+                          PMD_SKIN_DTYPE)
+    verts = PackRecords([vert for data in skins for vert in data.Verts], PMD_SKIN_VERT_DTYPE)
+
+    pos = 0
+    for head in heads:
+        end = pos + PMD_SKIN_VERT_DTYPE.itemsize * int(head["Count"])
+        f.write(head.tobytes())
+        f.write(verts[pos:end])
+        pos = end
+
+
 class PMDHeader(object):
 
     def __init__(self):
@@ -419,6 +539,110 @@ class PMDVertex(object):
         WriteStruct(f, "B", self.Flag)
 
 
+# One PMD vertex record, 38 bytes
+PMD_VERTEX_DTYPE = np.dtype([
+    ("Pos", "<f4", (3,)),
+    ("No", "<f4", (3,)),
+    ("Uv", "<f4", (2,)),
+    ("Bone", "<u2", (2,)),
+    ("Weight", "u1"),
+    ("Flag", "u1"),
+])
+
+PMD_VERTEX_COLUMNS = PMD_VERTEX_DTYPE.names
+
+
+class PMDVertexBuffer(object):
+    # Columnar PMD vertex storage, decoded from the whole block at once
+    #    Pos    | float32[N, 3]
+    #    No     | float32[N, 3]
+    #    Uv     | float32[N, 2]
+    #    Bone   | uint16[N, 2]
+    #    Weight | uint8[N]  weight of Bone[0] in percent
+    #    Flag   | uint8[N]  1: no edge
+    #
+    # Indexing returns a PMDVertex copy of one row.
+
+    def __init__(self, count=0):
+        self.Pos = np.zeros((count, 3), np.float32)
+        self.No = np.zeros((count, 3), np.float32)
+        self.Uv = np.zeros((count, 2), np.float32)
+        self.Bone = np.zeros((count, 2), np.uint16)
+        self.Weight = np.full(count, 100, np.uint8)
+        self.Flag = np.zeros(count, np.uint8)
+
+    def Load(self, f, count):
+        data = f.read(PMD_VERTEX_DTYPE.itemsize * count)
+        if len(data) != PMD_VERTEX_DTYPE.itemsize * count:
+            raise ValueError("vertex block is truncated at %d" % len(data))
+        records = np.frombuffer(data, PMD_VERTEX_DTYPE, count)
+        for name in PMD_VERTEX_COLUMNS:
+            setattr(self, name, records[name].copy())
+
+    def Save(self, f):
+        records = np.empty(len(self), PMD_VERTEX_DTYPE)
+        for name in PMD_VERTEX_COLUMNS:
+            records[name] = getattr(self, name)
+        f.write(records.tobytes())
+
+    def __len__(self):
+        return len(self.Weight)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("vertex index out of range")
+        vertex = PMDVertex()
+        vertex.Pos = mathutils.Vector(self.Pos[index].tolist())
+        vertex.No = mathutils.Vector(self.No[index].tolist())
+        vertex.Uv = mathutils.Vector(self.Uv[index].tolist())
+        vertex.Bone = tuple(self.Bone[index].tolist())
+        vertex.Weight = int(self.Weight[index])
+        vertex.Flag = int(self.Flag[index])
+        return vertex
+
+
+def PackVertices(vertices):
+    # A list of PMDVertex as a PMDVertexBuffer
+    buffer = PMDVertexBuffer(len(vertices))
+    for name in PMD_VERTEX_COLUMNS:
+        column = getattr(buffer, name)
+        column[:] = Column([getattr(data, name) for data in vertices], column.dtype, column.shape[1:])
+    return buffer
+
+
+def Column(values, dtype, shape=()):
+    # One attribute of every record as an array, vectors are read without per-record tuples.
+    # Integers go through int64 so that -1 wraps to 255 / 65535 like WriteStruct.
+    dtype = np.dtype(dtype)
+    count = len(values)
+    width = int(np.prod(shape))
+    if shape:
+        values = chain.from_iterable(values)
+    if dtype.kind == "f":
+        return np.fromiter(values, np.float64, count * width).reshape((count,) + shape)
+    return np.fromiter(values, np.int64, count * width).reshape((count,) + shape).astype(dtype)
+
+
+def ReadPolys(f, count):
+    # Whole poly block as one uint16 array of vertex indices, read in place
+    polys = np.empty(count, "<u2")
+    length = f.readinto(memoryview(polys).cast("B"))
+    if length != polys.nbytes:
+        raise ValueError("poly block is truncated at %d" % length)
+    return polys
+
+
+def WritePolys(f, polys):
+    # -1 wraps to 65535 like WriteStruct
+    f.write(np.asarray(polys).astype("<u2", copy=False).tobytes())
+
+
 class PMDPoly(object):
     # l_poly = [ vertex number ]
 
@@ -476,19 +700,18 @@ class PMDMaterial(object):
         WriteStruct(f, "3f", self.Ambient.to_tuple())
         WriteStruct(f, "B", self.Toon)
         WriteStruct(f, "B", self.Edge)
-        WriteStruct(f, "L", self.VertCount)
+        WriteStruct(f, "I", self.VertCount)
+        WriteStringSjis(f, self.TextureField(), 20)
 
-        temp = ""
+    def TextureField(self):
+        # "texture*sphere" as stored in the file
         if(len(self.Texture) == 0):
-            temp = self.Sphere
+            return self.Sphere
 
         elif (len(self.Sphere) == 0):
-            temp = self.Texture
-
-        else:
-            temp = self.Texture + "*" + self.Sphere
+            return self.Texture
 
-        WriteStringSjis(f, temp, 20)
+        return self.Texture + "*" + self.Sphere
 
 
 class PMDBone(object):
@@ -570,7 +793,7 @@ class PMDSkin(object):
 
     def Load(self, f):
         self.Name = ReadStringSjis(f, 20)
-        vert_count = ReadStruct(f, "L")
+        vert_count = ReadStruct(f, "I")
         self.Type = ReadStruct(f, "B")
 
         self.Verts = []
@@ -584,7 +807,7 @@ class PMDSkin(object):
 
     def Save(self, f):
         WriteStringSjis(f, self.Name, 20)
-        WriteStruct(f, "L", len(self.Verts))
+        WriteStruct(f, "I", len(self.Verts))
         WriteStruct(f, "B", self.Type)
 
         for data in self.Verts:
@@ -602,11 +825,11 @@ class PMDSkinVert(object):
         self.Pos = mathutils.Vector((0, 0, 0))
 
     def Load(self, f):
-        self.Index = ReadStruct(f, "L")
+        self.Index = ReadStruct(f, "I")
         self.Pos = mathutils.Vector(ReadStruct(f, "3f"))
 
     def Save(self, f):
-        WriteStruct(f, "L", self.Index)
+        WriteStruct(f, "I", self.Index)
         WriteStruct(f, "3f", self.Pos.to_tuple())
 
 
@@ -737,8 +960,8 @@ class PMDJoint(object):
 
     def Load(self, f):
         self.Name = ReadStringSjis(f, 20)
-        self.Parent = ReadStruct(f, "L")
-        self.Child = ReadStruct(f, "L")
+        self.Parent = ReadStruct(f, "I")
+        self.Child = ReadStruct(f, "I")
         self.Pos = mathutils.Vector(ReadStruct(f, "3f"))
         self.Rot = mathutils.Vector(ReadStruct(f, "3f"))
         self.PosLowerLimit = mathutils.Vector(ReadStruct(f, "3f"))
@@ -750,8 +973,8 @@ class PMDJoint(object):
 
     def Save(self, f):
         WriteStringSjis(f, self.Name, 20)
-        WriteStruct(f, "L", self.Parent)
-        WriteStruct(f, "L", self.Child)
+        WriteStruct(f, "I", self.Parent)
+        WriteStruct(f, "I", self.Child)
         WriteStruct(f, "3f", self.Pos.to_tuple())
         WriteStruct(f, "3f", self.Rot.to_tuple())
         WriteStruct(f, "3f", self.PosLowerLimit.to_tuple())
@@ -5,8 +5,12 @@
 # pmx.py : 20111204 v 1.0
 #
 import mathutils
+import numpy as np
 import os
 
+from . import pmd
+from . import pmx
+
 DEBUG = False
 
 J_Knee = "\u3072\u3056"
@@ -20,13 +24,44 @@ def Echo(data):
         print(data)
 
 
-def Convert(d_pmd):
+def ConvertVertices(vertices):
+    # PMD vertices (a PMDVertexBuffer or a list of PMDVertex) as a pmx.VertexBuffer
+    if not isinstance(vertices, pmd.PMDVertexBuffer):
+        vertices = pmd.PackVertices(vertices)
+
+    count = len(vertices)
+    result = pmx.VertexBuffer(count)
+    result.Position[:] = vertices.Pos
+    result.Normal[:] = vertices.No
+    result.UV[:] = vertices.Uv
+
+    # WeightType |[0:BDEF1 1:BDEF2]
+    a = vertices.Bone[:, 0].astype(np.int32)
+    b = vertices.Bone[:, 1].astype(np.int32)
+    weight = vertices.Weight
+    only_a = (a == b) | (weight == 100)
+    only_b = ~only_a & (weight == 0)
+    bdef2 = ~(only_a | only_b)
+
+    result.Type[:] = np.where(bdef2, 1, 0)
+    result.Bones[:, 0] = np.where(only_b, b, a)
+    result.Bones[:, 1] = np.where(bdef2, b, 0)
+    result.Weights[:, 0] = np.where(bdef2, weight / 100.0, 1.0)
+    result.Weights[:, 1] = np.where(bdef2, 1.0 - result.Weights[:, 0], 0.0)
 
-    from blender2pmxe import pmx
-    from blender2pmxe import pmd
+    # Edge
+    result.EdgeSize[:] = np.where(vertices.Flag == 1, 1.0, 0.0)
+    return result
+
+
+def Convert(d_pmd):
 
     d_pmx = pmx.Model()
 
+    # PMX 2.0, the index sizes are set by Model.Save
+    d_pmx.Status.Magic = 1
+    d_pmx.Status.Version = 2.0
+
     Echo("Convert Pmx ")
 
     # Name
@@ -40,42 +75,14 @@ def Convert(d_pmd):
     # Model Data
     # Vertex
     Echo("Vertex...")
-    for data in d_pmd.Vertices:
-        self = pmx.PMVertex()
-        self.Position = data.Pos
-        self.Normal = data.No
-        self.UV = data.Uv
-
-        # WeightType |[0:BDEF1 1:BDEF2 2:BDEF4 3:SDEF]
-        self.Type = 1
-        self.AppendUV = []
-
-        # Weidht
-        a = data.Bone[0]
-        b = data.Bone[1]
-
-        if a == b or data.Weight == 100:
-            self.Type = 0
-            self.Bones = [a]
-            self.Weights = []
-
-        elif data.Weight == 0:
-            self.Type = 0
-            self.Bones = [b]
-            self.Weights = []
-
-        else:
-            self.Bones = data.Bone
-            self.Weights = [data.Weight / 100.0]
-
-        # Edge
-        self.EdgeSize = 1.0 if data.Flag == 1 else 0.0
-        d_pmx.Vertices.append(self)
+    d_pmx.Vertices = ConvertVertices(d_pmd.Vertices)
 
     # Face
     Echo("Face...")
-    for data in d_pmd.Polys:
-        d_pmx.Faces.append(data.Index)
+    if isinstance(d_pmd.Polys, np.ndarray):
+        d_pmx.Faces = d_pmd.Polys.copy()
+    else:
+        d_pmx.Faces = [data.Index for data in d_pmd.Polys]
 
     # Texture
     Echo("Texture...")
@@ -269,7 +276,7 @@ def Convert(d_pmd):
         self.Offsets = []
 
         for v in data.Verts:
-            self1 = pmx.PMMorphOffset()
+            self1 = pmx.PMVertexMorphOffset()
             self1.Index = basis.Verts[v.Index].Index
             # self1.Index = v.Index
             self1.Move = v.Pos
@@ -5,11 +5,22 @@
 # pmx.py : 20140104 v 1.1
 #
 import mathutils
-from struct import calcsize
-from struct import unpack
-from struct import pack
+from copy import copy
+import numpy as np
 from struct import error as StructError
 
+from .bulk import BONE_COUNTS
+from .bulk import DecodeMorphOffsets
+from .bulk import MorphOffsetDtype
+from .bulk import ReadFaces
+from .bulk import ReadVertices
+from .bulk import WriteFaces
+from .bulk import WriteVertices
+from .codec import BufferReader
+from .codec import BufferWriter
+from .codec import CompiledStruct
+from .codec import GetCodec
+
 DEBUG = False
 
 
@@ -19,10 +30,12 @@ def Echo(data):
 
 
 def ReadStruct(f, format):  # Read Struct
+    if isinstance(f, BufferReader) and f.Strict:
+        return f.ReadStruct(format)
     try:
-        length = calcsize(format)
-        dat = f.read(length)
-        p = unpack(format, dat)
+        compiled = CompiledStruct(format)
+        dat = f.read(compiled.size)
+        p = compiled.unpack(dat)
         if len(p) < 2:
             q = p[0]
             if format == "B" and q == 255:
@@ -37,22 +50,23 @@ def ReadStruct(f, format):  # Read Struct
 
 
 def WriteStruct(f, format, data):  # Write Struct
+    compiled = CompiledStruct(format)
     if isinstance(data, tuple):
-        f.write(pack(format, *data))
+        f.write(compiled.pack(*data))
     else:
         if format == "B" and data == -1:
-            f.write(pack(format, 255))
+            f.write(compiled.pack(255))
         elif format == "H" and data == -1:
-            f.write(pack(format, 65535))
+            f.write(compiled.pack(65535))
         else:
-            f.write(pack(format, data))
+            f.write(compiled.pack(data))
 
 
 def ReadString(f, mode):  # Read String
     length = ReadStruct(f, "i")
-    if length == 0:
+    if length <= 0:
         return ""
-    data = ReadStruct(f, str(length) + "s")
+    data = f.read(length)
     if mode.Encode == 0:
         return data.decode("utf-16", 'ignore')
     if mode.Encode == 1:
@@ -68,7 +82,7 @@ def WriteString(f, mode, data):  # Write String
     length = len(temp)
     WriteStruct(f, "i", length)
     if length != 0:
-        WriteStruct(f, str(length) + "s", temp)
+        f.write(temp)
 
 
 # def StringRemoveNull(string):
@@ -233,6 +247,17 @@ def paramSize(data, is_vert):
             return "i"
 
 
+class PMRawSection(object):
+    # Bytes of one section as loaded, with the encoding and index sizes they were encoded with
+    __slots__ = ("Data", "Count", "Status", "Codec")
+
+    def __init__(self, data, count, mode):
+        self.Data = data  # records, without the count field
+        self.Count = count
+        self.Status = copy(mode)  # Model.Save changes the index sizes of the model
+        self.Codec = GetCodec(mode)
+
+
 class Model(object):
     # Status
     #    Status = ModelStatus()
@@ -257,6 +282,9 @@ class Model(object):
     #    Rigids = []
     #    Joints = []
     #    SoftBodies = []
+    #
+    # Undecoded sections by attribute name (see LazyModel)
+    #    RawSections = {}
 
     def __init__(self):
         # Status
@@ -286,7 +314,43 @@ class Model(object):
         self.Joints = []
         self.SoftBodies = []
 
-    def Load(self, f):
+        # Sections that were never decoded, Save copies them when the index sizes match
+        self.RawSections = {}
+
+    def Count(self, name):
+        # Record count of a section, without decoding a raw one
+        raw = self.RawSections.get(name)
+        if raw is not None:
+            return raw.Count
+        return len(getattr(self, name))
+
+    def SaveRaw(self, f, name):
+        # Copy a section that was never decoded. Returns False if it has to be encoded.
+        raw = self.RawSections.get(name)
+        if raw is None or raw.Codec is not GetCodec(self.Status) or raw.Status.Encode != self.Status.Encode:
+            return False
+
+        WriteStruct(f, "i", raw.Count)
+        f.write(raw.Data)
+        return True
+
+    def Load(self, f, bulk=False, parallel=False, strict=False):
+        # bulk     | Keep the vertex block as a columnar VertexBuffer
+        #          | and the face block as a numpy index array
+        # parallel | Decode a large vertex block in worker processes, implies bulk.
+        #          | True or a concurrent.futures.Executor to share between loads
+        # strict   | Raise toc.FormatError for a truncated or corrupted PMX file
+        #          | instead of decoding on with zeros, see strict.LoadStrict
+        self.RawSections = {}
+        if parallel:
+            from .parallel import LoadParallel
+            LoadParallel(self, f, parallel)
+            return
+        if strict:
+            from .strict import LoadStrict
+            LoadStrict(self, f, bulk)
+            return
+
         self.Status.Load(f)
 
         if self.Status.Magic == 0:  # PMD
@@ -295,6 +359,9 @@ class Model(object):
         elif self.Status.Magic == 1:  # PMX
             Echo("Loading Pmx ")
 
+            # Every record is decoded from one shared buffer
+            f = BufferReader(f.read())
+
             # Name
             self.Name = ReadString(f, self.Status)
             self.Name_E = ReadString(f, self.Status)
@@ -310,17 +377,21 @@ class Model(object):
             # Vertex
             Echo("Vertex...")
             count = ReadStruct(f, "i")
-            for i in range(count):
-                temp = PMVertex()
-                temp.Load(f, self.Status)
-                self.Vertices.append(temp)
+            if bulk:
+                self.Vertices = VertexBuffer()
+                self.Vertices.Load(f, self.Status, count)
+            else:
+                for i in range(count):
+                    temp = PMVertex()
+                    temp.Load(f, self.Status)
+                    self.Vertices.append(temp)
 
             # Face
             Echo("Face...")
             count = ReadStruct(f, "i")
-            for i in range(count):
-                temp = ReadStruct(f, self.Status.VertexIndexSize)
-                self.Faces.append(temp)
+            self.Faces = ReadFaces(f, count, self.Status)
+            if not bulk:
+                self.Faces = self.Faces.tolist()
 
             # Texture
             Echo("Texture...")
@@ -393,12 +464,16 @@ class Model(object):
         Echo("done.")
 
     def Save(self, f):
-        self.Status.VertexIndexSize = paramSize(self.Vertices, 1)
-        self.Status.TextureIndexSize = paramSize(self.Textures, 0)
-        self.Status.MaterialIndexSize = paramSize(self.Materials, 0)
-        self.Status.BoneIndexSize = paramSize(self.Bones, 0)
-        self.Status.MorphIndexSize = paramSize(self.Morphs, 0)
-        self.Status.RigidIndexSize = paramSize(self.Rigids, 0)
+        self.Status.VertexIndexSize = paramSize(range(self.Count("Vertices")), 1)
+        self.Status.TextureIndexSize = paramSize(range(self.Count("Textures")), 0)
+        self.Status.MaterialIndexSize = paramSize(range(self.Count("Materials")), 0)
+        self.Status.BoneIndexSize = paramSize(range(self.Count("Bones")), 0)
+        self.Status.MorphIndexSize = paramSize(range(self.Count("Morphs")), 0)
+        self.Status.RigidIndexSize = paramSize(range(self.Count("Rigids")), 0)
+
+        # Records are packed into one buffer and written in a few large writes
+        out = f
+        f = BufferWriter()
 
         self.Status.Save(f)
 
@@ -420,82 +495,101 @@ class Model(object):
             # Model Data
             # Vertex
             Echo("Vertex...")
-            count = len(self.Vertices)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Vertices[i].Save(f, self.Status)
+            if self.SaveRaw(f, "Vertices"):
+                pass
+            elif isinstance(self.Vertices, VertexBuffer):
+                WriteStruct(f, "i", len(self.Vertices))
+                self.Vertices.Save(f, self.Status)
+            else:
+                count = len(self.Vertices)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Vertices[i].Save(f, self.Status)
+            f.Flush(out)
 
             # Face
             Echo("Face...")
-            count = len(self.Faces)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                WriteStruct(f, self.Status.VertexIndexSize, self.Faces[i])
+            if self.SaveRaw(f, "Faces"):
+                pass
+            else:
+                WriteStruct(f, "i", len(self.Faces))
+                f.Flush(out)
+                WriteFaces(out, self.Faces, self.Status)
 
             # Texture
             Echo("Texture...")
-            count = len(self.Textures)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Textures[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "Textures"):
+                count = len(self.Textures)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Textures[i].Save(f, self.Status)
 
             # Material
             Echo("Material...")
-            count = len(self.Materials)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Materials[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "Materials"):
+                count = len(self.Materials)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Materials[i].Save(f, self.Status)
 
             # Bone
             Echo("Bone...")
-            count = len(self.Bones)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Bones[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "Bones"):
+                count = len(self.Bones)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Bones[i].Save(f, self.Status)
 
             # Morph
             Echo("Morph...")
-            count = len(self.Morphs)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Morphs[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "Morphs"):
+                count = len(self.Morphs)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Morphs[i].Save(f, self.Status)
 
             # Display
             # DisplayFrame
             Echo("Displayframe...")
-            count = len(self.DisplayFrames)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.DisplayFrames[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "DisplayFrames"):
+                count = len(self.DisplayFrames)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.DisplayFrames[i].Save(f, self.Status)
 
             # Physics
             # Rigid
             Echo("Rigid...")
-            count = len(self.Rigids)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Rigids[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "Rigids"):
+                count = len(self.Rigids)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Rigids[i].Save(f, self.Status)
 
             # Joint
             Echo("Joint...")
-            count = len(self.Joints)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.Joints[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "Joints"):
+                count = len(self.Joints)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.Joints[i].Save(f, self.Status)
 
             # SoftBody
             Echo("SoftBody...")
-            count = len(self.SoftBodies)
-            WriteStruct(f, "i", count)
-            for i in range(count):
-                self.SoftBodies[i].Save(f, self.Status)
+            if not self.SaveRaw(f, "SoftBodies"):
+                count = len(self.SoftBodies)
+                WriteStruct(f, "i", count)
+                for i in range(count):
+                    self.SoftBodies[i].Save(f, self.Status)
         else:
             pass
 
+        f.Flush(out)
         Echo("done.")
 
 
 class PMVertex(object):
+    __slots__ = ("Position", "Normal", "UV", "Type", "AppendUV", "Bones", "Weights", "EdgeSize")
 
     def __init__(self):
         self.Position = mathutils.Vector((0, 0, 0))
@@ -515,104 +609,273 @@ class PMVertex(object):
         self.EdgeSize = 1.0
 
     def Load(self, f, mode):
-        self.Position = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Normal = mathutils.Vector(ReadStruct(f, "3f"))
-        self.UV = mathutils.Vector(ReadStruct(f, "2f"))
+        codec = GetCodec(mode)
+        values = codec.VertexHead.Read(f)
+        self.Position = mathutils.Vector(values[0:3])
+        self.Normal = mathutils.Vector(values[3:6])
+        self.UV = mathutils.Vector(values[6:8])
+
+        # Additional UVs are between UV and Type
+        self.AppendUV = [mathutils.Vector(values[index:index + 4])
+                         for index in range(8, 8 + 4 * mode.AppendUVCount, 4)]
 
-        self.AppendUV = [mathutils.Vector((0, 0, 0, 0))] * mode.AppendUVCount
-        for tempUV in self.AppendUV:
-            ReadStruct(f, "4f")
+        self.Type = values[-1]
 
-        self.Type = ReadStruct(f, "b")
+        layout = codec.VertexWeights.get(self.Type, codec.VertexEdge)
+        values = layout.Read(f)
 
         if self.Type == 0:  # 0:BDEF1
-            self.Bones = [0]
+            self.Bones = [values[0]]
             self.Weights = []
-            self.Bones[0] = ReadStruct(f, mode.BoneIndexSize)
 
         elif self.Type == 1:  # 1:BDEF2
-            self.Bones = [0, 0]
-            self.Weights = [1.0]
-            self.Bones[0] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[1] = ReadStruct(f, mode.BoneIndexSize)
-            self.Weights[0] = ReadStruct(f, "f")
+            self.Bones = [values[0], values[1]]
+            self.Weights = [values[2]]
 
         elif self.Type == 2:  # 2:BDEF4
-            self.Bones = [0, 0, 0, 0]
-            self.Weights = [0.0, 0.0, 0.0, 0.0]
-            self.Bones[0] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[1] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[2] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[3] = ReadStruct(f, mode.BoneIndexSize)
-            self.Weights[0] = ReadStruct(f, "f")
-            self.Weights[1] = ReadStruct(f, "f")
-            self.Weights[2] = ReadStruct(f, "f")
-            self.Weights[3] = ReadStruct(f, "f")
+            self.Bones = list(values[0:4])
+            self.Weights = list(values[4:8])
 
         elif self.Type == 3:  # 3:SDEF
-            self.Bones = [0, 0]
-            self.Weights = [0.0, 0.0, 0.0, 0.0]
-            self.Bones[0] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[1] = ReadStruct(f, mode.BoneIndexSize)
-            self.Weights[0] = ReadStruct(f, "f")
-            self.Weights[1] = mathutils.Vector(ReadStruct(f, "3f"))
-            self.Weights[2] = mathutils.Vector(ReadStruct(f, "3f"))
-            self.Weights[3] = mathutils.Vector(ReadStruct(f, "3f"))
+            self.Bones = [values[0], values[1]]
+            self.Weights = [values[2],
+                            mathutils.Vector(values[3:6]),
+                            mathutils.Vector(values[6:9]),
+                            mathutils.Vector(values[9:12])]
 
         elif self.Type == 4:  # 4:QDEF
-            self.Bones = [0, 0, 0, 0]
-            self.Weights = [0.0, 0.0, 0.0, 0.0]
-            self.Bones[0] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[1] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[2] = ReadStruct(f, mode.BoneIndexSize)
-            self.Bones[3] = ReadStruct(f, mode.BoneIndexSize)
-            self.Weights[0] = ReadStruct(f, "f")
-            self.Weights[1] = ReadStruct(f, "f")
-            self.Weights[2] = ReadStruct(f, "f")
-            self.Weights[3] = ReadStruct(f, "f")
-
-        self.EdgeSize = ReadStruct(f, "f")
+            self.Bones = list(values[0:4])
+            self.Weights = list(values[4:8])
 
-    def Save(self, f, mode):
-        WriteStruct(f, "3f", self.Position.to_tuple())
-        WriteStruct(f, "3f", self.Normal.to_tuple())
-        WriteStruct(f, "2f", self.UV.to_tuple())
+        self.EdgeSize = values[-1]
 
+    def Save(self, f, mode):
+        codec = GetCodec(mode)
+        values = self.Position.to_tuple() + self.Normal.to_tuple() + self.UV.to_tuple()
         for index in range(mode.AppendUVCount):
-            WriteStruct(f, "4f", self.AppendUV[index])
-
-        WriteStruct(f, "b", self.Type)
+            values += tuple(self.AppendUV[index]) if index < len(self.AppendUV) else (0.0, 0.0, 0.0, 0.0)
+        codec.VertexHead.Write(f, values + (self.Type,))
 
         if self.Type == 0:  # 0:BDEF1
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[0])
+            values = (self.Bones[0],)
 
         elif self.Type == 1:  # 1:BDEF2
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[0])
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[1])
-            WriteStruct(f, "f", self.Weights[0])
+            values = (self.Bones[0], self.Bones[1], self.Weights[0])
 
-        elif self.Type == 2:  # 2:BDEF4
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[0])
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[1])
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[2])
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[3])
-            WriteStruct(f, "f", self.Weights[0])
-            WriteStruct(f, "f", self.Weights[1])
-            WriteStruct(f, "f", self.Weights[2])
-            WriteStruct(f, "f", self.Weights[3])
+        elif self.Type in (2, 4):  # 2:BDEF4 4:QDEF
+            values = tuple(self.Bones[0:4]) + tuple(self.Weights[0:4])
 
         elif self.Type == 3:  # 3:SDEF
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[0])
-            WriteStruct(f, mode.BoneIndexSize, self.Bones[1])
-            WriteStruct(f, "f", self.Weights[0])
-            WriteStruct(f, "3f", self.Weights[1].to_tuple())
-            WriteStruct(f, "3f", self.Weights[2].to_tuple())
-            WriteStruct(f, "3f", self.Weights[3].to_tuple())
+            values = (self.Bones[0], self.Bones[1], self.Weights[0]) + \
+                self.Weights[1].to_tuple() + self.Weights[2].to_tuple() + self.Weights[3].to_tuple()
 
-        WriteStruct(f, "f", self.EdgeSize)
+        else:
+            values = ()
+
+        layout = codec.VertexWeights.get(self.Type, codec.VertexEdge)
+        layout.Write(f, values + (self.EdgeSize,))
+
+
+class VertexBuffer(object):
+    # Columnar (structure of arrays) vertex storage
+    #    Position | float32[N, 3]
+    #    Normal   | float32[N, 3]
+    #    UV       | float32[N, 2]
+    #    AppendUV | [float32[N, 4]] one array per additional UV channel
+    #    Type     | int8[N]       [0:BDEF1 1:BDEF2 2:BDEF4 3:SDEF 4:QDEF]
+    #    Bones    | int32[N, 4]   unused columns are 0
+    #    Weights  | float32[N, 4] per bone weight, BDEF1:[1,0,0,0] BDEF2/SDEF:[w,1-w,0,0]
+    #    SdefC    | float32[N, 3]
+    #    SdefR0   | float32[N, 3]
+    #    SdefR1   | float32[N, 3]
+    #    EdgeSize | float32[N]
+    #
+    # Indexing returns a PMVertex compatible VertexView of one row.
+
+    def __init__(self, count=0, append_uv_count=0):
+        self.Position = np.zeros((count, 3), np.float32)
+        self.Normal = np.zeros((count, 3), np.float32)
+        self.UV = np.zeros((count, 2), np.float32)
+        self.AppendUV = [np.zeros((count, 4), np.float32) for _ in range(append_uv_count)]
+        self.Type = np.zeros(count, np.int8)
+        self.Bones = np.zeros((count, 4), np.int32)
+        self.Weights = np.zeros((count, 4), np.float32)
+        self.Weights[:, 0] = 1.0
+        self.SdefC = np.zeros((count, 3), np.float32)
+        self.SdefR0 = np.zeros((count, 3), np.float32)
+        self.SdefR1 = np.zeros((count, 3), np.float32)
+        self.EdgeSize = np.ones(count, np.float32)
+
+    @property
+    def AppendUVCount(self):
+        return len(self.AppendUV)
+
+    def Load(self, f, mode, count):
+        for name, array in ReadVertices(f, count, mode).items():
+            setattr(self, name, array)
+
+    def Save(self, f, mode):
+        WriteVertices(f, self, mode)
+
+    def Extend(self, vertices):
+        # Append PMVertex (or VertexView) rows, like list.extend
+        other = VertexBuffer(len(vertices), self.AppendUVCount)
+        for index, vertex in enumerate(vertices):
+            other[index] = vertex
+
+        for name in VERTEX_COLUMNS:
+            setattr(self, name, np.concatenate((getattr(self, name), getattr(other, name))))
+        self.AppendUV = [np.concatenate(pair) for pair in zip(self.AppendUV, other.AppendUV)]
+
+    def append(self, vertex):
+        # Copies every column, prefer Extend for many rows
+        self.Extend([vertex])
+
+    def __len__(self):
+        return len(self.Type)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield VertexView(self, index)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("vertex index out of range")
+        return VertexView(self, index)
+
+    def __setitem__(self, index, vertex):
+        view = self[index]
+        view.Position = vertex.Position
+        view.Normal = vertex.Normal
+        view.UV = vertex.UV
+        view.AppendUV = vertex.AppendUV
+        view.Type = vertex.Type
+        view.Bones = vertex.Bones
+        view.Weights = vertex.Weights
+        view.EdgeSize = vertex.EdgeSize
+
+
+VERTEX_COLUMNS = ("Position", "Normal", "UV", "Type", "Bones", "Weights", "SdefC", "SdefR0", "SdefR1", "EdgeSize")
+
+
+class VertexView(object):
+    # One row of a VertexBuffer with the PMVertex attributes.
+    # Reading builds new Vectors and lists, assigning writes the row.
+    __slots__ = ("Buffer", "Index")
+
+    def __init__(self, buffer, index):
+        self.Buffer = buffer
+        self.Index = index
+
+    @property
+    def Position(self):
+        return mathutils.Vector(self.Buffer.Position[self.Index].tolist())
+
+    @Position.setter
+    def Position(self, value):
+        self.Buffer.Position[self.Index] = tuple(value)
+
+    @property
+    def Normal(self):
+        return mathutils.Vector(self.Buffer.Normal[self.Index].tolist())
+
+    @Normal.setter
+    def Normal(self, value):
+        self.Buffer.Normal[self.Index] = tuple(value)
+
+    @property
+    def UV(self):
+        return mathutils.Vector(self.Buffer.UV[self.Index].tolist())
+
+    @UV.setter
+    def UV(self, value):
+        self.Buffer.UV[self.Index] = tuple(value)
+
+    @property
+    def AppendUV(self):
+        return [mathutils.Vector(channel[self.Index].tolist()) for channel in self.Buffer.AppendUV]
+
+    @AppendUV.setter
+    def AppendUV(self, value):
+        for channel, uv in zip(self.Buffer.AppendUV, value):
+            channel[self.Index] = tuple(uv)
+
+    @property
+    def Type(self):
+        return int(self.Buffer.Type[self.Index])
+
+    @Type.setter
+    def Type(self, value):
+        self.Buffer.Type[self.Index] = value
+
+    @property
+    def Bones(self):
+        return self.Buffer.Bones[self.Index, :BONE_COUNTS[self.Type]].tolist()
+
+    @Bones.setter
+    def Bones(self, value):
+        row = self.Buffer.Bones[self.Index]
+        row[:] = 0
+        row[:len(value)] = value
+
+    @property
+    def Weights(self):
+        index = self.Index
+        weights = self.Buffer.Weights[index].tolist()
+        if self.Type == 0:  # 0:BDEF1
+            return []
+        elif self.Type == 1:  # 1:BDEF2
+            return weights[:1]
+        elif self.Type == 3:  # 3:SDEF
+            return [weights[0],
+                    mathutils.Vector(self.Buffer.SdefC[index].tolist()),
+                    mathutils.Vector(self.Buffer.SdefR0[index].tolist()),
+                    mathutils.Vector(self.Buffer.SdefR1[index].tolist())]
+        else:  # 2:BDEF4 4:QDEF
+            return weights
+
+    @Weights.setter
+    def Weights(self, value):
+        # Interpreted with the current Type, assign Type first
+        index = self.Index
+        row = self.Buffer.Weights[index]
+        if self.Type == 0:  # 0:BDEF1
+            row[:] = (1.0, 0.0, 0.0, 0.0)
+        elif self.Type in (1, 3):  # 1:BDEF2 3:SDEF
+            row[:] = (value[0], 1.0 - value[0], 0.0, 0.0)
+            if self.Type == 3:
+                self.Buffer.SdefC[index] = tuple(value[1])
+                self.Buffer.SdefR0[index] = tuple(value[2])
+                self.Buffer.SdefR1[index] = tuple(value[3])
+        else:  # 2:BDEF4 4:QDEF
+            row[:] = 0.0
+            row[:len(value)] = value
+
+    @property
+    def EdgeSize(self):
+        return float(self.Buffer.EdgeSize[self.Index])
+
+    @EdgeSize.setter
+    def EdgeSize(self, value):
+        self.Buffer.EdgeSize[self.Index] = value
+
+    def Save(self, f, mode):
+        temp = PMVertex()
+        temp.Position = self.Position
+        temp.Normal = self.Normal
+        temp.UV = self.UV
+        temp.AppendUV = self.AppendUV
+        temp.Type = self.Type
+        temp.Bones = self.Bones
+        temp.Weights = self.Weights
+        temp.EdgeSize = self.EdgeSize
+        temp.Save(f, mode)
 
 
 class PMTexture(object):
+    __slots__ = ("Path",)
 
     def __init__(self):
         self.Path = ""
@@ -627,6 +890,9 @@ class PMTexture(object):
 
 
 class PMMaterial(object):
+    __slots__ = ("Name", "Name_E", "Deffuse", "Specular", "Power", "Ambient", "Both", "GroundShadow", "DropShadow",
+                 "OnShadow", "OnEdge", "VertexColor", "DrawPoint", "DrawLine", "EdgeColor", "EdgeSize", "TextureIndex",
+                 "SphereIndex", "SphereType", "UseSystemToon", "ToonIndex", "Comment", "FaceLength")
 
     def __init__(self):
         self.Name = ""
@@ -668,15 +934,18 @@ class PMMaterial(object):
         self.FaceLength = 0
 
     def Load(self, f, mode):
+        codec = GetCodec(mode)
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
-        self.Deffuse = mathutils.Vector(ReadStruct(f, "4f"))
-        self.Specular = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Power = ReadStruct(f, "f")
-        self.Ambient = mathutils.Vector(ReadStruct(f, "3f"))
+
+        values = codec.Material.Read(f)
+        self.Deffuse = mathutils.Vector(values[0:4])
+        self.Specular = mathutils.Vector(values[4:7])
+        self.Power = values[7]
+        self.Ambient = mathutils.Vector(values[8:11])
 
         # Flags
-        Flag = ReadStruct(f, "B")
+        Flag = values[11]
 
         self.Both = 1 if Flag & 0x01 != 0 else 0
         self.GroundShadow = 1 if Flag & 0x02 != 0 else 0
@@ -688,38 +957,35 @@ class PMMaterial(object):
         self.DrawLine = 1 if Flag & 0x80 != 0 else 0
 
         # Edge
-        self.EdgeColor = mathutils.Vector(ReadStruct(f, "4f"))
-        self.EdgeSize = ReadStruct(f, "f")
+        self.EdgeColor = mathutils.Vector(values[12:16])
+        self.EdgeSize = values[16]
 
         # Texture
-        self.TextureIndex = ReadStruct(f, mode.TextureIndexSize)
-        self.SphereIndex = ReadStruct(f, mode.TextureIndexSize)
+        self.TextureIndex = values[17]
+        self.SphereIndex = values[18]
 
         # Sphere
-        self.SphereType = ReadStruct(f, "B")  # [0:None 1:Multi 2:Add 3:SubTexture]
+        self.SphereType = values[19]  # [0:None 1:Multi 2:Add 3:SubTexture]
 
         # Toon
-        self.UseSystemToon = ReadStruct(f, "B")
+        self.UseSystemToon = values[20]
         if self.UseSystemToon == 0:
-            self.ToonIndex = ReadStruct(f, "B")
+            self.ToonIndex = codec.ToonByte.Read(f)[0]
         else:
-            self.ToonIndex = ReadStruct(f, mode.TextureIndexSize)
+            self.ToonIndex = codec.ToonTexture.Read(f)[0]
 
         # Comment
         self.Comment = ReadString(f, mode)
 
         # FaceLength
-        self.FaceLength = ReadStruct(f, "i")
+        self.FaceLength = codec.Int.Read(f)[0]
 
         return
 
     def Save(self, f, mode):
+        codec = GetCodec(mode)
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
-        WriteStruct(f, "4f", self.Deffuse.to_tuple())
-        WriteStruct(f, "3f", self.Specular.to_tuple())
-        WriteStruct(f, "f", self.Power)
-        WriteStruct(f, "3f", self.Ambient.to_tuple())
 
         # Flags
         Flag = self.Both * 0x01
@@ -730,36 +996,29 @@ class PMMaterial(object):
         Flag += self.VertexColor * 0x20
         Flag += self.DrawPoint * 0x40
         Flag += self.DrawLine * 0x80
-        WriteStruct(f, "B", Flag)
-
-        # Edge
-        WriteStruct(f, "4f", self.EdgeColor.to_tuple())
-        WriteStruct(f, "f", self.EdgeSize)
 
-        # Texture
-        WriteStruct(f, mode.TextureIndexSize, self.TextureIndex)
-        WriteStruct(f, mode.TextureIndexSize, self.SphereIndex)
-
-        # Sphere
-        WriteStruct(f, "B", self.SphereType)  # [0:None 1:Multi 2:Add 3:SubTexture]
+        codec.Material.Write(f, self.Deffuse.to_tuple() + self.Specular.to_tuple() + (self.Power,) +
+                             self.Ambient.to_tuple() + (Flag,) +
+                             self.EdgeColor.to_tuple() + (self.EdgeSize,) +
+                             (self.TextureIndex, self.SphereIndex, self.SphereType, self.UseSystemToon))
 
         # Toon
-        WriteStruct(f, "B", self.UseSystemToon)
         if self.UseSystemToon == 0:
-            WriteStruct(f, "B", self.ToonIndex)
+            codec.ToonByte.Write(f, (self.ToonIndex,))
         else:
-            WriteStruct(f, mode.TextureIndexSize, self.ToonIndex)
+            codec.ToonTexture.Write(f, (self.ToonIndex,))
 
         # Comment
         WriteString(f, mode, self.Comment)
 
         # FaceLength
-        WriteStruct(f, "i", self.FaceLength)
+        codec.Int.Write(f, (self.FaceLength,))
 
         return
 
 
 class PMIK(object):
+    __slots__ = ("TargetIndex", "Loops", "Limit", "Member")
 
     def __init__(self):
         self.TargetIndex = 0
@@ -768,10 +1027,8 @@ class PMIK(object):
         self.Member = []
 
     def Load(self, f, mode):
-        self.TargetIndex = ReadStruct(f, mode.BoneIndexSize)
-        self.Loops = ReadStruct(f, "i")
-        self.Limit = ReadStruct(f, "f")
-        count = ReadStruct(f, "i")
+        codec = GetCodec(mode)
+        self.TargetIndex, self.Loops, self.Limit, count = codec.IK.Read(f)
         self.Member = [0] * count
         for i in range(count):
             self.Member[i] = PMIKLink()
@@ -779,17 +1036,16 @@ class PMIK(object):
         return
 
     def Save(self, f, mode):
-        WriteStruct(f, mode.BoneIndexSize, self.TargetIndex)
-        WriteStruct(f, "i", self.Loops)
-        WriteStruct(f, "f", self.Limit)
+        codec = GetCodec(mode)
         count = len(self.Member)
-        WriteStruct(f, "i", count)
+        codec.IK.Write(f, (self.TargetIndex, self.Loops, self.Limit, count))
         for i in range(count):
             self.Member[i].Save(f, mode)
         return
 
 
 class PMIKLink(object):
+    __slots__ = ("Index", "UseLimit", "UpperLimit", "LowerLimit")
 
     def __init__(self):
         self.Index = 0
@@ -798,21 +1054,25 @@ class PMIKLink(object):
         self.LowerLimit = mathutils.Vector((0, 0, 0))
 
     def Load(self, f, mode):
-        self.Index = ReadStruct(f, mode.BoneIndexSize)
-        self.UseLimit = ReadStruct(f, "B")
+        codec = GetCodec(mode)
+        self.Index, self.UseLimit = codec.IKLink.Read(f)
         if self.UseLimit == 1:
-            self.LowerLimit = mathutils.Vector(ReadStruct(f, "3f"))
-            self.UpperLimit = mathutils.Vector(ReadStruct(f, "3f"))
+            values = codec.IKLimit.Read(f)
+            self.LowerLimit = mathutils.Vector(values[0:3])
+            self.UpperLimit = mathutils.Vector(values[3:6])
 
     def Save(self, f, mode):
-        WriteStruct(f, mode.BoneIndexSize, self.Index)
-        WriteStruct(f, "B", self.UseLimit)
+        codec = GetCodec(mode)
+        codec.IKLink.Write(f, (self.Index, self.UseLimit))
         if self.UseLimit == 1:
-            WriteStruct(f, "3f", self.LowerLimit.to_tuple())
-            WriteStruct(f, "3f", self.UpperLimit.to_tuple())
+            codec.IKLimit.Write(f, self.LowerLimit.to_tuple() + self.UpperLimit.to_tuple())
 
 
 class PMBone(object):
+    __slots__ = ("Name", "Name_E", "Position", "Parent", "Level", "ToConnectType", "Rotatable", "Movable", "Visible",
+                 "Operational", "UseIK", "AdditionalLocal", "AdditionalRotation", "AdditionalMovement", "UseFixedAxis",
+                 "UseLocalAxis", "AfterPhysical", "ExternalBone", "TailPosition", "ChildIndex", "AdditionalBoneIndex",
+                 "AdditionalPower", "FixedAxis", "LocalAxisX", "LocalAxisZ", "ExternalBoneIndex", "IK")
 
     def __init__(self):
         self.Name = ""
@@ -855,15 +1115,17 @@ class PMBone(object):
         self.IK = PMIK()
 
     def Load(self, f, mode):
+        codec = GetCodec(mode)
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
 
-        self.Position = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Parent = ReadStruct(f, mode.BoneIndexSize)
-        self.Level = ReadStruct(f, "i")
+        values = codec.Bone.Read(f)
+        self.Position = mathutils.Vector(values[0:3])
+        self.Parent = values[3]
+        self.Level = values[4]
 
         # Flags
-        Flag = ReadStruct(f, "H")
+        Flag = values[5]
         self.ToConnectType = 1 if Flag & 0x0001 != 0 else 0  # [0:Offset 1:Bone]
 
         self.Rotatable = 1 if Flag & 0x0002 != 0 else 0
@@ -883,29 +1145,37 @@ class PMBone(object):
         self.AfterPhysical = 1 if Flag & 0x1000 != 0 else 0
         self.ExternalBone = 1 if Flag & 0x2000 != 0 else 0
 
+        # Flag dependent fields
+        values = codec.BoneTail(Flag).Read(f)
+
         # Arm
         if self.ToConnectType == 0:
-            self.TailPosition = mathutils.Vector(ReadStruct(f, "3f"))
+            self.TailPosition = mathutils.Vector(values[0:3])
+            index = 3
         else:
-            self.ChildIndex = ReadStruct(f, mode.BoneIndexSize)
+            self.ChildIndex = values[0]
+            index = 1
 
         # Additional Rotate or Move
         if self.AdditionalRotation == 1 or self.AdditionalMovement == 1:
-            self.AdditionalBoneIndex = ReadStruct(f, mode.BoneIndexSize)
-            self.AdditionalPower = ReadStruct(f, "f")
+            self.AdditionalBoneIndex = values[index]
+            self.AdditionalPower = values[index + 1]
+            index += 2
 
         # Fixed Rotate & Move
         if self.UseFixedAxis == 1:
-            self.FixedAxis = mathutils.Vector(ReadStruct(f, "3f"))
+            self.FixedAxis = mathutils.Vector(values[index:index + 3])
+            index += 3
 
         if self.UseLocalAxis == 1:
-            self.LocalAxisX = mathutils.Vector(ReadStruct(f, "3f"))
+            self.LocalAxisX = mathutils.Vector(values[index:index + 3])
             # self.LocalAxisY = mathutils.Vector(ReadStruct(f,"3f"))
-            self.LocalAxisZ = mathutils.Vector(ReadStruct(f, "3f"))
+            self.LocalAxisZ = mathutils.Vector(values[index + 3:index + 6])
+            index += 6
 
         # External Model Bone Control
         if self.ExternalBone == 1:
-            self.ExternalBoneIndex = ReadStruct(f, "i")
+            self.ExternalBoneIndex = values[index]
 
         # Use IK
         if self.UseIK == 1:
@@ -915,13 +1185,10 @@ class PMBone(object):
         return
 
     def Save(self, f, mode):
+        codec = GetCodec(mode)
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
 
-        WriteStruct(f, "3f", self.Position.to_tuple())
-        WriteStruct(f, mode.BoneIndexSize, self.Parent)
-        WriteStruct(f, "i", self.Level)
-
         # Flags
         Flag = self.ToConnectType * 0x0001
 
@@ -941,28 +1208,30 @@ class PMBone(object):
 
         Flag += self.AfterPhysical * 0x1000
         Flag += self.ExternalBone * 0x2000
-        WriteStruct(f, "H", Flag)
+
+        codec.Bone.Write(f, self.Position.to_tuple() + (self.Parent, self.Level, Flag))
 
         # Arm
         if self.ToConnectType == 0:
-            WriteStruct(f, "3f", self.TailPosition.to_tuple())
+            values = self.TailPosition.to_tuple()
         else:
-            WriteStruct(f, mode.BoneIndexSize, self.ChildIndex)
+            values = (self.ChildIndex,)
 
         if self.AdditionalRotation == 1 or self.AdditionalMovement == 1:
-            WriteStruct(f, mode.BoneIndexSize, self.AdditionalBoneIndex)
-            WriteStruct(f, "f", self.AdditionalPower)
+            values += (self.AdditionalBoneIndex, self.AdditionalPower)
 
         if self.UseFixedAxis == 1:
-            WriteStruct(f, "3f", self.FixedAxis.to_tuple())
+            values += self.FixedAxis.to_tuple()
 
         if self.UseLocalAxis == 1:
-            WriteStruct(f, "3f", self.LocalAxisX.to_tuple())
-            # WriteStruct(f,"3f",self.LocalAxisY.to_tuple())
-            WriteStruct(f, "3f", self.LocalAxisZ.to_tuple())
+            values += self.LocalAxisX.to_tuple()
+            # values += self.LocalAxisY.to_tuple()
+            values += self.LocalAxisZ.to_tuple()
 
         if self.ExternalBone == 1:
-            WriteStruct(f, "i", self.ExternalBoneIndex)
+            values += (self.ExternalBoneIndex,)
+
+        codec.BoneTail(Flag).Write(f, values)
 
         if self.UseIK == 1:
             self.IK.Save(f, mode)
@@ -971,6 +1240,8 @@ class PMBone(object):
 
 
 class PMMorph(object):
+    # The offset block is kept as raw bytes by Load and decoded on first access of Offsets
+    __slots__ = ("Name", "Name_E", "Panel", "Type", "OffsetList", "OffsetData", "OffsetCount", "OffsetCodec")
 
     def __init__(self):
         self.Name = ""
@@ -979,38 +1250,87 @@ class PMMorph(object):
         self.Type = 1  # [0:Group 1:Vertex 2:Bone 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4 8:Material 9:Flip 10:Impulse]
         self.Offsets = []
 
+    @property
+    def Offsets(self):
+        if self.OffsetList is None:
+            reader = BufferReader(self.OffsetData)
+            offset_class = MORPH_OFFSETS.get(self.Type, PMMorphOffset)
+            self.OffsetList = [0] * self.OffsetCount
+            for i in range(self.OffsetCount):
+                self.OffsetList[i] = offset_class()
+                self.OffsetList[i].Load(reader, self.OffsetCodec, self.Type)
+
+            # The records may be edited from now on
+            self.OffsetData = None
+        return self.OffsetList
+
+    @Offsets.setter
+    def Offsets(self, value):
+        self.OffsetList = value
+        self.OffsetData = None
+        self.OffsetCount = 0
+        self.OffsetCodec = None
+
+    def IsDecoded(self):
+        return self.OffsetList is not None
+
+    def OffsetArrays(self):
+        # Offsets as column arrays (Index plus Move/UV/Rotate... as in bulk.MorphOffsetDtype)
+        if self.OffsetList is None:
+            return DecodeMorphOffsets(self.OffsetData, self.OffsetCount, self.OffsetCodec, self.Type)
+
+        # Decoded or built in code: read the records, an index does not have to fit any index size
+        count = len(self.OffsetList)
+        arrays = {}
+        for name, (field, _) in MorphOffsetDtype(ModelStatus(), self.Type).fields.items():
+            values = [getattr(offset, name) for offset in self.OffsetList]
+            if field.shape:
+                values = [tuple(value) for value in values]
+            arrays[name] = np.array(values, np.int32 if name == "Index" else field.base).reshape((count,) + field.shape)
+        return arrays
+
     def Load(self, f, mode):
+        codec = GetCodec(mode)
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
-        self.Panel = ReadStruct(f, "B")
-        self.Type = ReadStruct(f, "B")
-        count = ReadStruct(f, "i")
-        self.Offsets = [0] * count
-        for i in range(count):
-            self.Offsets[i] = PMMorphOffset()
-            self.Offsets[i].Load(f, mode, self.Type)
+        self.Panel, self.Type, count = codec.Morph.Read(f)
+
+        layout = codec.MorphOffsets.get(self.Type)
+        self.OffsetList = None
+        self.OffsetData = f.read(layout.Size * count if layout is not None else 0)
+        self.OffsetCount = count
+        self.OffsetCodec = codec
         return
 
     def Save(self, f, mode):
+        codec = GetCodec(mode)
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
-        WriteStruct(f, "B", self.Panel)
-        WriteStruct(f, "B", self.Type)
+
+        # Undecoded offsets are copied as is when the index sizes did not change
+        if self.OffsetList is None and self.OffsetCodec is codec:
+            codec.Morph.Write(f, (self.Panel, self.Type, self.OffsetCount))
+            f.write(self.OffsetData)
+            return
+
         count = len(self.Offsets)
-        WriteStruct(f, "i", count)
+        codec.Morph.Write(f, (self.Panel, self.Type, count))
         for i in range(count):
             self.Offsets[i].Save(f, mode, self.Type)
         return
 
 
 class PMMorphOffset(object):
+    # Offset of any morph type, see the PM*MorphOffset classes for the compact per type records
+    __slots__ = ("Index", "Move", "UV", "Rotate", "Power", "IsLocal", "Torque",
+                 "MatEffectType", "MatDiffuse", "MatSpeculer", "MatPower", "MatAmbient",
+                 "MatEdgeColor", "MatEdgeSize", "MatTexture", "MatSphere", "MatToon")
 
     def __init__(self):
         self.Index = -1
         self.Move = mathutils.Vector((0, 0, 0))
         self.UV = mathutils.Vector((0, 0, 0, 0))
         self.Rotate = mathutils.Vector((0, 0, 0, 0))
-        self.Material = PMMaterial()
         self.Power = 0.0
         self.IsLocal = 0
         self.Torque = mathutils.Vector((0, 0, 0))
@@ -1029,85 +1349,224 @@ class PMMorphOffset(object):
 
     def Load(self, f, mode, type):
         # [0:Group 1:Vertex 2:Bone 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4 8:Material]
+        layout = GetCodec(mode).MorphOffsets.get(type)
+        if layout is None:
+            return
+        values = layout.Read(f)
+        self.Index = values[0]
+
         if type in (0, 9):  # 0:Group 9:Flip
-            self.Index = ReadStruct(f, mode.MorphIndexSize)
-            self.Power = ReadStruct(f, "f")
+            self.Power = values[1]
 
         elif type == 1:     # 1:Vertex
-            self.Index = ReadStruct(f, mode.VertexIndexSize)
-            self.Move = mathutils.Vector(ReadStruct(f, "3f"))
+            self.Move = mathutils.Vector(values[1:4])
 
         elif type == 2:     # 2:Bone
-            self.Index = ReadStruct(f, mode.BoneIndexSize)
-            self.Move = mathutils.Vector(ReadStruct(f, "3f"))
-            self.Rotate = mathutils.Vector(ReadStruct(f, "4f"))
+            self.Move = mathutils.Vector(values[1:4])
+            self.Rotate = mathutils.Vector(values[4:8])
 
         elif type in (3, 4, 5, 6, 7):  # 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4
-            self.Index = ReadStruct(f, mode.VertexIndexSize)
-            self.UV = mathutils.Vector(ReadStruct(f, "4f"))
+            self.UV = mathutils.Vector(values[1:5])
 
         elif type == 8:     # 8:Material
-            self.Index = ReadStruct(f, mode.MaterialIndexSize)
-            self.MatEffectType = ReadStruct(f, "B")
-            self.MatDiffuse = mathutils.Vector(ReadStruct(f, "4f"))
-            self.MatSpeculer = mathutils.Vector(ReadStruct(f, "3f"))
-            self.MatPower = ReadStruct(f, "f")
-            self.MatAmbient = mathutils.Vector(ReadStruct(f, "3f"))
-            self.MatEdgeColor = mathutils.Vector(ReadStruct(f, "4f"))
-            self.MatEdgeSize = ReadStruct(f, "f")
-            self.MatTexture = mathutils.Vector(ReadStruct(f, "4f"))
-            self.MatSphere = mathutils.Vector(ReadStruct(f, "4f"))
-            self.MatToon = mathutils.Vector(ReadStruct(f, "4f"))
+            self.MatEffectType = values[1]
+            self.MatDiffuse = mathutils.Vector(values[2:6])
+            self.MatSpeculer = mathutils.Vector(values[6:9])
+            self.MatPower = values[9]
+            self.MatAmbient = mathutils.Vector(values[10:13])
+            self.MatEdgeColor = mathutils.Vector(values[13:17])
+            self.MatEdgeSize = values[17]
+            self.MatTexture = mathutils.Vector(values[18:22])
+            self.MatSphere = mathutils.Vector(values[22:26])
+            self.MatToon = mathutils.Vector(values[26:30])
 
         elif type == 10:     # 10:Impalse
-            self.Index = ReadStruct(f, mode.RigidIndexSize)
-            self.IsLocal = ReadStruct(f, "B")
-            self.Move = mathutils.Vector(ReadStruct(f, "3f"))
-            self.Torque = mathutils.Vector(ReadStruct(f, "3f"))
+            self.IsLocal = values[1]
+            self.Move = mathutils.Vector(values[2:5])
+            self.Torque = mathutils.Vector(values[5:8])
 
         return
 
     def Save(self, f, mode, type):
         # [0:Group 1:Vertex 2:Bone 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4 8:Material]
+        layout = GetCodec(mode).MorphOffsets.get(type)
+        if layout is None:
+            return
+
         if type in (0, 9):   # 0:Group 9:Flip
-            WriteStruct(f, mode.MorphIndexSize, self.Index)
-            WriteStruct(f, "f", self.Power)
+            values = (self.Index, self.Power)
 
         elif type == 1:     # 1:Vertex
-            WriteStruct(f, mode.VertexIndexSize, self.Index)
-            WriteStruct(f, "3f", self.Move.to_tuple())
+            values = (self.Index,) + self.Move.to_tuple()
 
         elif type == 2:     # 2:Bone
-            WriteStruct(f, mode.BoneIndexSize, self.Index)
-            WriteStruct(f, "3f", self.Move.to_tuple())
-            WriteStruct(f, "4f", self.Rotate.to_tuple())
+            values = (self.Index,) + self.Move.to_tuple() + self.Rotate.to_tuple()
 
         elif type in (3, 4, 5, 6, 7):  # 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4
-            WriteStruct(f, mode.VertexIndexSize, self.Index)
-            WriteStruct(f, "4f", self.UV.to_tuple())
+            values = (self.Index,) + self.UV.to_tuple()
 
         elif type == 8:     # 8:Material
-            WriteStruct(f, mode.MaterialIndexSize, self.Index)
-            WriteStruct(f, "B", self.MatEffectType)
-            WriteStruct(f, "4f", self.MatDiffuse.to_tuple())
-            WriteStruct(f, "3f", self.MatSpeculer.to_tuple())
-            WriteStruct(f, "f", self.MatPower)
-            WriteStruct(f, "3f", self.MatAmbient.to_tuple())
-            WriteStruct(f, "4f", self.MatEdgeColor.to_tuple())
-            WriteStruct(f, "f", self.MatEdgeSize)
-            WriteStruct(f, "4f", self.MatTexture.to_tuple())
-            WriteStruct(f, "4f", self.MatSphere.to_tuple())
-            WriteStruct(f, "4f", self.MatToon.to_tuple())
+            values = (self.Index, self.MatEffectType) + self.MatDiffuse.to_tuple()
+            values += self.MatSpeculer.to_tuple() + (self.MatPower,) + self.MatAmbient.to_tuple()
+            values += self.MatEdgeColor.to_tuple() + (self.MatEdgeSize,)
+            values += self.MatTexture.to_tuple() + self.MatSphere.to_tuple() + self.MatToon.to_tuple()
 
         elif type == 10:     # 10:Impalse
-            WriteStruct(f, mode.RigidIndexSize, self.Index)
-            WriteStruct(f, "B", self.IsLocal)
-            WriteStruct(f, "3f", self.Move.to_tuple())
-            WriteStruct(f, "3f", self.Torque.to_tuple())
+            values = (self.Index, self.IsLocal) + self.Move.to_tuple() + self.Torque.to_tuple()
+
+        layout.Write(f, values)
         return
 
 
+class PMGroupMorphOffset(object):
+    # 0:Group 9:Flip
+    __slots__ = ("Index", "Power")
+
+    def __init__(self):
+        self.Index = -1
+        self.Power = 0.0
+
+    def Load(self, f, mode, type):
+        self.Index, self.Power = GetCodec(mode).MorphOffsets[type].Read(f)
+
+    def Save(self, f, mode, type):
+        GetCodec(mode).MorphOffsets[type].Write(f, (self.Index, self.Power))
+
+
+class PMVertexMorphOffset(object):
+    # 1:Vertex
+    __slots__ = ("Index", "Move")
+
+    def __init__(self):
+        self.Index = -1
+        self.Move = mathutils.Vector((0, 0, 0))
+
+    def Load(self, f, mode, type):
+        values = GetCodec(mode).MorphOffsets[type].Read(f)
+        self.Index = values[0]
+        self.Move = mathutils.Vector(values[1:4])
+
+    def Save(self, f, mode, type):
+        GetCodec(mode).MorphOffsets[type].Write(f, (self.Index,) + self.Move.to_tuple())
+
+
+class PMBoneMorphOffset(object):
+    # 2:Bone
+    __slots__ = ("Index", "Move", "Rotate")
+
+    def __init__(self):
+        self.Index = -1
+        self.Move = mathutils.Vector((0, 0, 0))
+        self.Rotate = mathutils.Vector((0, 0, 0, 0))
+
+    def Load(self, f, mode, type):
+        values = GetCodec(mode).MorphOffsets[type].Read(f)
+        self.Index = values[0]
+        self.Move = mathutils.Vector(values[1:4])
+        self.Rotate = mathutils.Vector(values[4:8])
+
+    def Save(self, f, mode, type):
+        values = (self.Index,) + self.Move.to_tuple() + self.Rotate.to_tuple()
+        GetCodec(mode).MorphOffsets[type].Write(f, values)
+
+
+class PMUVMorphOffset(object):
+    # 3:UV 4:ExUV1 5:ExUV2 6:ExUV3 7:ExUV4
+    __slots__ = ("Index", "UV")
+
+    def __init__(self):
+        self.Index = -1
+        self.UV = mathutils.Vector((0, 0, 0, 0))
+
+    def Load(self, f, mode, type):
+        values = GetCodec(mode).MorphOffsets[type].Read(f)
+        self.Index = values[0]
+        self.UV = mathutils.Vector(values[1:5])
+
+    def Save(self, f, mode, type):
+        GetCodec(mode).MorphOffsets[type].Write(f, (self.Index,) + self.UV.to_tuple())
+
+
+class PMMaterialMorphOffset(object):
+    # 8:Material
+    __slots__ = ("Index", "MatEffectType", "MatDiffuse", "MatSpeculer", "MatPower", "MatAmbient",
+                 "MatEdgeColor", "MatEdgeSize", "MatTexture", "MatSphere", "MatToon")
+
+    def __init__(self):
+        self.Index = -1
+        self.MatEffectType = 0  # [0:Multiplication 1:Add]
+        self.MatDiffuse = mathutils.Vector((0, 0, 0, 0))
+        self.MatSpeculer = mathutils.Vector((0, 0, 0))
+        self.MatPower = 0.5
+        self.MatAmbient = mathutils.Vector((0, 0, 0))
+        self.MatEdgeColor = mathutils.Vector((0, 0, 0, 0))
+        self.MatEdgeSize = 1.0
+        self.MatTexture = mathutils.Vector((0, 0, 0, 0))
+        self.MatSphere = mathutils.Vector((0, 0, 0, 0))
+        self.MatToon = mathutils.Vector((0, 0, 0, 0))
+
+    def Load(self, f, mode, type):
+        values = GetCodec(mode).MorphOffsets[type].Read(f)
+        self.Index = values[0]
+        self.MatEffectType = values[1]
+        self.MatDiffuse = mathutils.Vector(values[2:6])
+        self.MatSpeculer = mathutils.Vector(values[6:9])
+        self.MatPower = values[9]
+        self.MatAmbient = mathutils.Vector(values[10:13])
+        self.MatEdgeColor = mathutils.Vector(values[13:17])
+        self.MatEdgeSize = values[17]
+        self.MatTexture = mathutils.Vector(values[18:22])
+        self.MatSphere = mathutils.Vector(values[22:26])
+        self.MatToon = mathutils.Vector(values[26:30])
+
+    def Save(self, f, mode, type):
+        values = (self.Index, self.MatEffectType) + self.MatDiffuse.to_tuple()
+        values += self.MatSpeculer.to_tuple() + (self.MatPower,) + self.MatAmbient.to_tuple()
+        values += self.MatEdgeColor.to_tuple() + (self.MatEdgeSize,)
+        values += self.MatTexture.to_tuple() + self.MatSphere.to_tuple() + self.MatToon.to_tuple()
+        GetCodec(mode).MorphOffsets[type].Write(f, values)
+
+
+class PMImpulseMorphOffset(object):
+    # 10:Impulse
+    __slots__ = ("Index", "IsLocal", "Move", "Torque")
+
+    def __init__(self):
+        self.Index = -1
+        self.IsLocal = 0
+        self.Move = mathutils.Vector((0, 0, 0))
+        self.Torque = mathutils.Vector((0, 0, 0))
+
+    def Load(self, f, mode, type):
+        values = GetCodec(mode).MorphOffsets[type].Read(f)
+        self.Index = values[0]
+        self.IsLocal = values[1]
+        self.Move = mathutils.Vector(values[2:5])
+        self.Torque = mathutils.Vector(values[5:8])
+
+    def Save(self, f, mode, type):
+        values = (self.Index, self.IsLocal) + self.Move.to_tuple() + self.Torque.to_tuple()
+        GetCodec(mode).MorphOffsets[type].Write(f, values)
+
+
+# Offset record class by morph type
+MORPH_OFFSETS = {
+    0: PMGroupMorphOffset,
+    1: PMVertexMorphOffset,
+    2: PMBoneMorphOffset,
+    3: PMUVMorphOffset,
+    4: PMUVMorphOffset,
+    5: PMUVMorphOffset,
+    6: PMUVMorphOffset,
+    7: PMUVMorphOffset,
+    8: PMMaterialMorphOffset,
+    9: PMGroupMorphOffset,
+    10: PMImpulseMorphOffset,
+}
+
+
 class PMDisplayFrame(object):
+    __slots__ = ("Name", "Name_E", "Type", "Members")
 
     def __init__(self):
         self.Name = ""
@@ -1118,40 +1577,40 @@ class PMDisplayFrame(object):
         self.Members = []
 
     def Load(self, f, mode):
+        codec = GetCodec(mode)
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
 
-        self.Type = ReadStruct(f, "B")
+        self.Type, count = codec.DisplayFrame.Read(f)
 
-        count = ReadStruct(f, "i")
         self.Members = [0] * count
         for i in range(count):
-            self.Members[i] = [0, 0]
-            self.Members[i][0] = ReadStruct(f, "B")  # [0:Bone 1:Morph ]
-            if self.Members[i][0] == 0:
-                self.Members[i][1] = ReadStruct(f, mode.BoneIndexSize)
+            kind = codec.Byte.Read(f)[0]  # [0:Bone 1:Morph ]
+            if kind == 0:
+                self.Members[i] = [kind, codec.DisplayBone.Read(f)[0]]
             else:
-                self.Members[i][1] = ReadStruct(f, mode.MorphIndexSize)
+                self.Members[i] = [kind, codec.DisplayMorph.Read(f)[0]]
         return
 
     def Save(self, f, mode):
+        codec = GetCodec(mode)
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
 
-        WriteStruct(f, "B", self.Type)
-
         count = len(self.Members)
-        WriteStruct(f, "i", count)
+        codec.DisplayFrame.Write(f, (self.Type, count))
         for i in range(count):
-            WriteStruct(f, "B", self.Members[i][0])
+            codec.Byte.Write(f, (self.Members[i][0],))
             if self.Members[i][0] == 0:
-                WriteStruct(f, mode.BoneIndexSize, self.Members[i][1])
+                codec.DisplayBone.Write(f, (self.Members[i][1],))
             else:
-                WriteStruct(f, mode.MorphIndexSize, self.Members[i][1])
+                codec.DisplayMorph.Write(f, (self.Members[i][1],))
         return
 
 
 class PMRigid(object):
+    __slots__ = ("Name", "Name_E", "Bone", "Group", "NoCollision", "BoundType", "Size", "Position", "Rotate", "Mass",
+                 "PosLoss", "RotLoss", "OpPos", "Friction", "PhysicalType")
 
     def __init__(self):
         self.Name = ""
@@ -1178,19 +1637,20 @@ class PMRigid(object):
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
 
-        self.Bone = ReadStruct(f, mode.BoneIndexSize)
-        self.Group = ReadStruct(f, "B")
-        self.NoCollision = ReadStruct(f, "H")
-        self.BoundType = ReadStruct(f, "B")
-        self.Size = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Position = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Rotate = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Mass = ReadStruct(f, "f")
-        self.PosLoss = ReadStruct(f, "f")
-        self.RotLoss = ReadStruct(f, "f")
-        self.OpPos = ReadStruct(f, "f")
-        self.Friction = ReadStruct(f, "f")
-        self.PhysicalType = ReadStruct(f, "B")
+        values = GetCodec(mode).Rigid.Read(f)
+        self.Bone = values[0]
+        self.Group = values[1]
+        self.NoCollision = values[2]
+        self.BoundType = values[3]
+        self.Size = mathutils.Vector(values[4:7])
+        self.Position = mathutils.Vector(values[7:10])
+        self.Rotate = mathutils.Vector(values[10:13])
+        self.Mass = values[13]
+        self.PosLoss = values[14]
+        self.RotLoss = values[15]
+        self.OpPos = values[16]
+        self.Friction = values[17]
+        self.PhysicalType = values[18]
 
         return
 
@@ -1198,24 +1658,17 @@ class PMRigid(object):
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
 
-        WriteStruct(f, mode.BoneIndexSize, self.Bone)
-        WriteStruct(f, "B", self.Group)
-        WriteStruct(f, "H", self.NoCollision)
-        WriteStruct(f, "B", self.BoundType)
-        WriteStruct(f, "3f", self.Size.to_tuple())
-        WriteStruct(f, "3f", self.Position.to_tuple())
-        WriteStruct(f, "3f", self.Rotate.to_tuple())
-        WriteStruct(f, "f", self.Mass)
-        WriteStruct(f, "f", self.PosLoss)
-        WriteStruct(f, "f", self.RotLoss)
-        WriteStruct(f, "f", self.OpPos)
-        WriteStruct(f, "f", self.Friction)
-        WriteStruct(f, "B", self.PhysicalType)
+        values = (self.Bone, self.Group, self.NoCollision, self.BoundType)
+        values += self.Size.to_tuple() + self.Position.to_tuple() + self.Rotate.to_tuple()
+        values += (self.Mass, self.PosLoss, self.RotLoss, self.OpPos, self.Friction, self.PhysicalType)
+        GetCodec(mode).Rigid.Write(f, values)
 
         return
 
 
 class PMJoint(object):
+    __slots__ = ("Name", "Name_E", "Type", "Parent", "Child", "Position", "Rotate", "PosLowerLimit", "PosUpperLimit",
+                 "RotLowerLimit", "RotUpperLimit", "PosSpring", "RotSpring")
 
     def __init__(self):
         self.Name = ""
@@ -1240,18 +1693,19 @@ class PMJoint(object):
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
 
-        self.Type = ReadStruct(f, "B")  # [0:Spring6DOF] Fixed
+        values = GetCodec(mode).Joint.Read(f)
+        self.Type = values[0]  # [0:Spring6DOF] Fixed
 
-        self.Parent = ReadStruct(f, mode.RigidIndexSize)
-        self.Child = ReadStruct(f, mode.RigidIndexSize)
-        self.Position = mathutils.Vector(ReadStruct(f, "3f"))
-        self.Rotate = mathutils.Vector(ReadStruct(f, "3f"))
-        self.PosLowerLimit = mathutils.Vector(ReadStruct(f, "3f"))
-        self.PosUpperLimit = mathutils.Vector(ReadStruct(f, "3f"))
-        self.RotLowerLimit = mathutils.Vector(ReadStruct(f, "3f"))
-        self.RotUpperLimit = mathutils.Vector(ReadStruct(f, "3f"))
-        self.PosSpring = mathutils.Vector(ReadStruct(f, "3f"))
-        self.RotSpring = mathutils.Vector(ReadStruct(f, "3f"))
+        self.Parent = values[1]
+        self.Child = values[2]
+        self.Position = mathutils.Vector(values[3:6])
+        self.Rotate = mathutils.Vector(values[6:9])
+        self.PosLowerLimit = mathutils.Vector(values[9:12])
+        self.PosUpperLimit = mathutils.Vector(values[12:15])
+        self.RotLowerLimit = mathutils.Vector(values[15:18])
+        self.RotUpperLimit = mathutils.Vector(values[18:21])
+        self.PosSpring = mathutils.Vector(values[21:24])
+        self.RotSpring = mathutils.Vector(values[24:27])
 
         return
 
@@ -1259,23 +1713,20 @@ class PMJoint(object):
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
 
-        WriteStruct(f, "B", self.Type)
-
-        WriteStruct(f, mode.RigidIndexSize, self.Parent)
-        WriteStruct(f, mode.RigidIndexSize, self.Child)
-        WriteStruct(f, "3f", self.Position.to_tuple())
-        WriteStruct(f, "3f", self.Rotate.to_tuple())
-        WriteStruct(f, "3f", self.PosLowerLimit.to_tuple())
-        WriteStruct(f, "3f", self.PosUpperLimit.to_tuple())
-        WriteStruct(f, "3f", self.RotLowerLimit.to_tuple())
-        WriteStruct(f, "3f", self.RotUpperLimit.to_tuple())
-        WriteStruct(f, "3f", self.PosSpring.to_tuple())
-        WriteStruct(f, "3f", self.RotSpring.to_tuple())
+        values = (self.Type, self.Parent, self.Child)
+        values += self.Position.to_tuple() + self.Rotate.to_tuple()
+        values += self.PosLowerLimit.to_tuple() + self.PosUpperLimit.to_tuple()
+        values += self.RotLowerLimit.to_tuple() + self.RotUpperLimit.to_tuple()
+        values += self.PosSpring.to_tuple() + self.RotSpring.to_tuple()
+        GetCodec(mode).Joint.Write(f, values)
 
         return
 
 
 class PMSoftBody(object):
+    __slots__ = ("Name", "Name_E", "Type", "Material", "Group", "NoCollision", "B_Link", "MakeCluster", "LinkCrossing",
+                 "B_Link_Length", "ClusterSize", "Mass", "Mergine", "AeroModel", "Configs", "ClusterSettings",
+                 "IterationSettings", "MaterialSettings", "Anchors", "Pins")
 
     def __init__(self):
         self.Name = ""
@@ -1312,89 +1763,73 @@ class PMSoftBody(object):
         return
 
     def Load(self, f, mode):
+        codec = GetCodec(mode)
         self.Name = ReadString(f, mode)
         self.Name_E = ReadString(f, mode)
 
-        self.Type = ReadStruct(f, "B")
+        values = codec.SoftBody.Read(f)
+        self.Type = values[0]
 
-        self.Material = ReadStruct(f, mode.MaterialIndexSize)
+        self.Material = values[1]
 
-        self.Group = ReadStruct(f, "B")
-        self.NoCollision = ReadStruct(f, "H")
+        self.Group = values[2]
+        self.NoCollision = values[3]
 
-        Flag = ReadStruct(f, "B")
+        Flag = values[4]
         self.B_Link = 1 if Flag & 0x01 != 0 else 0
         self.MakeCluster = 1 if Flag & 0x02 != 0 else 0
         self.LinkCrossing = 1 if Flag & 0x04 != 0 else 0
 
-        self.B_Link_Length = ReadStruct(f, "i")
-        self.ClusterSize = ReadStruct(f, "i")
+        self.B_Link_Length = values[5]
+        self.ClusterSize = values[6]
 
-        self.Mass = ReadStruct(f, "f")
-        self.Mergine = ReadStruct(f, "f")
+        self.Mass = values[7]
+        self.Mergine = values[8]
 
-        self.AeroModel = ReadStruct(f, "i")
+        self.AeroModel = values[9]
 
-        self.Configs = ReadStruct(f, "12f")
-        self.ClusterSettings = ReadStruct(f, "6f")
-        self.IterationSettings = ReadStruct(f, "4i")
-        self.MaterialSettings = ReadStruct(f, "3f")
+        self.Configs = tuple(values[10:22])
+        self.ClusterSettings = tuple(values[22:28])
+        self.IterationSettings = tuple(values[28:32])
+        self.MaterialSettings = tuple(values[32:35])
 
-        count = ReadStruct(f, "i")
+        count = codec.Int.Read(f)[0]
         self.Anchors = [0] * count
         for i in range(count):
-            self.Anchors[i] = [0, 0, 0]
-            self.Anchors[i][0] = ReadStruct(f, mode.RegidIndexSize)
-            self.Anchors[i][1] = ReadStruct(f, mode.VertexIndexSize)
-            self.Anchors[i][2] = ReadStruct(f, "B")  # [0:OFF 1:ON ]
+            self.Anchors[i] = list(codec.SoftBodyAnchor.Read(f))  # [Rigid, Vertex, 0:OFF 1:ON ]
 
-        count = ReadStruct(f, "i")
+        count = codec.Int.Read(f)[0]
         self.Pins = [0] * count
         for i in range(count):
-            self.Pins[i] = ReadStruct(f, mode.VertexIndexSize)
+            self.Pins[i] = codec.SoftBodyPin.Read(f)[0]
         return
 
     def Save(self, f, mode):
+        codec = GetCodec(mode)
         WriteString(f, mode, self.Name)
         WriteString(f, mode, self.Name_E)
 
-        WriteStruct(f, "B", self.Type)
-        WriteStruct(f, mode.MaterialIndexSize, self.Material)
-
-        WriteStruct(f, "B", self.Group)
-        WriteStruct(f, "H", self.NoCollision)
-
         Flag = 0
         Flag += self.B_Link * 0x01
         Flag += self.MakeCluster * 0x02
         Flag += self.LinkCrossing * 0x04
-        WriteStruct(f, "B", Flag)
-
-        WriteStruct(f, "i", self.B_Link_Length)
-        WriteStruct(f, "i", self.ClusterSize)
-
-        WriteStruct(f, "f", self.Mass)
-        WriteStruct(f, "f", self.Mergine)
-
-        WriteStruct(f, "i", self.AeroModel)
 
-        WriteStruct(f, "12f", self.Configs)
-        WriteStruct(f, "6f", self.ClusterSettings)
-        WriteStruct(f, "4i", self.IterationSettings)
-        WriteStruct(f, "3f", self.MaterialSettings)
+        values = (self.Type, self.Material, self.Group, self.NoCollision, Flag,
+                  self.B_Link_Length, self.ClusterSize, self.Mass, self.Mergine, self.AeroModel)
+        values += tuple(self.Configs) + tuple(self.ClusterSettings)
+        values += tuple(self.IterationSettings) + tuple(self.MaterialSettings)
+        codec.SoftBody.Write(f, values)
 
         count = len(self.Anchors)
-        WriteStruct(f, "i", count)
+        codec.Int.Write(f, (count,))
         for i in range(count):
-            WriteStruct(f, mode.RegidIndexSize, self.Anchors[i][0])
-            WriteStruct(f, mode.VertexIndexSize, self.Anchors[i][1])
-            WriteStruct(f, "B", self.Anchors[i][2])
+            codec.SoftBodyAnchor.Write(f, self.Anchors[i])
 
         self.Pins = []
         count = len(self.Pins)
-        WriteStruct(f, "i", count)
+        codec.Int.Write(f, (count,))
         for i in range(count):
-            WriteStruct(f, mode.VertexIndexSize, self.Pins[i])
+            codec.SoftBodyPin.Write(f, (self.Pins[i],))
 
         return
 
@@ -0,0 +1,155 @@
+#
+# probe.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+from struct import error as StructError
+
+from . import pmd
+from .codec import CompiledStruct
+from .pmx import ModelStatus
+from .pmx import ReadString
+from .pmx import ReadStruct
+
+# PMD record sizes of the sections that can be stepped over with seek()
+PMD_VERTEX_SIZE = 38
+PMD_POLY_SIZE = 2
+PMD_MATERIAL_SIZE = 70
+PMD_BONE_SIZE = 39
+PMD_IK_SIZE = 11  # + 2 * link count
+PMD_SKIN_SIZE = 25  # + 16 * vertex count
+PMD_SKIN_VERT_SIZE = 16
+PMD_SKIN_INDEX_SIZE = 2
+PMD_DISP_NAME_SIZE = 50
+PMD_BONE_INDEX_SIZE = 3
+PMD_TOON_SIZE = 100 * 10
+PMD_RIGID_SIZE = 83
+PMD_JOINT_SIZE = 124
+
+PMD_ENGLISH_HEADER_SIZE = 20 + 256
+PMD_ENGLISH_BONE_SIZE = 20
+PMD_ENGLISH_SKIN_INDEX_SIZE = 20
+PMD_ENGLISH_DISP_NAME_SIZE = 50
+
+
+class PMHeader(object):
+
+    def __init__(self):
+        self.Status = ModelStatus()  # Magic, Version, Encode and index sizes
+
+        self.Name = ""
+        self.Name_E = ""
+        self.Comment = ""
+        self.Comment_E = ""
+
+        # Record count by Model attribute name
+        #   PMX | Vertices only, the vertex block has variable size
+        #   PMD | every section, found by seeking over fixed size records
+        self.Counts = {}
+
+
+def ProbeHeader(f):
+    # Read the header of a PMX or PMD file without loading the model.
+    # Returns None if f is neither.
+    header = PMHeader()
+    start = f.tell()
+    magic = f.read(4)
+    f.seek(start)
+    if magic != b"PMX " and magic[:3] != b"Pmd":  # also an empty or short file
+        return None
+
+    header.Status.Load(f)
+
+    if header.Status.HasError:
+        return None
+
+    if header.Status.Magic == 1:  # PMX
+        header.Name = ReadString(f, header.Status)
+        header.Name_E = ReadString(f, header.Status)
+        header.Comment = ReadString(f, header.Status).replace("\r", "")
+        header.Comment_E = ReadString(f, header.Status).replace("\r", "")
+        header.Counts["Vertices"] = ReadStruct(f, "i")
+        return header
+
+    f.seek(start)
+    ProbePmd(f, header)
+    return header
+
+
+def ProbePmd(f, header):
+    pmd_header = pmd.PMDHeader()
+    pmd_header.Load(f)
+    header.Name = pmd_header.Name
+    header.Comment = pmd_header.Comment
+
+    # Explicit little endian sizes, native "L" is 8 bytes on LP64 platforms.
+    # A section is counted only if all of its records are in the file.
+    counts = header.Counts
+    try:
+        if not f.seekable():
+            counts["Vertices"] = ReadPmd(f, "<L")
+            return
+
+        pos = f.tell()
+        end = f.seek(0, 2)
+        f.seek(pos)
+
+        counts["Vertices"] = SkipPmd(f, "<L", PMD_VERTEX_SIZE, end)
+        counts["Polys"] = SkipPmd(f, "<L", PMD_POLY_SIZE, end)
+        counts["Materials"] = SkipPmd(f, "<L", PMD_MATERIAL_SIZE, end)
+        counts["Bones"] = SkipPmd(f, "<H", PMD_BONE_SIZE, end)
+
+        ik_count = ReadPmd(f, "<H")
+        for i in range(ik_count):
+            Skip(f, 4, end)
+            link_count = ReadPmd(f, "<B")
+            Skip(f, PMD_IK_SIZE - 5 + 2 * link_count, end)
+        counts["IKs"] = ik_count
+
+        skin_count = ReadPmd(f, "<H")
+        for i in range(skin_count):
+            Skip(f, 20, end)
+            vert_count = ReadPmd(f, "<L")
+            Skip(f, PMD_SKIN_SIZE - 24 + PMD_SKIN_VERT_SIZE * vert_count, end)
+        counts["Skins"] = skin_count
+
+        counts["SkinIndexs"] = SkipPmd(f, "<B", PMD_SKIN_INDEX_SIZE, end)
+        counts["DispNames"] = SkipPmd(f, "<B", PMD_DISP_NAME_SIZE, end)
+        counts["BoneIndexs"] = SkipPmd(f, "<L", PMD_BONE_INDEX_SIZE, end)
+
+        if ReadPmd(f, "<B") != 0:  # English
+            Skip(f, PMD_ENGLISH_HEADER_SIZE, end)
+            f.seek(-PMD_ENGLISH_HEADER_SIZE, 1)
+            pmd_header.Load_E(f)
+            header.Name_E = pmd_header.Name_E
+            header.Comment_E = pmd_header.Comment_E
+            Skip(f, PMD_ENGLISH_BONE_SIZE * counts["Bones"], end)
+            Skip(f, PMD_ENGLISH_SKIN_INDEX_SIZE * counts["SkinIndexs"], end)
+            Skip(f, PMD_ENGLISH_DISP_NAME_SIZE * counts["DispNames"], end)
+
+        Skip(f, PMD_TOON_SIZE, end)
+        counts["Rigids"] = SkipPmd(f, "<L", PMD_RIGID_SIZE, end)
+        counts["Joints"] = SkipPmd(f, "<L", PMD_JOINT_SIZE, end)
+    except StructError:
+        # Truncated or PMD without the optional trailing sections
+        pass
+
+
+def ReadPmd(f, format):
+    # pmd.ReadStruct without its fallbacks, a short read raises StructError
+    compiled = CompiledStruct(format)
+    return compiled.unpack(f.read(compiled.size))[0]
+
+
+def Skip(f, size, end):
+    # seek() does not fail past the end of the file
+    if f.seek(size, 1) > end:
+        raise StructError("truncated")
+
+
+def SkipPmd(f, format, size, end):
+    count = ReadPmd(f, format)
+    Skip(f, size * count, end)
+    return count
@@ -0,0 +1,131 @@
+#
+# splice.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+import mmap
+import os
+import shutil
+import tempfile
+
+from .bulk import WriteFaces
+from .codec import BufferReader
+from .codec import BufferWriter
+from .container import SplitCompression
+from .pmx import VertexBuffer
+from .pmx import WriteStruct
+from .pmx import paramSetSize
+from .pmx import paramSize
+from .stream import INDEX_SIZES
+from .toc import ScanSections
+
+# Bytes per read when copy_file_range is not available
+COPY_CHUNK = 1 << 20
+
+
+def SpliceSections(src, dst, sections):
+    # Write the PMX file src to dst with some sections replaced, e.g. Rigids and Joints.
+    #   sections | {Model attribute name: records}, Faces as a list or array of vertex indices
+    # The other sections are copied byte for byte and never decoded.
+    # The records are encoded with the index sizes of src, so a section can not grow past them.
+    # src and dst may be the same path.
+    if SplitCompression(src)[1] or SplitCompression(dst)[1]:
+        raise ValueError("compressed files can not be spliced")
+
+    with open(src, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            data = b""
+        try:
+            view = memoryview(data)
+            contents = ScanSections(BufferReader(view))
+            view.release()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    mode = contents.Status
+    if mode.Magic != 1 or mode.HasError:
+        raise ValueError("%s is not a PMX file" % src)
+
+    for name, records in sections.items():
+        if name not in contents:
+            raise ValueError("unknown section %s" % name)
+        CheckIndexSize(name, len(records), mode)
+
+    # A new file next to dst, moved over it when complete
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst)))
+    try:
+        with open(src, "rb") as f, open(fd, "wb", buffering=0) as out:
+            pos = 0
+            end = contents.NameOffset
+            for section in contents:
+                # SoftBodies of PMX 2.0 have no count field
+                start = section.Offset - 4 if section.Offset - 4 >= end else section.Offset
+                end = section.End
+
+                if section.Name in sections:
+                    CopyRange(f, out, pos, start)
+                    out.write(EncodeSection(section.Name, sections[section.Name], mode))
+                    pos = end
+
+            CopyRange(f, out, pos, os.fstat(f.fileno()).st_size)
+
+        shutil.copymode(src, temp_path)
+        os.replace(temp_path, dst)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def CheckIndexSize(name, count, mode):
+    if name not in INDEX_SIZES:
+        return
+
+    attr, is_vert = INDEX_SIZES[name]
+    needed = paramSetSize(paramSize(range(count), is_vert))
+    if needed > paramSetSize(getattr(mode, attr)):
+        raise ValueError("%d records of %s do not fit in %s, save the whole model" % (count, name, attr))
+
+
+def EncodeSection(name, records, mode):
+    # Count field and records of one section
+    f = BufferWriter()
+    WriteStruct(f, "i", len(records))
+    if name == "Faces":
+        WriteFaces(f, records, mode)
+    elif isinstance(records, VertexBuffer):
+        records.Save(f, mode)
+    else:
+        for record in records:
+            record.Save(f, mode)
+    return f.Data
+
+
+def CopyRange(src, dst, start, end):
+    # Copy bytes [start, end) of src to dst, in the kernel where possible
+    count = end - start
+    if count <= 0:
+        return
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while count > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), count, start)
+                if copied == 0:
+                    break
+                start += copied
+                count -= copied
+        except OSError:  # e.g. not supported by the file system
+            pass
+
+    src.seek(start)
+    while count > 0:
+        chunk = src.read(min(count, COPY_CHUNK))
+        if not chunk:
+            raise ValueError("%s is truncated" % src.name)
+        dst.write(chunk)
+        count -= len(chunk)
@@ -0,0 +1,327 @@
+#
+# stream.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+from copy import copy
+
+from .bulk import ReadFaces
+from .bulk import WriteFaces
+from .codec import BufferWriter
+from .codec import CompiledStruct
+from .codec import GetCodec
+from .container import IsSeekable
+from .pmx import PMBone
+from .pmx import PMDisplayFrame
+from .pmx import PMJoint
+from .pmx import PMMaterial
+from .pmx import PMMorph
+from .pmx import PMRigid
+from .pmx import PMSoftBody
+from .pmx import PMTexture
+from .pmx import PMVertex
+from .pmx import ReadString
+from .pmx import ReadStruct
+from .pmx import WriteString
+from .pmx import WriteStruct
+from .pmx import paramSetSize
+from .pmx import paramSize
+from .probe import PMHeader
+
+# Section order of a PMX file as (Model attribute, event name, record class)
+EVENTS = (
+    ("Vertices", "vertex", PMVertex),
+    ("Faces", "face", None),
+    ("Textures", "texture", PMTexture),
+    ("Materials", "material", PMMaterial),
+    ("Bones", "bone", PMBone),
+    ("Morphs", "morph", PMMorph),
+    ("DisplayFrames", "display_frame", PMDisplayFrame),
+    ("Rigids", "rigid", PMRigid),
+    ("Joints", "joint", PMJoint),
+    ("SoftBodies", "soft_body", PMSoftBody),
+)
+
+# Triangles decoded per read of the face block
+FACE_CHUNK = 4096
+
+# Index size chosen from the record count of a section, (ModelStatus attribute, is_vert)
+INDEX_SIZES = {
+    "Vertices": ("VertexIndexSize", 1),
+    "Textures": ("TextureIndexSize", 0),
+    "Materials": ("MaterialIndexSize", 0),
+    "Bones": ("BoneIndexSize", 0),
+    "Morphs": ("MorphIndexSize", 0),
+    "Rigids": ("RigidIndexSize", 0),
+}
+
+# Header byte order of the index sizes, the first one is 11 bytes after "PMX "
+HEADER_INDEX_SIZES = ("VertexIndexSize", "TextureIndexSize", "MaterialIndexSize",
+                      "BoneIndexSize", "MorphIndexSize", "RigidIndexSize")
+HEADER_INDEX_OFFSET = 11
+
+# Index sizes the records of a section refer to, Morphs are checked by morph type
+REFERENCES = {
+    "Vertices": ("BoneIndexSize",),
+    "Faces": ("VertexIndexSize",),
+    "Textures": (),
+    "Materials": ("TextureIndexSize",),
+    "Bones": ("BoneIndexSize",),
+    "Morphs": (),
+    "DisplayFrames": ("BoneIndexSize", "MorphIndexSize"),
+    "Rigids": ("BoneIndexSize",),
+    "Joints": ("RigidIndexSize",),
+    "SoftBodies": ("VertexIndexSize", "MaterialIndexSize", "RigidIndexSize"),
+}
+
+MORPH_REFERENCES = {
+    0: "MorphIndexSize",
+    1: "VertexIndexSize",
+    2: "BoneIndexSize",
+    3: "VertexIndexSize",
+    4: "VertexIndexSize",
+    5: "VertexIndexSize",
+    6: "VertexIndexSize",
+    7: "VertexIndexSize",
+    8: "MaterialIndexSize",
+    9: "MorphIndexSize",
+    10: "RigidIndexSize",
+}
+
+# Buffered bytes handed to the file at once
+WRITE_CHUNK = 1 << 20
+
+
+def IterRecords(f):
+    # Read a PMX file front to back without building a Model.
+    # Yields (event, index, data):
+    #   ("header", 0, PMHeader)         | Status, Name, Name_E, Comment and Comment_E
+    #   ("section", count, name)        | before the records of each section, name is the Model attribute
+    #   ("vertex", i, PMVertex) ...     | one record, see EVENTS
+    #   ("face", i, (v0, v1, v2))       | one triangle of vertex indices
+    # Only the record being yielded is held, memory does not grow with the file size.
+    # A PMD file yields the header only.
+    header = PMHeader()
+    header.Status.Load(f)
+    mode = header.Status
+
+    if mode.Magic != 1 or mode.HasError:
+        yield ("header", 0, header)
+        return
+
+    header.Name = ReadString(f, mode)
+    header.Name_E = ReadString(f, mode)
+    header.Comment = ReadString(f, mode).replace("\r", "")
+    header.Comment_E = ReadString(f, mode).replace("\r", "")
+    yield ("header", 0, header)
+
+    for name, event, record_class in EVENTS:
+        count = ReadStruct(f, "i")
+        yield ("section", count, name)
+
+        if record_class is None:
+            yield from IterFaces(f, count, mode)
+            continue
+
+        for i in range(count):
+            record = record_class()
+            record.Load(f, mode)
+            yield (event, i, record)
+
+
+def IterFaces(f, count, mode):
+    # count is the number of vertex indices, 3 per triangle
+    index = 0
+    while count > 0:
+        chunk = min(count, FACE_CHUNK * 3)
+        faces = ReadFaces(f, chunk, mode).tolist()
+        count -= chunk
+
+        for i in range(0, chunk, 3):
+            yield ("face", index, tuple(faces[i:i + 3]))
+            index += 1
+
+
+class StreamWriter(object):
+    # Write a PMX file section by section without building a Model.
+    # The count of a section is reserved and patched when the section ends,
+    # so its records may come from generators. If f is not seekable
+    # (e.g. a compressed file) the bytes are kept until Close.
+    #
+    # An index size of mode left as None is chosen from the count of its section
+    # (like Model.Save) and patched into the header. Records that refer to it
+    # can only be written after that section.
+    #
+    #   writer = StreamWriter(f, status)
+    #   writer.WriteHeader(name, name_e, comment, comment_e)
+    #   writer.BeginSection("Vertices")
+    #   for vertex in vertices: writer.Write(vertex)
+    #   writer.EndSection()
+    #   writer.WriteSection("Faces", [faces])
+    #   ...
+    #   writer.Close()
+
+    def __init__(self, f, mode):
+        self.File = f
+        self.Status = mode
+        self.Mode = None  # Status with placeholders for the sizes not chosen yet
+        self.Buffer = BufferWriter()
+        self.Start = f.tell()
+        self.Seekable = IsSeekable(f)
+        self.Flushed = self.Start  # file position of Buffer.Data[0]
+
+        self.Section = None  # name of the open section
+        self.Next = 0  # index in EVENTS of the next section
+        self.CountOffset = None  # reserved count field of the open section
+        self.Count = 0
+        self.Counts = {}  # record count by section name
+        self.UpdateMode()
+
+    def UpdateMode(self):
+        self.Mode = copy(self.Status)
+        for name in HEADER_INDEX_SIZES:
+            if getattr(self.Mode, name) is None:
+                setattr(self.Mode, name, "i")
+
+    def tell(self):
+        return self.Flushed + len(self.Buffer.Data)
+
+    def Flush(self):
+        self.Flushed += len(self.Buffer.Data)
+        self.Buffer.Flush(self.File)
+
+    def FlushChunk(self):
+        if self.Seekable and len(self.Buffer.Data) >= WRITE_CHUNK:
+            self.Flush()
+
+    def Patch(self, pos, data):
+        if pos >= self.Flushed:
+            pos -= self.Flushed
+            self.Buffer.Data[pos:pos + len(data)] = data
+            return
+
+        self.File.seek(pos)
+        self.File.write(data)
+        self.File.seek(self.Flushed)
+
+    def CheckSizes(self, names, what):
+        for name in names:
+            if getattr(self.Status, name) is None:
+                raise ValueError("%s refers to %s which is not known yet" % (what, name))
+
+    def WriteHeader(self, name="", name_e="", comment="", comment_e=""):
+        self.Status.Magic = 1  # PMX
+        self.Mode.Magic = 1
+        self.Mode.Save(self.Buffer)
+        WriteString(self.Buffer, self.Mode, name)
+        WriteString(self.Buffer, self.Mode, name_e)
+        WriteString(self.Buffer, self.Mode, comment)
+        WriteString(self.Buffer, self.Mode, comment_e)
+
+    def BeginSection(self, name, count=None):
+        # count | None reserves the count field until EndSection
+        if self.Section is not None:
+            self.EndSection()
+
+        index = [event[0] for event in EVENTS].index(name)
+        if index < self.Next:
+            raise ValueError("%s section is already written" % name)
+
+        # Sections that were left out are empty
+        for skipped, _, _ in EVENTS[self.Next:index]:
+            self.BeginSection(skipped, 0)
+            self.EndSection()
+
+        self.Section = name
+        self.Next = index + 1
+        self.Count = 0
+        if count is None:
+            self.CountOffset = self.tell()
+        else:
+            self.CountOffset = None
+            self.ResolveSize(name, count)
+        WriteStruct(self.Buffer, "i", count or 0)
+
+        if count != 0:
+            self.CheckSizes(REFERENCES[name], name)
+
+    def EndSection(self):
+        name = self.Section
+        if name is None:
+            return
+
+        if self.CountOffset is not None:
+            self.Patch(self.CountOffset, CompiledStruct("<i").pack(self.Count))
+            self.ResolveSize(name, self.Count)
+        self.Counts[name] = self.Count
+        self.Section = None
+        self.CountOffset = None
+
+    def ResolveSize(self, name, count):
+        if name not in INDEX_SIZES:
+            return
+
+        attr, is_vert = INDEX_SIZES[name]
+        if getattr(self.Status, attr) is not None:
+            return
+
+        size = paramSize(range(count), is_vert)
+        setattr(self.Status, attr, size)
+        self.UpdateMode()
+
+        pos = self.Start + HEADER_INDEX_OFFSET + HEADER_INDEX_SIZES.index(attr)
+        self.Patch(pos, bytes((paramSetSize(size),)))
+
+    def Write(self, record):
+        # One record of the open section, for Faces a sequence of vertex indices
+        if self.Section is None:
+            raise ValueError("no section is open")
+
+        if self.Section == "Faces":
+            WriteFaces(self.Buffer, record, self.Mode)
+            self.Count += len(record)
+        else:
+            if self.Section == "Morphs":
+                self.CheckSizes((MORPH_REFERENCES.get(record.Type, "MorphIndexSize"),), "Morph")
+            record.Save(self.Buffer, self.Mode)
+            self.Count += 1
+
+        self.FlushChunk()
+
+    def WriteMorph(self, morph, offsets):
+        # A morph whose offsets come from an iterable, morph.Offsets is not used
+        if self.Section != "Morphs":
+            raise ValueError("Morphs section is not open")
+        self.CheckSizes((MORPH_REFERENCES.get(morph.Type, "MorphIndexSize"),), "Morph")
+
+        codec = GetCodec(self.Mode)
+        WriteString(self.Buffer, self.Mode, morph.Name)
+        WriteString(self.Buffer, self.Mode, morph.Name_E)
+        codec.Morph.Write(self.Buffer, (morph.Panel, morph.Type, 0))
+        count_offset = self.tell() - 4
+
+        count = 0
+        for offset in offsets:
+            offset.Save(self.Buffer, self.Mode, morph.Type)
+            count += 1
+            self.FlushChunk()
+
+        self.Patch(count_offset, CompiledStruct("<i").pack(count))
+        self.Count += 1
+
+    def WriteSection(self, name, records):
+        self.BeginSection(name, len(records) if hasattr(records, "__len__") and name != "Faces" else None)
+        for record in records:
+            self.Write(record)
+        self.EndSection()
+
+    def Close(self):
+        # End the open section, write the missing ones as empty and flush.
+        # f is left open.
+        self.EndSection()
+        if self.Next < len(EVENTS):
+            self.BeginSection(EVENTS[-1][0], 0)
+            self.EndSection()
+        self.Flush()
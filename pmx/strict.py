@@ -0,0 +1,106 @@
+#
+# strict.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+from struct import error as StructError
+
+from .codec import BufferReader
+from .codec import CompiledStruct
+from .pmx import ReadString
+from .toc import FormatError
+from .toc import LoadRecords
+from .toc import ScanSections
+
+# "PMX ", version, parameter size and the 8 parameters
+HEADER_SIZE = 17
+
+
+class SectionReader(BufferReader):
+    # BufferReader over one section, reading past its end raises FormatError
+    # instead of returning short data
+    Strict = True
+
+    def __init__(self, data, section):
+        super().__init__(data, section.Offset)
+        self.Section = section
+
+    def read(self, size=-1):
+        if size >= 0 and self.Offset + size > self.Section.End:
+            raise FormatError(self.Section.Name, self.Offset)
+        return super().read(size)
+
+    def ReadStruct(self, format):
+        # pmx.ReadStruct without the fallback to 0 and the exception handling per field,
+        # a field past the end of the section raises FormatError
+        compiled = CompiledStruct(format)
+        if self.Offset + compiled.size > self.Section.End:
+            raise FormatError(self.Section.Name, self.Offset)
+        values = compiled.unpack_from(self.Data, self.Offset)
+        self.Offset += compiled.size
+        if len(values) > 1:
+            return values
+        if format == "B" and values[0] == 255:
+            return -1
+        if format == "H" and values[0] == 65535:
+            return -1
+        return values[0]
+
+
+def CheckHeader(data):
+    # The fixed part of the header, which ModelStatus.Load only asserts on or takes as is
+    if data[:3] != b"PMX":
+        raise FormatError("Header", 0, "not PMX")
+    if len(data) < HEADER_SIZE:
+        raise FormatError("Header", len(data))
+    if data[3:4] != b" ":
+        raise FormatError("Header", 3, "invalid")
+
+    version = CompiledStruct("<f").unpack_from(data, 4)[0]
+    if version not in (2.0, 2.1):
+        raise FormatError("Header", 4, "invalid (PMX Version Error)")
+    if data[8] != 8:
+        raise FormatError("Header", 8, "invalid (parameter size %d)" % data[8])
+    if data[9] not in (0, 1):
+        raise FormatError("Header", 9, "invalid (encoding %d)" % data[9])
+    if data[10] > 4:
+        raise FormatError("Header", 10, "invalid (additional UV count %d)" % data[10])
+    for offset in range(11, HEADER_SIZE):
+        if data[offset] not in (1, 2, 4):
+            raise FormatError("Header", offset, "invalid (index size %d)" % data[offset])
+
+
+def LoadStrict(model, f, bulk=False):
+    # Model.Load(f, strict=True).
+    # The file is scanned once before anything is decoded, so a truncated file or
+    # a count larger than the rest of the file raises FormatError up front.
+    # Each section is then decoded within its own bytes and must end where the scan did.
+    # Offsets of the errors are from the position of f. PMD files are rejected.
+    data = f.read()
+    CheckHeader(data)
+
+    contents = ScanSections(BufferReader(data))
+    mode = contents.Status
+    model.Status = mode
+
+    reader = BufferReader(data, contents.NameOffset)
+    model.Name = ReadString(reader, mode)
+    model.Name_E = ReadString(reader, mode)
+    model.Comment = ReadString(reader, mode).replace("\r", "")
+    model.Comment_E = ReadString(reader, mode).replace("\r", "")
+
+    view = memoryview(data)
+    for section in contents:
+        reader = SectionReader(view[:section.End], section)
+        try:
+            records = LoadRecords(reader, section.Name, section.Count, mode, bulk)
+        except FormatError:
+            raise
+        except (StructError, ValueError) as error:
+            raise FormatError(section.Name, reader.Offset, "invalid (%s)" % error) from None
+
+        if reader.Offset != section.End:
+            raise FormatError(section.Name, reader.Offset, "inconsistent (scanned end %d)" % section.End)
+        setattr(model, section.Name, records)
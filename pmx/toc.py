@@ -0,0 +1,281 @@
+#
+# toc.py
+#
+# These codes are licensed under CC0.
+# http://creativecommons.org/publicdomain/zero/1.0/deed.ja
+#
+
+from struct import calcsize
+
+from .bulk import ReadFaces
+from .bulk import ScanVertices
+from .bulk import VertexSizes
+from .codec import BufferReader
+from .codec import GetCodec
+from .pmx import ModelStatus
+from .pmx import PMBone
+from .pmx import PMDisplayFrame
+from .pmx import PMJoint
+from .pmx import PMMaterial
+from .pmx import PMMorph
+from .pmx import PMRigid
+from .pmx import PMSoftBody
+from .pmx import PMTexture
+from .pmx import PMVertex
+from .pmx import VertexBuffer
+
+# Section order of a PMX file, named after the Model attributes
+SECTIONS = ("Vertices", "Faces", "Textures", "Materials", "Bones", "Morphs",
+            "DisplayFrames", "Rigids", "Joints", "SoftBodies")
+
+RECORDS = {
+    "Vertices": PMVertex,
+    "Textures": PMTexture,
+    "Materials": PMMaterial,
+    "Bones": PMBone,
+    "Morphs": PMMorph,
+    "DisplayFrames": PMDisplayFrame,
+    "Rigids": PMRigid,
+    "Joints": PMJoint,
+    "SoftBodies": PMSoftBody,
+}
+
+
+class FormatError(ValueError):
+    # A PMX file that can not be decoded, with the section and the byte offset
+
+    def __init__(self, section, offset, reason="truncated"):
+        super().__init__("%s section is %s at %d" % (section, reason, offset))
+        self.Section = section
+        self.Offset = offset
+
+
+class PMSection(object):
+
+    def __init__(self, name, offset=0, count=0, end=0):
+        self.Name = name
+        self.Offset = offset  # first record, just after the count field
+        self.Count = count
+        self.End = end
+
+    @property
+    def Size(self):
+        return self.End - self.Offset
+
+
+class TableOfContents(object):
+    # Byte offsets and record counts of every section of one PMX file.
+    # Offsets are positions for f.seek() on the scanned file.
+
+    def __init__(self):
+        self.Status = ModelStatus()
+        self.NameOffset = 0  # Name, Name_E, Comment, Comment_E
+        self.Sections = {}
+
+    def __contains__(self, name):
+        return name in self.Sections
+
+    def __getitem__(self, name):
+        return self.Sections[name]
+
+    def __iter__(self):
+        return (self.Sections[name] for name in SECTIONS if name in self.Sections)
+
+    def Seek(self, f, name):
+        # Move f to the first record of a section and return its count
+        section = self.Sections[name]
+        f.seek(section.Offset)
+        return section.Count
+
+    def LoadSection(self, f, name, bulk=False):
+        # Decode the records of a single section
+        count = self.Seek(f, name)
+        return LoadRecords(f, name, count, self.Status, bulk)
+
+
+def LoadRecords(f, name, count, mode, bulk=False):
+    # bulk | Vertices as a VertexBuffer and Faces as a numpy array, see Model.Load
+    if name == "Faces":
+        faces = ReadFaces(f, count, mode)
+        return faces if bulk else faces.tolist()
+
+    if name == "Vertices" and bulk:
+        vertices = VertexBuffer()
+        vertices.Load(f, mode, count)
+        return vertices
+
+    records = [None] * count
+    for i in range(count):
+        records[i] = RECORDS[name]()
+        records[i].Load(f, mode)
+    return records
+
+
+def SkipStrings(data, pos, count):
+    # Step over count length prefixed strings
+    for _ in range(count):
+        length = int.from_bytes(data[pos:pos + 4], "little", signed=True)
+        pos += 4 + max(length, 0)
+    return pos
+
+
+def ScanTextures(data, pos, count, codec):
+    return SkipStrings(data, pos, count)
+
+
+def ScanMaterials(data, pos, count, codec):
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2) + codec.Material.Size
+        # UseSystemToon is the last byte of the fixed part
+        pos += codec.ToonByte.Size if data[pos - 1] == 0 else codec.ToonTexture.Size
+        pos = SkipStrings(data, pos, 1) + codec.Int.Size
+    return pos
+
+
+def ScanBones(data, pos, count, codec):
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2) + codec.Bone.Size
+        flag = int.from_bytes(data[pos - 2:pos], "little")
+        pos += codec.BoneTail(flag).Size
+        if flag & 0x0020 != 0:  # IK
+            pos += codec.IK.Size
+            links = int.from_bytes(data[pos - 4:pos], "little", signed=True)
+            for _ in range(links):
+                pos += codec.IKLink.Size
+                if data[pos - 1] == 1:
+                    pos += codec.IKLimit.Size
+    return pos
+
+
+def ScanMorphs(data, pos, count, codec):
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2)
+        morph_type = data[pos + 1]
+        offsets = int.from_bytes(data[pos + 2:pos + 6], "little", signed=True)
+        pos += codec.Morph.Size
+        layout = codec.MorphOffsets.get(morph_type)
+        if layout is not None:
+            pos += layout.Size * max(offsets, 0)
+    return pos
+
+
+def ScanDisplayFrames(data, pos, count, codec):
+    bone_size = codec.DisplayBone.Size
+    morph_size = codec.DisplayMorph.Size
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2) + codec.DisplayFrame.Size
+        members = int.from_bytes(data[pos - 4:pos], "little", signed=True)
+        for _ in range(members):
+            pos += 1 + (bone_size if data[pos] == 0 else morph_size)
+    return pos
+
+
+def ScanRigids(data, pos, count, codec):
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2) + codec.Rigid.Size
+    return pos
+
+
+def ScanJoints(data, pos, count, codec):
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2) + codec.Joint.Size
+    return pos
+
+
+def ScanSoftBodies(data, pos, count, codec):
+    for _ in range(count):
+        pos = SkipStrings(data, pos, 2) + codec.SoftBody.Size
+        anchors = int.from_bytes(data[pos:pos + 4], "little", signed=True)
+        pos += 4 + codec.SoftBodyAnchor.Size * max(anchors, 0)
+        pins = int.from_bytes(data[pos:pos + 4], "little", signed=True)
+        pos += 4 + codec.SoftBodyPin.Size * max(pins, 0)
+    return pos
+
+
+def MinimumSizes(mode, codec):
+    # Smallest possible record of every section, in bytes.
+    # Strings are counted as empty and variable parts as absent.
+    return {
+        "Vertices": min(VertexSizes(mode)),
+        "Faces": calcsize(mode.VertexIndexSize),
+        "Textures": 4,
+        "Materials": 8 + codec.Material.Size + min(codec.ToonByte.Size, codec.ToonTexture.Size) + 4 + codec.Int.Size,
+        "Bones": 8 + codec.Bone.Size,
+        "Morphs": 8 + codec.Morph.Size,
+        "DisplayFrames": 8 + codec.DisplayFrame.Size,
+        "Rigids": 8 + codec.Rigid.Size,
+        "Joints": 8 + codec.Joint.Size,
+        "SoftBodies": 8 + codec.SoftBody.Size + 8,
+    }
+
+
+SCANNERS = {
+    "Textures": ScanTextures,
+    "Materials": ScanMaterials,
+    "Bones": ScanBones,
+    "Morphs": ScanMorphs,
+    "DisplayFrames": ScanDisplayFrames,
+    "Rigids": ScanRigids,
+    "Joints": ScanJoints,
+    "SoftBodies": ScanSoftBodies,
+}
+
+
+def ScanSections(f):
+    # Skim a PMX file once and return its TableOfContents.
+    # Only counts, string lengths and the flags that change a record size are read.
+    # f may be a file object or a BufferReader (e.g. over an mmap).
+    # A truncated file raises FormatError. So does a count that the rest of
+    # the file can not hold, before any record of it is scanned.
+    base = 0
+    if not isinstance(f, BufferReader):
+        base = f.tell()
+        f = BufferReader(f.read())
+
+    toc = TableOfContents()
+    toc.Status.Load(f)
+    if toc.Status.Magic != 1 or toc.Status.HasError:
+        return toc
+
+    mode = toc.Status
+    codec = GetCodec(mode)
+    data = f.Data
+    pos = f.Offset
+
+    toc.NameOffset = base + pos
+    pos = SkipStrings(data, pos, 4)
+    if pos > len(data):
+        raise FormatError("Header", base + len(data))
+    minimum = MinimumSizes(mode, codec)
+
+    for name in SECTIONS:
+        if name == "SoftBodies" and pos + 4 > len(data):
+            # PMX 2.0 ends after the joints
+            toc.Sections[name] = PMSection(name, base + pos, 0, base + pos)
+            break
+
+        if pos + 4 > len(data):
+            raise FormatError(name, base + pos)
+        count = int.from_bytes(data[pos:pos + 4], "little", signed=True)
+        if count < 0:
+            raise FormatError(name, base + pos, "invalid (count %d)" % count)
+        if pos + 4 + count * minimum[name] > len(data):
+            raise FormatError(name, base + pos, "truncated (count %d)" % count)
+        pos += 4
+
+        start = pos
+        try:
+            if name == "Vertices":
+                _, pos = ScanVertices(data, pos, count, mode)
+            elif name == "Faces":
+                pos += calcsize(mode.VertexIndexSize) * count
+            else:
+                pos = SCANNERS[name](data, pos, count, codec)
+        except (IndexError, ValueError):
+            raise FormatError(name, base + len(data)) from None
+
+        if pos > len(data):
+            raise FormatError(name, base + len(data))
+        toc.Sections[name] = PMSection(name, base + start, count, base + pos)
+
+    return toc
@@ -1,8 +1,67 @@
 import unittest
 from pathlib import Path
+import io
+import json
 import lzma
+import multiprocessing
+import os
+import struct
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor
 
+import mathutils
+import numpy as np
+
+from pmx import parallel
+from pmx import pmd
+from pmx import pmd2pmx
 from pmx import pmx
+from pmx.cache import ModelCache
+from pmx.container import LoadModel
+from pmx.container import OpenModelFile
+from pmx.container import SaveModel
+from pmx.convert import main as convert_main
+from pmx.diff import DiffFiles
+from pmx.formats import LoadAnyModel
+from pmx.formats import LoadAnyModelFile
+from pmx.lazy import LazyModel
+from pmx.probe import ProbeHeader
+from pmx.splice import SpliceSections
+from pmx.strict import SectionReader
+from pmx.stream import IterRecords
+from pmx.stream import StreamWriter
+from pmx.toc import FormatError
+from pmx.toc import ScanSections
+
+
+def make_pmd(vertices, polys, skins=()):
+    # A PMD file with only vertices, polys and skins [(name, type, [(index, (x, y, z))])]
+    data = b"Pmd" + struct.pack("<f", 1.0) + bytes(20 + 256)
+    data += struct.pack("<I", len(vertices))
+    for position, normal, uv, bones, weight, flag in vertices:
+        data += struct.pack("<8f2H2B", *position, *normal, *uv, *bones, weight, flag)
+    data += struct.pack("<I", len(polys)) + struct.pack("<%dH" % len(polys), *polys)
+    data += struct.pack("<IHH", 0, 0, 0)  # Material, Bone, IK
+    data += struct.pack("<H", len(skins))
+    for name, skin_type, verts in skins:
+        data += name.encode("shift_jis").ljust(20, b"\0") + struct.pack("<IB", len(verts), skin_type)
+        for index, move in verts:
+            data += struct.pack("<I3f", index, *move)
+    data += struct.pack("<BB", 0, 0)  # SkinIndex, DispName
+    data += struct.pack("<IB", 0, 0)  # BoneIndex, English
+    data += bytes(100 * 10)  # Toon
+    data += struct.pack("<II", 0, 0)  # Rigid, Joint
+    return data
+
+
+def load_or_crash(path, bulk=False):
+    # LoadAnyModelFile in a worker that dies on files named crash*
+    if os.path.basename(path).startswith('crash'):
+        os._exit(1)
+    return LoadAnyModelFile(path, bulk)
 
 
 class TestPmx(unittest.TestCase):
@@ -84,3 +143,1032 @@ class TestPmx(unittest.TestCase):
         self.assertEqual(model.Faces[-3], 4412)
         self.assertEqual(model.Faces[-2], 66043)
         self.assertEqual(model.Faces[-1], 66040)
+
+    def test_load_model_bulk(self):
+        test_pmx = Path(__file__).parent / 'data' / 'test_02_vertex_66409.pmx.xz'
+
+        model = pmx.Model()
+        with lzma.open(test_pmx, mode="rb") as f:
+            model.Load(f, bulk=True)
+
+        self.assertIsInstance(model.Vertices, pmx.VertexBuffer)
+        self.assertEqual(len(model.Vertices), 66049)
+        self.assertEqual(len(model.Faces), 131072*3)
+        self.assertEqual(model.Faces[-1], 66040)
+
+        vert_last = model.Vertices[-1]
+        self.assertEqual(vert_last.Type, 0)
+        self.assertEqual(vert_last.Bones, [0])
+        self.assertEqual(vert_last.Weights, [])
+        self.assertAlmostEqual(vert_last.EdgeSize, 1.0)
+
+    def test_load_model_bulk_mixed_weight(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        bulk_model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            bulk_model.Load(f, bulk=True)
+
+        self.assertEqual(len(bulk_model.Vertices), len(model.Vertices))
+        self.assertEqual(set(bulk_model.Vertices.Type.tolist()), {0, 1, 2})
+        self.assertEqual(bulk_model.Faces.tolist(), model.Faces)
+        self.assertEqual(len(bulk_model.Bones), len(model.Bones))
+
+        for vert, bulk_vert in zip(model.Vertices, bulk_model.Vertices):
+            self.assertEqual(bulk_vert.Position, vert.Position)
+            self.assertEqual(bulk_vert.Normal, vert.Normal)
+            self.assertEqual(bulk_vert.UV, vert.UV)
+            self.assertEqual(bulk_vert.Type, vert.Type)
+            self.assertEqual(bulk_vert.Bones, vert.Bones)
+            self.assertEqual(bulk_vert.Weights, vert.Weights)
+            self.assertEqual(bulk_vert.EdgeSize, vert.EdgeSize)
+
+        bdef2 = bulk_model.Vertices.Type == 1
+        np.testing.assert_allclose(bulk_model.Vertices.Weights[bdef2].sum(axis=1), 1.0, rtol=1e-6)
+
+    def test_faces_bulk(self):
+        test_pmx = Path(__file__).parent / 'data' / 'test_02_vertex_64009.pmx.xz'
+
+        model = pmx.Model()
+        with lzma.open(test_pmx, mode="rb") as f:
+            model.Load(f, bulk=True)
+
+        self.assertIsInstance(model.Faces, np.ndarray)
+        self.assertEqual(model.Faces.dtype, np.dtype("<u2"))
+        self.assertEqual(len(model.Faces), 127008*3)
+        self.assertEqual(model.Faces[0], 28288)
+        self.assertEqual(model.Faces[-1], 64000)
+
+        model.Faces[0] = 1
+        self.assertEqual(model.Faces[0], 1)
+
+    def test_save_faces(self):
+        model = pmx.Model()
+        model.Status.Magic = 1
+        model.Status.Version = 2.0
+        model.Vertices = [pmx.PMVertex() for i in range(300)]
+        for vert in model.Vertices:
+            vert.Bones = [0]
+        model.Faces = [0, 1, 299, 299, 1, 0]
+
+        saved = io.BytesIO()
+        model.Save(saved)
+        self.assertEqual(model.Status.VertexIndexSize, "H")
+
+        list_model = pmx.Model()
+        saved.seek(0)
+        list_model.Load(saved)
+        self.assertEqual(list_model.Faces, [0, 1, 299, 299, 1, 0])
+
+        bulk_model = pmx.Model()
+        saved.seek(0)
+        bulk_model.Load(saved, bulk=True)
+        self.assertEqual(bulk_model.Faces.tolist(), [0, 1, 299, 299, 1, 0])
+
+        resaved = io.BytesIO()
+        bulk_model.Save(resaved)
+        self.assertEqual(resaved.getvalue(), saved.getvalue())
+
+    def test_save_load_records(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        saved = io.BytesIO()
+        model.Save(saved)
+
+        loaded = pmx.Model()
+        saved.seek(0)
+        loaded.Load(saved)
+
+        self.assertEqual([b.Name for b in loaded.Bones], [b.Name for b in model.Bones])
+        self.assertEqual([b.Parent for b in loaded.Bones], [b.Parent for b in model.Bones])
+        self.assertEqual([m.Name for m in loaded.Morphs], [m.Name for m in model.Morphs])
+        self.assertEqual([d.Members for d in loaded.DisplayFrames], [d.Members for d in model.DisplayFrames])
+        self.assertEqual([r.Position for r in loaded.Rigids], [r.Position for r in model.Rigids])
+        self.assertEqual([j.Rotate for j in loaded.Joints], [j.Rotate for j in model.Joints])
+
+        resaved = io.BytesIO()
+        loaded.Save(resaved)
+        self.assertEqual(resaved.getvalue(), saved.getvalue())
+
+    def test_scan_sections(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        with test_pmx.open(mode="rb") as f:
+            toc = ScanSections(f)
+
+            self.assertEqual(toc['Vertices'].Count, len(model.Vertices))
+            self.assertEqual(toc['Faces'].Count, len(model.Faces))
+            self.assertEqual(toc['Textures'].Count, len(model.Textures))
+            self.assertEqual(toc['Materials'].Count, len(model.Materials))
+            self.assertEqual(toc['Bones'].Count, len(model.Bones))
+            self.assertEqual(toc['Morphs'].Count, len(model.Morphs))
+            self.assertEqual(toc['DisplayFrames'].Count, len(model.DisplayFrames))
+            self.assertEqual(toc['Rigids'].Count, len(model.Rigids))
+            self.assertEqual(toc['Joints'].Count, len(model.Joints))
+            self.assertEqual(toc['SoftBodies'].Count, len(model.SoftBodies))
+            self.assertEqual(toc['Joints'].End, test_pmx.stat().st_size)
+
+            bones = toc.LoadSection(f, 'Bones')
+            self.assertEqual([b.Name for b in bones], [b.Name for b in model.Bones])
+            self.assertEqual(f.tell(), toc['Bones'].End)
+
+            morphs = toc.LoadSection(f, 'Morphs')
+            self.assertEqual([m.Name for m in morphs], [m.Name for m in model.Morphs])
+
+            faces = toc.LoadSection(f, 'Faces')
+            self.assertEqual(faces, model.Faces)
+
+    def test_lazy_model(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        with LazyModel() as lazy_model:
+            with test_pmx.open(mode="rb") as f:
+                lazy_model.Load(f)
+
+            self.assertIsNotNone(lazy_model.Map)
+            self.assertEqual(lazy_model.Name, model.Name)
+            self.assertEqual(lazy_model.Comment, model.Comment)
+            self.assertFalse(lazy_model.IsLoaded('Bones'))
+
+            self.assertEqual([b.Name for b in lazy_model.Bones], [b.Name for b in model.Bones])
+            self.assertEqual([m.Name for m in lazy_model.Materials], [m.Name for m in model.Materials])
+            self.assertTrue(lazy_model.IsLoaded('Bones'))
+            self.assertFalse(lazy_model.IsLoaded('Vertices'))
+            self.assertFalse(lazy_model.IsLoaded('Faces'))
+
+            saved = io.BytesIO()
+            lazy_model.Save(saved)
+
+        expected = io.BytesIO()
+        model.Save(expected)
+        self.assertEqual(saved.getvalue(), expected.getvalue())
+
+    def test_lazy_model_save_same_file(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'model.pmx'
+            path.write_bytes(test_pmx.read_bytes())
+
+            with LazyModel() as lazy_model:
+                with path.open(mode="rb") as f:
+                    lazy_model.Load(f)
+                lazy_model.Bones[0].Name = 'renamed'
+                SaveModel(lazy_model, str(path))
+
+                # The mapping still sees the old file
+                self.assertFalse(lazy_model.IsLoaded('Vertices'))
+                self.assertEqual(len(lazy_model.Vertices), len(LoadModel(str(test_pmx)).Vertices))
+
+            saved = LoadModel(str(path))
+            self.assertEqual(saved.Bones[0].Name, 'renamed')
+            self.assertEqual(len(saved.Vertices), len(lazy_model.Vertices))
+            self.assertEqual(list(Path(directory).iterdir()), [path])
+
+            # Writing the mapped file in place copies the sections out of the mapping first
+            with LazyModel() as lazy_model:
+                with path.open(mode="rb") as f:
+                    lazy_model.Load(f)
+                with path.open(mode="r+b") as f:
+                    lazy_model.Save(f)
+                self.assertIsNone(lazy_model.Map)
+                self.assertEqual(len(lazy_model.Vertices), len(saved.Vertices))
+            self.assertEqual(LoadModel(str(path)).Bones[0].Name, 'renamed')
+
+            # A truncated mapping can not be read any more
+            with LazyModel() as lazy_model:
+                with path.open(mode="rb") as f:
+                    lazy_model.Load(f)
+                with path.open(mode="wb") as f:
+                    with self.assertRaises(ValueError):
+                        lazy_model.Save(f)
+
+    def test_lazy_model_save_encode(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+        model = LoadModel(str(test_pmx))
+
+        with LazyModel() as lazy_model:
+            with test_pmx.open(mode="rb") as f:
+                lazy_model.Load(f)
+            lazy_model.Status.Encode = 1 - lazy_model.Status.Encode
+            saved = io.BytesIO()
+            lazy_model.Save(saved)
+
+        saved.seek(0)
+        saved_model = pmx.Model()
+        saved_model.Load(saved)
+        self.assertEqual(saved_model.Status.Encode, 1 - model.Status.Encode)
+        self.assertEqual([b.Name for b in saved_model.Bones], [b.Name for b in model.Bones])
+        self.assertEqual([m.Name for m in saved_model.Morphs], [m.Name for m in model.Morphs])
+
+    def test_lazy_model_stream(self):
+        test_pmx = Path(__file__).parent / 'data' / 'test_02_vertex_64009.pmx.xz'
+
+        lazy_model = LazyModel()
+        with lzma.open(test_pmx, mode="rb") as f:
+            lazy_model.Load(f, bulk=True)
+
+        self.assertIsNone(lazy_model.Map)
+        self.assertIsInstance(lazy_model.Vertices, pmx.VertexBuffer)
+        self.assertEqual(len(lazy_model.Faces), 127008*3)
+        self.assertEqual(lazy_model.Faces[-1], 64000)
+        lazy_model.Close()
+
+    def test_probe_header(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        with test_pmx.open(mode="rb") as f:
+            header = ProbeHeader(f)
+            self.assertLess(f.tell(), 4096)
+
+        self.assertEqual(header.Status.Magic, 1)
+        self.assertEqual(header.Status.Version, model.Status.Version)
+        self.assertEqual(header.Status.Encode, model.Status.Encode)
+        self.assertEqual(header.Status.BoneIndexSize, model.Status.BoneIndexSize)
+        self.assertEqual(header.Name, model.Name)
+        self.assertEqual(header.Name_E, model.Name_E)
+        self.assertEqual(header.Comment, model.Comment)
+        self.assertEqual(header.Counts, {'Vertices': len(model.Vertices)})
+
+        self.assertIsNone(ProbeHeader(io.BytesIO(b"not a model")))
+        self.assertIsNone(ProbeHeader(io.BytesIO(b"")))
+        self.assertIsNone(ProbeHeader(io.BytesIO(b"PM")))
+        self.assertIsNone(ProbeHeader(io.BytesIO(b"Pmd")))
+
+    def test_probe_header_pmd(self):
+        data = b"Pmd" + struct.pack("<f", 1.0)
+        data += "テスト".encode("shift_jis").ljust(20, b"\0") + bytes(256)
+        data += struct.pack("<L", 2) + bytes(38 * 2)  # Vertex
+        data += struct.pack("<L", 3) + bytes(2 * 3)  # Poly
+        data += struct.pack("<L", 0)  # Material
+        data += struct.pack("<H", 1) + bytes(39)  # Bone
+        data += struct.pack("<HHHBHf", 1, 0, 0, 2, 0, 0.0) + bytes(2 * 2)  # IK
+        data += struct.pack("<H", 1) + bytes(20) + struct.pack("<LB", 1, 0) + bytes(16)  # Skin
+        data += struct.pack("<B", 0)  # SkinIndex
+        data += struct.pack("<B", 1) + bytes(50)  # DispName
+        data += struct.pack("<L", 0)  # BoneIndex
+        data += struct.pack("<B", 1) + b"test".ljust(20, b"\0") + bytes(256) + bytes(20) + bytes(50)
+        data += bytes(100 * 10)  # Toon
+        data += struct.pack("<L", 0)  # Rigid
+        data += struct.pack("<L", 4) + bytes(124 * 4)  # Joint
+
+        header = ProbeHeader(io.BytesIO(data))
+        self.assertEqual(header.Status.Magic, 0)
+        self.assertEqual(header.Name, "テスト")
+        self.assertEqual(header.Name_E, "test")
+        self.assertEqual(header.Counts, {
+            'Vertices': 2, 'Polys': 3, 'Materials': 0, 'Bones': 1, 'IKs': 1, 'Skins': 1,
+            'SkinIndexs': 0, 'DispNames': 1, 'BoneIndexs': 0, 'Rigids': 0, 'Joints': 4,
+        })
+
+        # Only the sections whose records are all in a truncated file are counted
+        header = ProbeHeader(io.BytesIO(data[:-1]))
+        self.assertNotIn('Joints', header.Counts)
+        self.assertEqual(header.Counts['Rigids'], 0)
+
+        header = ProbeHeader(io.BytesIO(data[:283 + 4 + 38 * 2 + 4 + 3]))
+        self.assertEqual(header.Counts, {'Vertices': 2})
+
+        header = ProbeHeader(io.BytesIO(data[:283 + 4 + 38]))
+        self.assertEqual(header.Name, "テスト")
+        self.assertEqual(header.Counts, {})
+
+    def test_pmd_bulk(self):
+        vertices = [((i, 2.0, -i), (0.0, 1.0, 0.0), (0.25, i / 4.0), (i, 1), 100 - i, i % 2) for i in range(4)]
+        data = make_pmd(vertices, [0, 1, 2, 2, 3, 0])
+
+        model = pmd.Model()
+        model.Load(io.BytesIO(data))
+        bulk_model = pmd.Model()
+        bulk_model.Load(io.BytesIO(data), bulk=True)
+
+        self.assertIsInstance(bulk_model.Vertices, pmd.PMDVertexBuffer)
+        self.assertEqual(len(bulk_model.Vertices), 4)
+        np.testing.assert_array_equal(bulk_model.Vertices.Pos[3], (3, 2, -3))
+        np.testing.assert_array_equal(bulk_model.Vertices.Bone[:, 0], [0, 1, 2, 3])
+        np.testing.assert_array_equal(bulk_model.Vertices.Weight, [100, 99, 98, 97])
+        np.testing.assert_array_equal(bulk_model.Polys, [0, 1, 2, 2, 3, 0])
+        self.assertEqual([poly.Index for poly in model.Polys], bulk_model.Polys.tolist())
+
+        vertex = bulk_model.Vertices[2]
+        self.assertEqual(vertex.Pos, model.Vertices[2].Pos)
+        self.assertEqual(vertex.Uv, model.Vertices[2].Uv)
+        self.assertEqual((vertex.Bone, vertex.Weight, vertex.Flag),
+                         (model.Vertices[2].Bone, model.Vertices[2].Weight, model.Vertices[2].Flag))
+
+        saved = io.BytesIO()
+        model.Save(saved)
+        bulk_saved = io.BytesIO()
+        bulk_model.Save(bulk_saved)
+        self.assertEqual(bulk_saved.getvalue(), saved.getvalue())
+
+    def test_pmd_save_blocks(self):
+        model = pmd.Model()
+        model.Header = pmd.PMDHeader()
+        model.Header.Magic = b"Pmd"
+        model.Header.Name = "テスト"
+        for i in range(3):
+            bone = pmd.PMDBone()
+            bone.Name = "ボーン%d" % i
+            bone.Name_E = "bone%d" % i
+            bone.Parent = i - 1
+            bone.Pos = mathutils.Vector((i, 0.5, 0))
+            model.Bones.append(bone)
+        for i in range(2):
+            skin = pmd.PMDSkin()
+            skin.Name = "表情%d" % i
+            skin.Type = i
+            for j in range(i + 2):
+                vert = pmd.PMDSkinVert()
+                vert.Index = j
+                vert.Pos = mathutils.Vector((j, 1, 2))
+                skin.Verts.append(vert)
+            model.Skins.append(skin)
+        material = pmd.PMDMaterial()
+        material.Deffuse = mathutils.Vector((0.1, 0.2, 0.3, 1.0))
+        material.Texture = "tex.png"
+        material.Sphere = "env.sph"
+        model.Materials.append(material)
+        rigid = pmd.PMDRigid()
+        rigid.Name = "剛体"
+        rigid.Size = (1, 2, 3)
+        model.Rigids.append(rigid)
+        model.ToonName = ["toon%02d.bmp" % i for i in range(1, 11)]
+
+        saved = io.BytesIO()
+        model.Save(saved)
+
+        # Each block matches the record by record writers
+        expected = io.BytesIO()
+        for bone in model.Bones:
+            bone.Save(expected)
+        self.assertIn(expected.getvalue(), saved.getvalue())
+        expected = io.BytesIO()
+        for skin in model.Skins:
+            skin.Save(expected)
+        self.assertIn(expected.getvalue(), saved.getvalue())
+
+        loaded = pmd.Model()
+        saved.seek(0)
+        loaded.Load(saved)
+        self.assertEqual([bone.Name for bone in loaded.Bones], ["ボーン0", "ボーン1", "ボーン2"])
+        self.assertEqual([bone.Name_E for bone in loaded.Bones], ["bone0", "bone1", "bone2"])
+        self.assertEqual(loaded.Bones[0].Parent, -1)
+        self.assertEqual(loaded.Bones[2].Pos, mathutils.Vector((2, 0.5, 0)))
+        self.assertEqual([len(skin.Verts) for skin in loaded.Skins], [2, 3])
+        self.assertEqual((loaded.Materials[0].Texture, loaded.Materials[0].Sphere), ("tex.png", "env.sph"))
+        self.assertEqual(loaded.Rigids[0].Name, "剛体")
+        self.assertEqual(loaded.ToonName, model.ToonName)
+
+        resaved = io.BytesIO()
+        loaded.Save(resaved)
+        self.assertEqual(resaved.getvalue(), saved.getvalue())
+
+    def test_pmd2pmx_convert_vertices(self):
+        vertices = [
+            ((0, 0, 0), (0, 1, 0), (0, 0), (2, 2), 50, 0),  # same bone
+            ((1, 0, 0), (0, 1, 0), (0, 0), (2, 3), 100, 1),  # first bone only
+            ((2, 0, 0), (0, 1, 0), (0, 0), (2, 3), 0, 0),  # second bone only
+            ((3, 0, 0), (0, 1, 0), (0, 0), (2, 3), 25, 1),
+        ]
+        data = make_pmd(vertices, [0, 1, 2, 1, 2, 3])
+
+        for bulk in (False, True):
+            model = pmd.Model()
+            model.Load(io.BytesIO(data), bulk=bulk)
+            converted = pmd2pmx.Convert(model)
+
+            result = converted.Vertices
+            self.assertIsInstance(result, pmx.VertexBuffer)
+            np.testing.assert_array_equal(result.Position[:, 0], [0, 1, 2, 3])
+            np.testing.assert_array_equal(result.Type, [0, 0, 0, 1])
+            np.testing.assert_array_equal(result.Bones[:, :2], [[2, 0], [2, 0], [3, 0], [2, 3]])
+            np.testing.assert_allclose(result.Weights[:, :2], [[1, 0], [1, 0], [1, 0], [0.25, 0.75]])
+            np.testing.assert_array_equal(result.EdgeSize, [0, 1, 0, 1])
+            self.assertEqual(list(converted.Faces), [0, 1, 2, 1, 2, 3])
+
+    def test_load_any_model(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+        with test_pmx.open(mode="rb") as f:
+            model = LoadAnyModel(f, bulk=True)
+        self.assertIsInstance(model.Vertices, pmx.VertexBuffer)
+        self.assertEqual(len(model.Vertices), len(LoadModel(str(test_pmx)).Vertices))
+
+        vertices = [((i, 0, 0), (0, 1, 0), (0, 0), (0, 0), 100, 0) for i in range(3)]
+        model = LoadAnyModel(io.BytesIO(make_pmd(vertices, [0, 1, 2])), bulk=True)
+        self.assertEqual(model.Status.Magic, 1)
+        np.testing.assert_array_equal(model.Vertices.Position[:, 0], [0, 1, 2])
+
+        # The converted model saves as PMX
+        saved = io.BytesIO()
+        model.Save(saved)
+        saved.seek(0)
+        reloaded = LoadAnyModel(saved, bulk=True)
+        np.testing.assert_array_equal(reloaded.Faces, [0, 1, 2])
+
+        with self.assertRaises(ValueError):
+            LoadAnyModel(io.BytesIO(b"not a model"))
+
+    def test_pmd_morph_offset_arrays(self):
+        # Offsets built by pmd2pmx have no codec, indices past 255 must survive
+        vertices = [((i, 0, 0), (0, 1, 0), (0, 0), (0, 0), 100, 0) for i in range(300)]
+        skins = [
+            ("base", 0, [(255, (255, 0, 0)), (256, (256, 0, 0)), (299, (299, 0, 0))]),
+            ("smile", 1, [(0, (0.5, 0, 0)), (1, (0, 0.5, 0)), (2, (0, 0, 0.5))]),
+        ]
+        model = LoadAnyModel(io.BytesIO(make_pmd(vertices, [0, 1, 2], skins)), bulk=True)
+
+        morph = model.Morphs[0]
+        self.assertEqual(morph.Type, 1)
+        self.assertIsInstance(morph.Offsets[0], pmx.PMVertexMorphOffset)
+        offsets = morph.OffsetArrays()
+        np.testing.assert_array_equal(offsets["Index"], [255, 256, 299])
+        np.testing.assert_allclose(offsets["Move"], [[0.5, 0, 0], [0, 0.5, 0], [0, 0, 0.5]])
+
+        # The same arrays after a save and a lazy decode
+        saved = io.BytesIO()
+        model.Save(saved)
+        saved.seek(0)
+        reloaded = pmx.Model()
+        reloaded.Load(saved)
+        np.testing.assert_array_equal(reloaded.Morphs[0].OffsetArrays()["Index"], [255, 256, 299])
+
+    def test_save_vertex_buffer(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        bulk_model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            bulk_model.Load(f, bulk=True)
+
+        class CountingWriter(io.BytesIO):
+            def write(self, data):
+                self.count = getattr(self, 'count', 0) + 1
+                return super().write(data)
+
+        saved = CountingWriter()
+        model.Save(saved)
+        self.assertLessEqual(saved.count, 4)
+
+        bulk_saved = CountingWriter()
+        bulk_model.Save(bulk_saved)
+        self.assertEqual(bulk_saved.getvalue(), saved.getvalue())
+
+    def test_vertex_buffer_view(self):
+        vertices = pmx.VertexBuffer()
+
+        vert = pmx.PMVertex()
+        vert.Position = mathutils.Vector((1, 2, 3))
+        vert.Type = 1
+        vert.Bones = [3, 4]
+        vert.Weights = [0.25]
+        vertices.append(vert)
+        vertices.Extend([pmx.PMVertex(), pmx.PMVertex()])
+
+        self.assertEqual(len(vertices), 3)
+        self.assertEqual(vertices[0].Position, mathutils.Vector((1, 2, 3)))
+        self.assertEqual(vertices[0].Bones, [3, 4])
+        self.assertEqual(vertices[0].Weights, [0.25])
+        self.assertEqual(vertices.Weights[0].tolist(), [0.25, 0.75, 0.0, 0.0])
+        self.assertEqual(vertices[-1].Type, 0)
+
+        view = vertices[2]
+        view.UV = mathutils.Vector((0.5, 0.5))
+        view.Type = 2
+        view.Bones = [1, 2, 3, 4]
+        view.Weights = [0.1, 0.2, 0.3, 0.4]
+        self.assertEqual(vertices.UV[2].tolist(), [0.5, 0.5])
+        self.assertEqual(vertices.Bones[2].tolist(), [1, 2, 3, 4])
+        self.assertEqual(vertices[2].Type, 2)
+
+        with self.assertRaises(IndexError):
+            vertices[3]
+
+    def test_vertex_buffer_append_uv(self):
+        vertices = pmx.VertexBuffer(4, append_uv_count=2)
+        vertices.AppendUV[0][:] = np.arange(16).reshape(4, 4)
+        vertices.AppendUV[1][:] = -np.arange(16).reshape(4, 4)
+
+        model = pmx.Model()
+        model.Status.Magic = 1
+        model.Status.Version = 2.0
+        model.Status.AppendUVCount = 2
+        model.Vertices = vertices
+
+        saved = io.BytesIO()
+        model.Save(saved)
+
+        bulk_model = pmx.Model()
+        saved.seek(0)
+        bulk_model.Load(saved, bulk=True)
+        self.assertEqual(bulk_model.Vertices.AppendUVCount, 2)
+        np.testing.assert_array_equal(bulk_model.Vertices.AppendUV[1], vertices.AppendUV[1])
+        self.assertEqual(bulk_model.Vertices[3].AppendUV[0], mathutils.Vector((12, 13, 14, 15)))
+
+        # Record by record loading keeps the values too
+        record_model = pmx.Model()
+        saved.seek(0)
+        record_model.Load(saved)
+        self.assertEqual(record_model.Vertices[3].AppendUV,
+                         [mathutils.Vector((12, 13, 14, 15)), mathutils.Vector((-12, -13, -14, -15))])
+
+        resaved = io.BytesIO()
+        record_model.Save(resaved)
+        self.assertEqual(resaved.getvalue(), saved.getvalue())
+
+        # Missing channels are written as zeros
+        record_model.Vertices[3].AppendUV = []
+        resaved = io.BytesIO()
+        record_model.Save(resaved)
+        resaved.seek(0)
+        bulk_model.Load(resaved, bulk=True)
+        np.testing.assert_array_equal(bulk_model.Vertices.AppendUV[0][3], (0, 0, 0, 0))
+
+    def test_morph_offset_types(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        for morph in model.Morphs:
+            for offset in morph.Offsets:
+                self.assertIs(type(offset), pmx.MORPH_OFFSETS[morph.Type])
+                self.assertFalse(hasattr(offset, '__dict__'))
+
+        self.assertFalse(hasattr(model.Vertices[0], '__dict__'))
+        self.assertFalse(hasattr(model.Bones[0], '__dict__'))
+        self.assertFalse(hasattr(pmx.PMMorphOffset(), 'Material'))
+
+    def test_morph_offsets_lazy(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+        self.assertTrue(len(model.Morphs) > 0)
+        self.assertFalse(any(morph.IsDecoded() for morph in model.Morphs))
+
+        raw = io.BytesIO()
+        model.Save(raw)
+        self.assertFalse(any(morph.IsDecoded() for morph in model.Morphs))
+
+        for morph in model.Morphs:
+            arrays = morph.OffsetArrays()
+            self.assertEqual(len(arrays['Index']), len(morph.Offsets))
+            self.assertTrue(morph.IsDecoded())
+            self.assertEqual(arrays['Index'].tolist(), [offset.Index for offset in morph.Offsets])
+            if morph.Type == 1:
+                np.testing.assert_allclose(arrays['Move'], [offset.Move for offset in morph.Offsets])
+
+        decoded = io.BytesIO()
+        model.Save(decoded)
+        self.assertEqual(raw.getvalue(), decoded.getvalue())
+
+    def test_iter_records(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+
+        counts = {}
+        sections = {}
+        faces = []
+        with test_pmx.open(mode="rb") as f:
+            for event, i, data in IterRecords(f):
+                if event == 'header':
+                    self.assertEqual(data.Name, model.Name)
+                    self.assertEqual(data.Comment, model.Comment)
+                elif event == 'section':
+                    sections[data] = i
+                elif event == 'face':
+                    faces.extend(data)
+                else:
+                    self.assertEqual(counts.get(event, 0), i)
+                    counts[event] = i + 1
+                    if event == 'vertex':
+                        self.assertEqual(data.Position, model.Vertices[i].Position)
+                    elif event == 'bone':
+                        self.assertEqual(data.Name, model.Bones[i].Name)
+
+        self.assertEqual(faces, model.Faces)
+        self.assertEqual(sections['Vertices'], len(model.Vertices))
+        self.assertEqual(sections['Faces'], len(model.Faces))
+        self.assertEqual(counts['vertex'], len(model.Vertices))
+        self.assertEqual(counts['material'], len(model.Materials))
+        self.assertEqual(counts['morph'], len(model.Morphs))
+        self.assertEqual(counts.get('joint', 0), len(model.Joints))
+
+    def test_stream_writer(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+        expected = io.BytesIO()
+        model.Save(expected)
+
+        status = pmx.ModelStatus()
+        status.Version = model.Status.Version
+        status.Encode = model.Status.Encode
+        status.AppendUVCount = model.Status.AppendUVCount
+        for name in ('VertexIndexSize', 'TextureIndexSize', 'MaterialIndexSize',
+                     'BoneIndexSize', 'MorphIndexSize', 'RigidIndexSize'):
+            setattr(status, name, None)
+        status.BoneIndexSize = pmx.paramSize(model.Bones, 0)
+
+        f = io.BytesIO()
+        writer = StreamWriter(f, status)
+        writer.WriteHeader(model.Name, model.Name_E, model.Comment, model.Comment_E)
+
+        # Vertices from a generator, the count and the vertex index size are patched
+        writer.BeginSection('Vertices')
+        for vertex in (v for v in model.Vertices):
+            writer.Write(vertex)
+        writer.EndSection()
+        writer.WriteSection('Faces', [model.Faces[i:i + 30] for i in range(0, len(model.Faces), 30)])
+        writer.WriteSection('Textures', model.Textures)
+        writer.WriteSection('Materials', model.Materials)
+        writer.WriteSection('Bones', model.Bones)
+
+        writer.BeginSection('Morphs', len(model.Morphs))
+        for morph in model.Morphs:
+            writer.WriteMorph(morph, iter(morph.Offsets))
+        writer.WriteSection('DisplayFrames', model.DisplayFrames)
+
+        with self.assertRaises(ValueError):
+            writer.BeginSection('Bones')
+
+        writer.WriteSection('Rigids', model.Rigids)
+        writer.WriteSection('Joints', model.Joints)
+        writer.Close()
+
+        self.assertEqual(writer.Counts['Vertices'], len(model.Vertices))
+        self.assertEqual(f.getvalue(), expected.getvalue())
+
+        # Vertices refer to bones which come later
+        status = pmx.ModelStatus()
+        status.BoneIndexSize = None
+        writer = StreamWriter(io.BytesIO(), status)
+        writer.WriteHeader()
+        with self.assertRaises(ValueError):
+            writer.BeginSection('Vertices')
+
+    def test_load_model_parallel(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        bulk_model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            bulk_model.Load(f, bulk=True)
+
+        chunk = parallel.VERTEX_CHUNK
+        parallel.VERTEX_CHUNK = 256
+        try:
+            model = pmx.Model()
+            with test_pmx.open(mode="rb") as f, ProcessPoolExecutor(2) as pool:
+                model.Load(f, parallel=pool)
+        finally:
+            parallel.VERTEX_CHUNK = chunk
+
+        self.assertIsInstance(model.Vertices, pmx.VertexBuffer)
+        for name in pmx.VERTEX_COLUMNS:
+            np.testing.assert_array_equal(getattr(model.Vertices, name), getattr(bulk_model.Vertices, name))
+        np.testing.assert_array_equal(model.Faces, bulk_model.Faces)
+        self.assertEqual(model.Name, bulk_model.Name)
+        self.assertEqual([bone.Name for bone in model.Bones], [bone.Name for bone in bulk_model.Bones])
+        self.assertEqual(len(model.Morphs), len(bulk_model.Morphs))
+        self.assertEqual(len(model.Joints), len(bulk_model.Joints))
+
+    def test_compressed_container(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = LoadModel(str(test_pmx), bulk=True)
+        expected = io.BytesIO()
+        model.Save(expected)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for ext in ('.pmx', '.pmx.xz', '.pmx.gz', '.pmx.bz2'):
+                path = str(Path(directory) / ('model' + ext))
+                SaveModel(model, path)
+
+                loaded = LoadModel(path, bulk=True)
+                np.testing.assert_array_equal(loaded.Vertices.Position, model.Vertices.Position)
+                np.testing.assert_array_equal(loaded.Faces, model.Faces)
+
+                with OpenModelFile(path) as f:
+                    self.assertEqual(f.read(), expected.getvalue())
+
+                with OpenModelFile(path) as f, LazyModel() as lazy_model:
+                    lazy_model.Load(f)
+                    self.assertEqual(lazy_model.Map is not None, ext == '.pmx')
+                    self.assertEqual(len(lazy_model.Bones), len(model.Bones))
+
+            # The streaming writer keeps the bytes of a non seekable file until Close
+            path = str(Path(directory) / 'stream.pmx.gz')
+            with OpenModelFile(path, 'wb') as f:
+                writer = StreamWriter(f, model.Status)
+                writer.WriteHeader(model.Name, model.Name_E, model.Comment, model.Comment_E)
+                writer.WriteSection('Vertices', model.Vertices)
+                writer.WriteSection('Faces', [model.Faces])
+                for name in ('Textures', 'Materials', 'Bones', 'Morphs', 'DisplayFrames', 'Rigids', 'Joints'):
+                    writer.WriteSection(name, getattr(model, name))
+                writer.Close()
+
+            with OpenModelFile(path) as f:
+                self.assertEqual(f.read(), expected.getvalue())
+
+            # More than WRITE_CHUNK of vertices, the reserved count and index size are
+            # patched after compressed bytes would have been flushed
+            large_model = LoadModel(str(test_pmx))
+            large_model.Vertices = [pmx.PMVertex() for i in range(30000)]
+            for index, vertex in enumerate(large_model.Vertices):
+                vertex.Position = mathutils.Vector((index, 0, 0))
+                vertex.Bones = [0]
+                vertex.Weights = [1.0]
+            large_model.Faces = []
+            expected = io.BytesIO()
+            large_model.Save(expected)
+            self.assertGreater(len(expected.getvalue()), 1 << 20)
+
+            for ext in ('.pmx.xz', '.pmx.gz', '.pmx.bz2'):
+                path = str(Path(directory) / ('large' + ext))
+                mode = copy(large_model.Status)
+                mode.VertexIndexSize = None
+                with OpenModelFile(path, 'wb') as f:
+                    writer = StreamWriter(f, mode)
+                    writer.WriteHeader(large_model.Name, large_model.Name_E, large_model.Comment, large_model.Comment_E)
+                    writer.WriteSection('Vertices', iter(large_model.Vertices))
+                    writer.WriteSection('Faces', [large_model.Faces])
+                    for name in ('Textures', 'Materials', 'Bones', 'Morphs', 'DisplayFrames', 'Rigids', 'Joints'):
+                        writer.WriteSection(name, getattr(large_model, name))
+                    writer.Close()
+
+                with OpenModelFile(path) as f:
+                    self.assertEqual(f.read(), expected.getvalue())
+
+    def test_save_raw_sections(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+        self.assertEqual(model.RawSections, {})
+        model.Bones[0].Name = 'renamed'
+        expected = io.BytesIO()
+        model.Save(expected)
+
+        with test_pmx.open(mode="rb") as f, LazyModel() as lazy_model:
+            lazy_model.Load(f)
+            lazy_model.Bones[0].Name = 'renamed'
+            saved = io.BytesIO()
+            lazy_model.Save(saved)
+
+            # Only the bones were decoded and encoded again
+            self.assertEqual(saved.getvalue(), expected.getvalue())
+            self.assertTrue(lazy_model.IsLoaded('Bones'))
+            self.assertFalse(lazy_model.IsLoaded('Vertices'))
+            self.assertFalse(lazy_model.IsLoaded('Morphs'))
+            self.assertIn('Vertices', lazy_model.RawSections)
+
+            # A changed index size needs every section encoded again
+            lazy_model.Textures.extend(pmx.PMTexture() for _ in range(200))
+            model.Textures.extend(pmx.PMTexture() for _ in range(200))
+            expected = io.BytesIO()
+            model.Save(expected)
+            saved = io.BytesIO()
+            lazy_model.Save(saved)
+
+            self.assertEqual(saved.getvalue(), expected.getvalue())
+            self.assertTrue(lazy_model.IsLoaded('Materials'))
+            self.assertNotIn('Materials', lazy_model.RawSections)
+
+    def test_splice_sections(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        model = pmx.Model()
+        with test_pmx.open(mode="rb") as f:
+            model.Load(f)
+        original = io.BytesIO()
+        model.Save(original)
+
+        with tempfile.TemporaryDirectory() as directory:
+            src = str(Path(directory) / 'src.pmx')
+            dst = str(Path(directory) / 'dst.pmx')
+            with open(src, 'wb') as f:
+                f.write(original.getvalue())
+
+            # Unchanged records give the same file
+            SpliceSections(src, dst, {'Rigids': model.Rigids, 'Joints': model.Joints})
+            with open(dst, 'rb') as f:
+                self.assertEqual(f.read(), original.getvalue())
+
+            model.Rigids[0].Mass = 2.5
+            model.Joints = model.Joints[:1]
+            SpliceSections(src, src, {'Rigids': model.Rigids, 'Joints': model.Joints})
+            expected = io.BytesIO()
+            model.Save(expected)
+            with open(src, 'rb') as f:
+                self.assertEqual(f.read(), expected.getvalue())
+
+            # The index size of the file is kept
+            textures = [pmx.PMTexture() for _ in range(200)]
+            with self.assertRaises(ValueError):
+                SpliceSections(src, dst, {'Textures': textures})
+
+    def test_model_cache(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        with tempfile.TemporaryDirectory() as directory:
+            src = str(Path(directory) / 'model.pmx')
+            with test_pmx.open(mode="rb") as f, open(src, 'wb') as out:
+                out.write(f.read())
+
+            model = LoadModel(src, bulk=True)
+            expected = io.BytesIO()
+            model.Save(expected)
+
+            cache = ModelCache(str(Path(directory) / 'cache'))
+            self.assertIsNone(cache.Get(src))
+            cache.Put(src, model)
+
+            cached = cache.Get(src)
+            self.assertIsInstance(cached.Vertices, pmx.VertexBuffer)
+            saved = io.BytesIO()
+            cached.Save(saved)
+            self.assertEqual(saved.getvalue(), expected.getvalue())
+
+            cached = cache.Get(src, mesh=False)
+            self.assertEqual(len(cached.Vertices), 0)
+            self.assertEqual(len(cached.Bones), len(model.Bones))
+
+            # A changed file is a miss
+            with open(src, 'ab') as out:
+                out.write(b'\0')
+            self.assertIsNone(cache.Get(src))
+
+            # The least recently used entry is evicted first
+            cache.Put(src, model)
+            self.assertEqual(len(cache.Entries()), 2)
+            cache.Limit = cache.Entries()[-1][1]
+            cache.Evict()
+            self.assertEqual(len(cache.Entries()), 1)
+            self.assertIsNotNone(cache.Get(src))
+
+    def test_load_model_strict(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+        data = test_pmx.read_bytes()
+        toc = ScanSections(io.BytesIO(data))
+
+        for bulk in (False, True):
+            model = pmx.Model()
+            model.Load(io.BytesIO(data), bulk=bulk, strict=True)
+            saved = io.BytesIO()
+            model.Save(saved)
+            expected = io.BytesIO()
+            LoadModel(str(test_pmx), bulk=bulk).Save(expected)
+            self.assertEqual(saved.getvalue(), expected.getvalue())
+
+        # Truncated inside the bones
+        bones = toc['Bones']
+        with self.assertRaises(FormatError) as context:
+            pmx.Model().Load(io.BytesIO(data[:bones.Offset + 10]), strict=True)
+        self.assertEqual(context.exception.Section, 'Bones')
+
+        # A bogus count is rejected before any record is read
+        broken = bytearray(data)
+        broken[bones.Offset - 4:bones.Offset] = (1 << 30).to_bytes(4, 'little')
+        with self.assertRaises(FormatError) as context:
+            pmx.Model().Load(io.BytesIO(bytes(broken)), strict=True)
+        self.assertEqual((context.exception.Section, context.exception.Offset), ('Bones', bones.Offset - 4))
+
+        with self.assertRaises(FormatError) as context:
+            pmx.Model().Load(io.BytesIO(data[:10]), strict=True)
+        self.assertEqual(context.exception.Section, 'Header')
+
+        # Header fields are checked without asserts, which python -O removes
+        for offset, value in ((3, 0), (8, 9), (9, 2), (10, 5), (13, 3)):
+            broken = bytearray(data)
+            broken[offset] = value
+            with self.assertRaises(FormatError) as context:
+                pmx.Model().Load(io.BytesIO(bytes(broken)), strict=True)
+            self.assertEqual((context.exception.Section, context.exception.Offset), ('Header', offset))
+
+        # Fields read one by one end with their section too
+        reader = SectionReader(data, toc['Bones'])
+        reader.Offset = toc['Bones'].End - 2
+        with self.assertRaises(FormatError) as context:
+            pmx.ReadStruct(reader, 'i')
+        self.assertEqual(context.exception.Offset, toc['Bones'].End - 2)
+
+    def test_convert_tree(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+        vertices = [((i, 0, 0), (0, 1, 0), (0, 0), (0, 0), 100, 0) for i in range(3)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / 'source'
+            output = Path(directory) / 'output'
+            (source / 'pmd').mkdir(parents=True)
+            (source / 'model.pmx').write_bytes(test_pmx.read_bytes())
+            (source / 'pmd' / 'legacy.pmd').write_bytes(make_pmd(vertices, [0, 1, 2]))
+            (source / 'pmd' / 'broken.pmd').write_bytes(b'Pmd')
+            (source / 'notes.txt').write_text('not a model')
+
+            log = io.StringIO()
+            with redirect_stdout(log):
+                status = convert_main([str(source), str(output), '--jobs', '2'])
+            self.assertEqual(status, 1)
+            self.assertIn('[3/3]', log.getvalue())
+
+            report = json.loads((output / 'convert_report.json').read_text(encoding='utf-8'))
+            self.assertEqual(report['failed'], 1)
+            errors = {Path(entry['source']).name: entry['error'] for entry in report['files']}
+            self.assertEqual(errors['legacy.pmd'], None)
+            self.assertIsNotNone(errors['broken.pmd'])
+
+            self.assertEqual(len(LoadModel(str(output / 'model.pmx')).Vertices),
+                             len(LoadModel(str(test_pmx)).Vertices))
+            converted = LoadModel(str(output / 'pmd' / 'legacy.pmx'), bulk=True)
+            np.testing.assert_array_equal(converted.Vertices.Position[:, 0], [0, 1, 2])
+            self.assertFalse((output / 'pmd' / 'broken.pmx').exists())
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'workers must see the patched loader')
+    def test_convert_tree_crash(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / 'source'
+            output = Path(directory) / 'output'
+            source.mkdir()
+            for name in ('a.pmx', 'crash.pmx', 'b.pmx', 'c.pmx'):
+                (source / name).write_bytes(test_pmx.read_bytes())
+
+            log = io.StringIO()
+            with mock.patch('pmx.convert.LoadAnyModelFile', load_or_crash), redirect_stdout(log):
+                status = convert_main([str(source), str(output), '--jobs', '2'])
+            self.assertEqual(status, 1)
+            self.assertIn('[4/4]', log.getvalue())
+
+            # The crash is reported for its file only, the others are converted
+            report = json.loads((output / 'convert_report.json').read_text(encoding='utf-8'))
+            self.assertEqual(report['failed'], 1)
+            errors = {Path(entry['source']).name: entry['error'] for entry in report['files']}
+            self.assertEqual(len(errors), 4)
+            self.assertIn('BrokenProcessPool', errors['crash.pmx'])
+            for name in ('a', 'b', 'c'):
+                self.assertIsNone(errors[name + '.pmx'])
+                self.assertTrue((output / (name + '.pmx')).exists())
+
+    def test_diff_files(self):
+        test_pmx = Path(__file__).parents[1] / 'sample' / 'sample_finish.pmx'
+        model = LoadModel(str(test_pmx), bulk=True)
+
+        with tempfile.TemporaryDirectory() as directory:
+            old = str(Path(directory) / 'old.pmx')
+            new = str(Path(directory) / 'new.pmx')
+            SaveModel(model, old)
+
+            diff = DiffFiles(old, old)
+            self.assertTrue(diff.IsEmpty())
+            self.assertEqual(diff.Report(), [])
+
+            model.Vertices.Position[3] += (0.0, 0.5, 0.0)
+            model.Vertices.Position[4] += (0.0, 1e-7, 0.0)
+            model.Materials[0].Power = 2.0
+            removed = model.Joints.pop().Name
+            bone = pmx.PMBone()
+            bone.Name = 'added'
+            model.Bones.append(bone)
+            SaveModel(model, new)
+
+            diff = DiffFiles(old, new, tolerance=1e-5)
+            self.assertEqual(diff.MovedVertices.tolist(), [3])
+            self.assertEqual(len(diff.ChangedVertices), 0)
+            self.assertEqual(len(diff.ChangedFaces), 0)
+            self.assertEqual(diff.Changed['Materials'], [model.Materials[0].Name])
+            self.assertEqual(diff.Added['Bones'], ['added'])
+            self.assertEqual(diff.Removed['Joints'], [removed])
+            self.assertNotIn('Faces', diff.Sections)